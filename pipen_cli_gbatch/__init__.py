@@ -55,17 +55,56 @@ The API can also be used to run commands programmatically:
     >>> pipe = CliGbatchDaemon(config_for_daemon, command)
     >>> await pipe.run()
 
+To consume the events of the daemon job instead of the logs:
+
+    >>> async for event in CliGbatchDaemonPlain(config, command).events():
+    ...     print(event)
+
+To submit many daemons concurrently without waiting for them:
+
+    >>> from pipen_cli_gbatch import submit_many
+    >>> async for index, (jid, submitted) in submit_many(configs_and_commands):
+    ...     print(index, jid, submitted)
+
 Note that the daemon pipeline will always be running without caching, so that the
 command will always be executed when the pipeline is run.
 """
 
-from .plugins import CliGbatchPlugin
-from .daemons import CliGbatchDaemonPlain, CliGbatchDaemonPipeline
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+# Only the CLI plugin is imported eagerly, since it's the entry point imported by
+# `pipen` on every run, the others are imported on first use
+from .cli import CliGbatchPlugin
 from .version import __version__
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .daemons import CliGbatchDaemonPlain, CliGbatchDaemonPipeline
+    from .submit import submit_many
+
+_LAZY_ATTRS = {
+    "CliGbatchDaemonPlain": ".daemons",
+    "CliGbatchDaemonPipeline": ".daemons",
+    "submit_many": ".submit",
+}
+
 __all__ = (
     "CliGbatchPlugin",
     "CliGbatchDaemonPlain",
     "CliGbatchDaemonPipeline",
+    "submit_many",
     "__version__",
 )
+
+
+def __getattr__(name: str) -> Any:
+    """Import the daemons and `submit_many` on first access."""
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib import import_module
+
+    value = getattr(import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
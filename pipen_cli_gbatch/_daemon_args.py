@@ -0,0 +1,394 @@
+"""The definitions of the arguments of `pipen gbatch`, see `argspec`.
+
+Generated from `daemon_args.toml` by `python -m pipen_cli_gbatch.argspec`.
+DO NOT EDIT.
+"""
+
+# flake8: noqa
+
+TOML_SHA256 = '74d900185683424c51a34c4a8d60b892c9350c61515684615cf693e54c9c2125'
+
+ARGS_SPEC = {'mutually_exclusive_groups': [{'arguments': [{'flags': ['--nowait'],
+                                               'action': 'store_true',
+                                               'default': False,
+                                               'help': 'Run the command in a detached '
+                                                       'mode without waiting for its '
+                                                       'completion.'},
+                                              {'flags': ['--view-logs'],
+                                               'choices': ['all', 'stdout', 'stderr'],
+                                               'help': 'View the logs of a job.'},
+                                              {'flags': ['--version'],
+                                               'action': 'store_true',
+                                               'default': False,
+                                               'help': 'Show the version of the '
+                                                       'pipen-cli-gbatch package.'}]}],
+ 'arguments': [{'flags': ['--name'],
+                'type': 'str',
+                'help': 'The name of the daemon pipeline.\n'
+                        'If not provided, try to generate one from the command to '
+                        'run.\n'
+                        'If the command is also not provided, use '
+                        "'PipenCliGbatchDaemon' as the name.\n"
+                        'With `--view-logs`, it can be a glob pattern (e.g. `sweep-*`) '
+                        'to follow the logs of all the matching daemons under the '
+                        'workdir.'},
+               {'flags': ['--profile'],
+                'type': 'str',
+                'help': 'Use the `scheduler_opts` as the Scheduler Options of a given '
+                        'profile from pipen configuration files,\n'
+                        'including ~/.pipen.toml and ./pipen.toml.\n'
+                        'Note that if not provided, nothing will be loaded from the '
+                        'configuration files.\n'},
+               {'flags': ['--loglevel'],
+                'choices': ['DEBUG',
+                            'INFO',
+                            'WARNING',
+                            'ERROR',
+                            'CRITICAL',
+                            'debug',
+                            'info',
+                            'warning',
+                            'error',
+                            'critical'],
+                'default': 'INFO',
+                'help': 'Set the logging level for the daemon process.'},
+               {'flags': ['--plain'],
+                'action': 'store_true',
+                'default': False,
+                'help': 'Treat the command as a plain command, not a pipen pipeline, '
+                        "so we don't grab workdir/outdir and replace them with mounted "
+                        'paths from the command.'}],
+ 'groups': [{'title': 'Key Options',
+             'description': 'The key options to run the command.',
+             'arguments': [{'flags': ['--workdir'],
+                            'type': 'str',
+                            'help': 'The workdir (a Google Storage Bucket path is '
+                                    'required) to store the meta information of the '
+                                    'daemon pipeline.\n'
+                                    'If not provided, the one from the command will be '
+                                    'used.'},
+                           {'flags': ['--mount-as-cwd'],
+                            'type': 'str',
+                            'help': 'The directory to mount as the current working '
+                                    'directory of the command.\n'
+                                    'This is a shortcut for `--mount '
+                                    '<cloudpath>:/mnt/disks/.cwd --cwd '
+                                    '/mnt/disks/.cwd`.\n'
+                                    'The <cloudpath> must be a Google Storage Bucket '
+                                    'path (gs://...). When this option is used,\n'
+                                    'and `--workdir` is not provided, the workdir will '
+                                    'be a relative path (`.pipen`), which is\n'
+                                    'resolved against the mounted cloud path (i.e. '
+                                    '`<cloudpath>/.pipen`). Relative paths in the\n'
+                                    'command (e.g. `--outdir path/to/dir`) will also '
+                                    'be resolved against the mounted cloud path.\n'},
+                           {'flags': ['command'],
+                            'nargs': '...',
+                            'help': 'The command passed after `--` to run, with all '
+                                    'its arguments. Note that the command should be '
+                                    'provided after `--`.'}]},
+            {'title': 'Task Options',
+             'description': 'The options to run many commands as the tasks of a single '
+                            'job.',
+             'arguments': [{'flags': ['--batch-file'],
+                            'type': 'str',
+                            'help': 'A file with one command per line (empty lines and '
+                                    'lines starting with `#` are ignored), either '
+                                    'local or on the cloud.\n'
+                                    'The commands are submitted as the tasks of a '
+                                    'single Google Cloud Batch job (`taskCount` is the '
+                                    'number of commands), and each task\n'
+                                    'picks its command by `BATCH_TASK_INDEX`. The '
+                                    'stdout, stderr and return code of each task are '
+                                    'saved to\n'
+                                    '`{workdir}/{name}/{index}/task.stdout`, '
+                                    '`task.stderr` and `task.rc`. No command should be '
+                                    'provided after `--`. Implies `--plain`.'},
+                           {'flags': ['--sweep'],
+                            'type': 'str',
+                            'help': 'A CSV (`.csv`) or TSV (other extensions) file '
+                                    'with a header line, either local or on the cloud, '
+                                    'to expand the command\n'
+                                    'after `--` as a template. The `{column}` '
+                                    'placeholders in the command are replaced with the '
+                                    'values of each row, and the\n'
+                                    'expanded commands are submitted as the tasks of a '
+                                    'single Google Cloud Batch job, like '
+                                    '`--batch-file`. A manifest mapping the\n'
+                                    'task indexes to the rows is saved to '
+                                    '`{workdir}/{name}/tasks.tsv`. Implies `--plain`.'},
+                           {'flags': ['--scatter'],
+                            'type': 'str',
+                            'help': 'A glob pattern of the input files (e.g. '
+                                    '`gs://bucket/inputs/*.bam`) to scatter over '
+                                    '`--shards` tasks of a single\n'
+                                    'Google Cloud Batch job. The files are listed once '
+                                    'and bin-packed into the shards by their sizes. '
+                                    'The base directory of the\n'
+                                    'pattern is mounted to the VM (`$GBATCH_SCATTER`), '
+                                    'and the paths (inside the VM) of the files of '
+                                    'each shard are saved to\n'
+                                    '`{workdir}/{name}/{index}/scatter.list`, which is '
+                                    'exposed to the command after `--` by '
+                                    '`$GBATCH_SCATTER_LIST`. Implies `--plain`.'},
+                           {'flags': ['--shards'],
+                            'type': 'int',
+                            'help': 'The number of shards (tasks) to scatter the input '
+                                    'files of `--scatter` over.'},
+                           {'flags': ['--parallel'],
+                            'type': 'int',
+                            'help': 'Run all the commands of `--batch-file`, `--sweep` '
+                                    'or `--scatter` in a single task, by a local '
+                                    'process pool of this size\n'
+                                    '(`0` for the number of vCPUs of the VM), instead '
+                                    'of one task per command. Useful for many short '
+                                    'commands, where the boot\n'
+                                    'time of the VMs dominates. The outputs of each '
+                                    'command are saved the same way as the tasks.'}]},
+            {'title': 'Log Options',
+             'description': 'The options to show the logs of a job.',
+             'arguments': [{'flags': ['--tail'],
+                            'type': 'int',
+                            'help': 'Start from the last N lines of the logs (`0` to '
+                                    'show only the new lines), instead of replaying '
+                                    'the logs from the start\n'
+                                    '(or from where the last `--view-logs` stopped), '
+                                    'and then keep following the logs. The lines are '
+                                    'found by reading the logs backwards\n'
+                                    "from the end in chunks, so it's fast for large "
+                                    'logs.'},
+                           {'flags': ['--since'],
+                            'type': 'str',
+                            'help': 'Start from the lines of the (timestamped) pipen '
+                                    'logs logged since a duration ago (e.g. `90s`, '
+                                    '`10m`, `1h30m`, `2d`),\n'
+                                    'and then keep following the logs. The timestamps '
+                                    'are compared with the local time. Cannot be used '
+                                    'with `--tail`.'},
+                           {'flags': ['--grep'],
+                            'type': 'str',
+                            'help': 'Only show the lines of the logs matching this '
+                                    'regular expression, with `--view-logs` or while '
+                                    'waiting for the job.\n'
+                                    'The lines are filtered before they are formatted, '
+                                    "so it's cheaper than piping the logs through "
+                                    '`grep`.'},
+                           {'flags': ['--grep-v'],
+                            'type': 'str',
+                            'help': 'Only show the lines of the logs not matching this '
+                                    'regular expression, like `grep -v`. Can be used '
+                                    'with `--grep`.'},
+                           {'flags': ['--log-cache'],
+                            'nargs': '?',
+                            'const': True,
+                            'help': 'Read the logs through a local cache directory '
+                                    '(`~/.cache/pipen-gbatch` if no directory is '
+                                    'given) with `--view-logs`,\n'
+                                    'so that the viewers of the same job on the same '
+                                    'host download the logs once, and read them from '
+                                    'the disk.'},
+                           {'flags': ['--compress-logs'],
+                            'action': 'store_true',
+                            'default': False,
+                            'help': 'Compress the stdout/stderr of the job on the VM '
+                                    'into `job.stdout.gz`/`job.stderr.gz` in the '
+                                    'daemon workdir, as gzip frames\n'
+                                    '(about one per second) that can be decoded on '
+                                    'their own, which are pulled and decompressed '
+                                    'incrementally (also with `--view-logs`).\n'
+                                    'It trades a little CPU of the VM for much less '
+                                    'data to download for verbose jobs. Requires '
+                                    '`python3` in the container, otherwise\n'
+                                    'the logs are written uncompressed as usual.'},
+                           {'flags': ['--archive-logs'],
+                            'nargs': '?',
+                            'const': True,
+                            'help': 'Download the logs of the finished job(s) '
+                                    '(`job.stdout`, `job.stderr` and `run-latest.log` '
+                                    'of a pipeline) once into a\n'
+                                    'local archive '
+                                    '(`~/.cache/pipen-gbatch/logs.sqlite` if no file '
+                                    'is given), as compressed chunks indexed by the '
+                                    'line numbers and\n'
+                                    'the timestamps, so that they can be searched with '
+                                    '`--search` without downloading them again. The '
+                                    'log files unchanged since\n'
+                                    'they were archived are skipped. `--name` can be a '
+                                    'glob pattern (e.g. `sweep-*`).'},
+                           {'flags': ['--search'],
+                            'type': 'str',
+                            'help': 'Search the archived logs (see `--archive-logs`, '
+                                    'which archives or refreshes them first if given) '
+                                    'by a regular\n'
+                                    'expression, printing the matching lines with the '
+                                    'daemons, the streams and the line numbers, like '
+                                    '`grep -n`. With `--since`,\n'
+                                    'only the lines of the pipen logs logged since '
+                                    'then are searched, and the chunks logged before '
+                                    'are skipped by the index.'},
+                           {'flags': ['--raw-logs'],
+                            'action': 'store_true',
+                            'default': False,
+                            'help': 'Write the stdout/stderr of the job to the '
+                                    'stdout/stderr of this command as is (in batches), '
+                                    'instead of logging each line\n'
+                                    'with the `/STDOUT` or `/STDERR` prefix. Much '
+                                    'cheaper for jobs emitting lots of lines, and the '
+                                    'logs of the job can be piped or\n'
+                                    'redirected (e.g. `pipen gbatch --raw-logs ... > '
+                                    'job.stdout`). The messages of the daemon itself '
+                                    'are still logged.'},
+                           {'flags': ['--stream'],
+                            'action': 'store_true',
+                            'default': False,
+                            'help': 'Run the command like a local process, so that it '
+                                    'can be composed with local tools in a shell '
+                                    'pipeline\n'
+                                    '(e.g. `pipen gbatch --stream -- cmd | grep ... | '
+                                    'sort`): the stdout/stderr of the job is written '
+                                    'to stdout/stderr as is\n'
+                                    '(implies `--raw-logs`), only the warnings and '
+                                    'errors of the daemon are shown (on stderr), and '
+                                    'this command exits with the\n'
+                                    'return code of the job.'}]},
+            {'title': 'Scheduler Options',
+             'description': 'The options to configure the gbatch scheduler.',
+             'arguments': [{'flags': ['--error-strategy'],
+                            'choices': ['retry', 'halt'],
+                            'default': 'halt',
+                            'help': 'The strategy when there is error happened'},
+                           {'flags': ['--num-retries'],
+                            'type': 'int',
+                            'default': 0,
+                            'help': 'The number of retries when there is error '
+                                    'happened. Only valid when --error-strategy is '
+                                    "'retry'."},
+                           {'flags': ['--prescript'],
+                            'type': 'str',
+                            'help': 'The prescript to run before the main command.'},
+                           {'flags': ['--postscript'],
+                            'type': 'str',
+                            'help': 'The postscript to run after the main command.'},
+                           {'flags': ['--jobname-prefix'],
+                            'type': 'str',
+                            'help': 'The prefix of the name prefix of the daemon job.\n'
+                                    'If not provided, try to generate one from the '
+                                    'command to run.\n'
+                                    'If the command is also not provided, use '
+                                    "'pipen-gbatch-daemon' as the prefix."},
+                           {'flags': ['--recheck-interval'],
+                            'type': 'int',
+                            'default': 60,
+                            'help': 'The interval to recheck the job status, each '
+                                    'takes about 0.1 seconds.'},
+                           {'flags': ['--cwd'],
+                            'type': 'str',
+                            'help': 'The working directory to run the command. If not '
+                                    'provided, the current directory is used. You can '
+                                    'pass either a mounted path (inside the VM) or a '
+                                    'Google Storage Bucket path (gs://...). If a '
+                                    'Google Storage Bucket path is provided, the '
+                                    'mounted path will be inferred from the mounted '
+                                    'paths of the VM.'},
+                           {'flags': ['--project'],
+                            'type': 'str',
+                            'help': 'The Google Cloud project to run the job.'},
+                           {'flags': ['--location'],
+                            'type': 'str',
+                            'help': 'The location to run the job.'},
+                           {'flags': ['--mount'],
+                            'default': [],
+                            'action': 'append',
+                            'help': 'The list of mounts to mount to the VM, each in '
+                                    'the format of SOURCE:TARGET, where SOURCE must be '
+                                    'either a Google Storage Bucket path (gs://...).\n'
+                                    'You can also use named mounts like '
+                                    '`INDIR=gs://my-bucket/inputs` and the directory '
+                                    'will be mounted to `/mnt/disks/INDIR` in the VM;\n'
+                                    'then you can use environment variable `$INDIR` in '
+                                    'the command/script to refer to the mounted path.\n'
+                                    'You can also mount a file like '
+                                    '`INFILE=gs://my-bucket/inputs/file.txt`. The '
+                                    'parent directory will be mounted to '
+                                    '`/mnt/disks/INFILE/inputs` in the VM,\n'
+                                    'and the file will be available at '
+                                    '`/mnt/disks/INFILE/inputs/file.txt` in the VM. '
+                                    '`$INFILE` can also be used in the command/script '
+                                    'to refer to the mounted path.\n'},
+                           {'flags': ['--service-account'],
+                            'type': 'str',
+                            'help': 'The service account to run the job.'},
+                           {'flags': ['--network'],
+                            'type': 'str',
+                            'help': 'The network to run the job.'},
+                           {'flags': ['--subnetwork'],
+                            'type': 'str',
+                            'help': 'The subnetwork to run the job.'},
+                           {'flags': ['--no-external-ip-address'],
+                            'action': 'store_true',
+                            'help': 'Whether to disable external IP address for the '
+                                    'VM.'},
+                           {'flags': ['--machine-type'],
+                            'type': 'str',
+                            'help': 'The machine type of the VM.'},
+                           {'flags': ['--provisioning-model'],
+                            'choices': ['STANDARD', 'SPOT'],
+                            'help': 'The provisioning model of the VM.'},
+                           {'flags': ['--image-uri'],
+                            'type': 'str',
+                            'help': 'The custom image URI of the VM.'},
+                           {'flags': ['--entrypoint'],
+                            'type': 'str',
+                            'help': 'The entry point of the container to run the '
+                                    'command.'},
+                           {'flags': ['--commands'],
+                            'default': [],
+                            'action': 'clear_append',
+                            'help': 'The list of extra commands to run in the '
+                                    'container, each as a separate string,\n'
+                                    'before the actual command. This is helpful to '
+                                    'setup the environment for\n'
+                                    'the actual command.'},
+                           {'flags': ['--runnables'],
+                            'type': 'json',
+                            'help': 'The JSON string of extra settings of runnables '
+                                    'add to the job.json.\n'
+                                    'Refer to '
+                                    'https://cloud.google.com/batch/docs/reference/rest/v1/projects.locations.jobs#Runnable '
+                                    'for details.\n'
+                                    "You can have an extra key 'order' for each "
+                                    'runnable, where negative values mean to run '
+                                    'before the main command,\n'
+                                    'and positive values mean to run after the main '
+                                    'command.'},
+                           {'flags': ['--allocationPolicy'],
+                            'type': 'json',
+                            'default': {},
+                            'help': 'The JSON string of extra settings of '
+                                    'allocationPolicy add to the job.json. Refer to '
+                                    'https://cloud.google.com/batch/docs/reference/rest/v1/projects.locations.jobs#AllocationPolicy '
+                                    'for details.'},
+                           {'flags': ['--taskGroups'],
+                            'type': 'json',
+                            'default': [],
+                            'help': 'The JSON string of extra settings of taskGroups '
+                                    'add to the job.json. Refer to '
+                                    'https://cloud.google.com/batch/docs/reference/rest/v1/projects.locations.jobs#TaskGroup '
+                                    'for details.'},
+                           {'flags': ['--labels'],
+                            'default': [],
+                            'action': 'clear_append',
+                            'help': 'The strings of labels to add to the job '
+                                    '(key=value). Refer to '
+                                    'https://cloud.google.com/batch/docs/reference/rest/v1/projects.locations.jobs#Job.FIELDS.labels '
+                                    'for details.'},
+                           {'flags': ['--timeout'],
+                            'type': 'int',
+                            'default': 0,
+                            'help': 'Maximum seconds to wait for the job to finish. '
+                                    'Job will be killed if it runs longer than this. 0 '
+                                    'means no timeout.'},
+                           {'flags': ['--gcloud'],
+                            'type': 'str',
+                            'default': 'gcloud',
+                            'help': 'The path to the gcloud command.'}]}]}
@@ -0,0 +1,322 @@
+"""A local archive of the logs of the finished jobs, for repeated searches.
+
+The log files of a daemon (`job.stdout`, `job.stderr`, and `run-latest.log` of a
+pipen pipeline) are downloaded once (`--archive-logs`) into a SQLite database,
+as zlib-compressed chunks of lines. Each chunk is indexed by the number of its
+first line and the times of its first and last lines (pipen logs, with the lines
+without timestamps belonging to the timestamped line before, even in the
+previous chunk), so that `--search` (optionally with `--since`) only decompresses
+the chunks that may match, without downloading the logs again.
+
+The logs are keyed by the workdirs, the names of the daemons and the streams, so
+that the daemons with the same name in different workdirs are kept apart.
+
+A log file is not downloaded again if its size and generation are unchanged
+since it was archived.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from panpath import PanPath
+
+from .logs import parse_log_time, read_range, stat_object
+
+# The default file name of the archive, in the log cache directory
+ARCHIVE_FILE = "logs.sqlite"
+# The number of the lines in each compressed chunk
+CHUNK_LINES = 4096
+# The number of the bytes to download at a time
+ARCHIVE_READ_SIZE = 8 * 1024 * 1024
+# The version of the schema, the archives of older versions are started over
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    workdir TEXT NOT NULL,
+    daemon TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    generation TEXT,
+    lines INTEGER NOT NULL,
+    archived_at REAL NOT NULL,
+    UNIQUE (workdir, daemon, stream)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    log_id INTEGER NOT NULL REFERENCES logs (id) ON DELETE CASCADE,
+    first_line INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    first_time TEXT,
+    last_time TEXT,
+    data BLOB NOT NULL,
+    PRIMARY KEY (log_id, first_line)
+);
+CREATE INDEX IF NOT EXISTS chunks_time ON chunks (log_id, last_time);
+"""
+
+
+class SearchHit(NamedTuple):
+    """A line of the archived logs matching a search.
+
+    Attributes:
+        daemon: The name of the daemon.
+        stream: The stream of the line, e.g. `STDOUT`.
+        lineno: The line number (1-based) in the log file.
+        line: The line, without the trailing newline.
+    """
+
+    daemon: str
+    stream: str
+    lineno: int
+    line: str
+
+
+class LogArchive:
+    """The archive of the logs of the daemons, in a SQLite database.
+
+    Attributes:
+        db_file: The path to the database file.
+    """
+
+    def __init__(self, db_file: str | Path) -> None:
+        """Open (or create) the archive.
+
+        Args:
+            db_file: The path to the database file.
+        """
+        self.db_file = Path(db_file).expanduser()
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_file)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version < SCHEMA_VERSION:
+            # the logs can be downloaded again
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS chunks; DROP TABLE IF EXISTS logs;"
+            )
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        """Close the database."""
+        self._conn.close()
+
+    def __enter__(self) -> LogArchive:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _insert_chunk(
+        self,
+        log_id: int,
+        first_line: int,
+        lines: list[bytes],
+        now: datetime,
+        stamp: datetime | None,
+    ) -> datetime | None:
+        """Compress and insert a chunk of lines, indexed by the timestamps.
+
+        Args:
+            log_id: The id of the log file.
+            first_line: The number (0-based) of the first line of the chunk.
+            lines: The lines of the chunk.
+            now: The time to complete the timestamps with the year.
+            stamp: The time of the last timestamped line before the chunk.
+
+        Returns:
+            The time of the last timestamped line by the end of the chunk.
+        """
+        first_time = None
+        for i, line in enumerate(lines):
+            stamp = parse_log_time(line, now) or stamp
+            if i == 0:
+                first_time = stamp
+
+        self._conn.execute(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                log_id,
+                first_line,
+                len(lines),
+                first_time.isoformat() if first_time else None,
+                stamp.isoformat() if stamp else None,
+                zlib.compress(b"\n".join(lines)),
+            ),
+        )
+        return stamp
+
+    async def archive(
+        self,
+        daemon: str,
+        stream: str,
+        path: PanPath,
+        workdir: str = "",
+    ) -> int | None:
+        """Download a log file into the archive, unless it's archived already.
+
+        Args:
+            daemon: The name of the daemon.
+            stream: The stream of the log file, e.g. `STDOUT`.
+            path: The path to the log file.
+            workdir: The workdir of the daemon.
+
+        Returns:
+            The number of the lines archived, or None if the log file doesn't
+            exist or is unchanged since it was archived.
+        """
+        stat = await stat_object(path)
+        if stat is None:
+            return None
+
+        row = self._conn.execute(
+            "SELECT size, generation FROM logs "
+            "WHERE workdir = ? AND daemon = ? AND stream = ?",
+            (workdir, daemon, stream),
+        ).fetchone()
+        if row == (stat.size, stat.generation):
+            return None
+
+        now = datetime.now()
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM logs WHERE workdir = ? AND daemon = ? AND stream = ?",
+                (workdir, daemon, stream),
+            )
+            log_id = self._conn.execute(
+                "INSERT INTO logs (workdir, daemon, stream, uri, size, generation, "
+                "lines, archived_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (
+                    workdir,
+                    daemon,
+                    stream,
+                    str(path),
+                    stat.size,
+                    stat.generation,
+                    time.time(),
+                ),
+            ).lastrowid
+
+            nlines = 0
+            pending: list[bytes] = []
+            residue = b""
+            stamp = None
+            for start in range(0, stat.size, ARCHIVE_READ_SIZE):
+                data = await read_range(
+                    path, start, min(start + ARCHIVE_READ_SIZE, stat.size)
+                )
+                lines = (residue + data).split(b"\n")
+                residue = lines.pop(-1)
+                pending.extend(lines)
+                while len(pending) >= CHUNK_LINES:
+                    stamp = self._insert_chunk(
+                        log_id, nlines, pending[:CHUNK_LINES], now, stamp
+                    )
+                    nlines += CHUNK_LINES
+                    del pending[:CHUNK_LINES]
+
+            if residue:
+                pending.append(residue)
+            if pending:
+                self._insert_chunk(log_id, nlines, pending, now, stamp)
+                nlines += len(pending)
+
+            self._conn.execute(
+                "UPDATE logs SET lines = ? WHERE id = ?",
+                (nlines, log_id),
+            )
+        return nlines
+
+    def search(
+        self,
+        pattern: str,
+        daemon: str = "*",
+        since: datetime | None = None,
+        workdir: str | None = None,
+    ) -> Iterator[SearchHit]:
+        """Search the archived logs by a regular expression.
+
+        Args:
+            pattern: The regular expression to search for.
+            daemon: The glob pattern of the names of the daemons.
+            since: Only search the lines of the pipen logs logged since this time.
+                The chunks logged before it are skipped by the index.
+            workdir: The workdir of the daemons, None for all the workdirs.
+
+        Yields:
+            The matching lines, in the order of the daemons, the streams and the
+            line numbers.
+
+        Raises:
+            re.error: If the pattern is invalid.
+        """
+        regex = re.compile(pattern.encode())
+        query = (
+            "SELECT logs.daemon, logs.stream, chunks.first_line, chunks.first_time, "
+            "chunks.data, logs.archived_at "
+            "FROM chunks JOIN logs ON chunks.log_id = logs.id "
+            "WHERE logs.daemon GLOB ?"
+        )
+        params: list = [daemon]
+        if workdir is not None:
+            query += " AND logs.workdir = ?"
+            params.append(workdir)
+        if since is not None:
+            query += " AND (chunks.last_time IS NULL OR chunks.last_time >= ?)"
+            params.append(since.isoformat())
+        query += (
+            " ORDER BY logs.daemon, logs.stream, logs.workdir, chunks.first_line"
+        )
+
+        for name, stream, first_line, first_time, data, archived_at in (
+            self._conn.execute(query, params)
+        ):
+            now = datetime.fromtimestamp(archived_at)
+            # the time of the first line, from the lines before it if not logged
+            stamp = datetime.fromisoformat(first_time) if first_time else None
+            for i, line in enumerate(zlib.decompress(data).split(b"\n")):
+                if since is not None:
+                    # the lines without timestamps belong to the line before
+                    stamp = parse_log_time(line, now) or stamp
+                    if stamp is not None and stamp < since:
+                        continue
+                if regex.search(line):
+                    yield SearchHit(
+                        name,
+                        stream,
+                        first_line + i + 1,
+                        line.decode(errors="replace"),
+                    )
+
+    def archived(
+        self,
+        daemon: str = "*",
+        workdir: str | None = None,
+    ) -> list[tuple[str, str, int]]:
+        """List the archived log files.
+
+        Args:
+            daemon: The glob pattern of the names of the daemons.
+            workdir: The workdir of the daemons, None for all the workdirs.
+
+        Returns:
+            The names of the daemons, the streams and the numbers of the lines.
+        """
+        query = "SELECT daemon, stream, lines FROM logs WHERE daemon GLOB ?"
+        params: list = [daemon]
+        if workdir is not None:
+            query += " AND workdir = ?"
+            params.append(workdir)
+        return self._conn.execute(
+            f"{query} ORDER BY daemon, stream, workdir",
+            params,
+        ).fetchall()
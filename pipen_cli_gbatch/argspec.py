@@ -0,0 +1,107 @@
+"""The precompiled definitions of the arguments of `pipen gbatch`.
+
+The arguments are defined in `daemon_args.toml`, which is compiled into a python
+module (`_daemon_args.py`, with the hash of the TOML file), so that the plugin
+doesn't parse the TOML file on every run of `pipen`. The compiled module is
+loaded (from its cached bytecode) as long as its hash matches the TOML file,
+otherwise (or if it can't be imported) the TOML file is parsed in memory. The
+module is never written at runtime, the package directory may be read-only or
+shared by concurrent runs.
+
+The module is generated at development time, and checked against the TOML file
+by the tests. To regenerate it after editing `daemon_args.toml`:
+
+    python -m pipen_cli_gbatch.argspec
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import os
+from copy import deepcopy
+from pathlib import Path
+from pprint import pformat
+
+# The definitions of the arguments
+ARGS_TOML = Path(__file__).parent / "daemon_args.toml"
+# The compiled definitions of the arguments
+ARGS_SPEC_MODULE = Path(__file__).parent / "_daemon_args.py"
+
+_HEADER = '''\
+"""The definitions of the arguments of `pipen gbatch`, see `argspec`.
+
+Generated from `daemon_args.toml` by `python -m pipen_cli_gbatch.argspec`.
+DO NOT EDIT.
+"""
+
+# flake8: noqa
+'''
+
+
+def toml_digest() -> str:
+    """Get the hash of the TOML file of the arguments.
+
+    Returns:
+        The sha256 hex digest of the file.
+    """
+    return hashlib.sha256(ARGS_TOML.read_bytes()).hexdigest()
+
+
+def parse_args_toml() -> dict:
+    """Parse the TOML file of the arguments.
+
+    Returns:
+        The definitions of the arguments, as plain dicts and lists.
+    """
+    from simpleconf import Config
+
+    return Config.load(ARGS_TOML, loader="toml").to_dict()
+
+
+def compile_args_spec() -> dict:
+    """Parse the TOML file of the arguments, and write the compiled module.
+
+    This is run at development time, not by `load_args_spec()`.
+
+    Returns:
+        The definitions of the arguments.
+
+    Raises:
+        OSError: If the compiled module cannot be written.
+    """
+    spec = parse_args_toml()
+    # written to a temporary file and renamed, not to leave a partial module
+    tmp_file = ARGS_SPEC_MODULE.with_name(f"{ARGS_SPEC_MODULE.name}.{os.getpid()}.tmp")
+    tmp_file.write_text(
+        f"{_HEADER}\nTOML_SHA256 = {toml_digest()!r}\n\n"
+        f"ARGS_SPEC = {pformat(spec, width=88, sort_dicts=False)}\n"
+    )
+    os.replace(tmp_file, ARGS_SPEC_MODULE)
+    importlib.invalidate_caches()
+    return spec
+
+
+def load_args_spec() -> dict:
+    """Load the definitions of the arguments.
+
+    Returns:
+        A copy of the definitions, to be consumed by `_add_decedents()` of the
+        parser, which pops items from them.
+    """
+    try:
+        module = importlib.import_module("._daemon_args", __package__)
+    except Exception:
+        # missing or broken, e.g. a partial module
+        module = None
+
+    if getattr(module, "TOML_SHA256", None) == toml_digest():
+        return deepcopy(module.ARGS_SPEC)  # type: ignore[union-attr]
+
+    # stale, e.g. the TOML file is edited, parsed without being compiled
+    return parse_args_toml()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    compile_args_spec()
+    print(f"Compiled {ARGS_TOML.name} into {ARGS_SPEC_MODULE.name}.")
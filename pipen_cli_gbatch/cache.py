@@ -0,0 +1,191 @@
+"""A local on-disk cache of the log files, shared between concurrent viewers.
+
+When several viewers (`--view-logs --log-cache`) on the same host follow the same
+job, the bytes of each log object are downloaded once, and appended to a local
+cache file under an exclusive file lock. The other viewers wait for the lock,
+and then read the bytes from the disk.
+
+The cache files are keyed by the URIs of the log objects. The generations of the
+objects change whenever gcsfuse flushes them, so they are recorded to tell if the
+cache is up to date, instead of keying the cache files. When new bytes are
+fetched, a few bytes already cached (`OVERLAP_SIZE`) are fetched along with them,
+so that a rewritten object (e.g. the job is resubmitted) is detected, and the
+cache file is started over. An object rewritten without growing is detected by
+its generation differing from the recorded one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, e.g. on Windows
+    fcntl = None  # type: ignore[assignment]
+
+from panpath import PanPath
+
+from .logs import ObjectStat, read_range
+
+# The default directory of the cache
+DEFAULT_LOG_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "pipen-gbatch",
+)
+# The number of the bytes already cached to fetch again to verify the continuity
+OVERLAP_SIZE = 16
+# The interval to retry to acquire the lock, in seconds
+LOCK_RETRY_INTERVAL = 0.05
+
+
+class LogCache:
+    """A local cache of the log objects, appended incrementally under a file lock.
+
+    Attributes:
+        cache_dir: The directory of the cache.
+    """
+
+    def __init__(self, cache_dir: str | Path | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            cache_dir: The directory of the cache, `DEFAULT_LOG_CACHE_DIR` by
+                default.
+
+        Raises:
+            RuntimeError: If file locking is not supported on the platform.
+        """
+        if fcntl is None:  # pragma: no cover
+            raise RuntimeError("The log cache requires fcntl (POSIX) file locks.")
+
+        self.cache_dir = Path(cache_dir or DEFAULT_LOG_CACHE_DIR).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def cache_file(self, uri: str) -> Path:
+        """Get the cache file of a log object.
+
+        Args:
+            uri: The URI of the log object.
+
+        Returns:
+            The path to the cache file. The metadata and the lock files are
+            next to it, with `.json` and `.lock` suffixes.
+        """
+        return self.cache_dir / f"{hashlib.sha1(uri.encode()).hexdigest()}.log"
+
+    @asynccontextmanager
+    async def _lock(self, cache_file: Path) -> AsyncIterator[None]:
+        """Hold the exclusive lock of a cache file, without blocking the loop."""
+        fd = os.open(cache_file.with_suffix(".lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_RETRY_INTERVAL)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    @staticmethod
+    def _read_meta(meta_file: Path, uri: str) -> dict | None:
+        """Read the metadata of a cache file, recorded when it was last written.
+
+        Args:
+            meta_file: The metadata file.
+            uri: The URI of the log object.
+
+        Returns:
+            The URI, the generation and the size of the object cached, or None
+            if the metadata is missing, broken or for another object.
+        """
+        try:
+            meta = json.loads(meta_file.read_text())
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(meta, dict) or meta.get("uri") != uri:
+            return None
+        return meta
+
+    async def read_range(
+        self,
+        path: PanPath,
+        start: int,
+        end: int,
+        stat: ObjectStat,
+    ) -> bytes:
+        """Read the bytes in `[start, end)` of a log object through the cache.
+
+        Only the bytes not cached yet are fetched, by the first viewer acquiring
+        the lock. The cache is dropped if the object has a generation different
+        from the one recorded, without growing (i.e. it is rewritten with the
+        same or a smaller size).
+
+        Args:
+            path: The path to the log object.
+            start: The start offset.
+            end: The end offset (exclusive), no more than the size of the object.
+            stat: The stat of the log object.
+
+        Returns:
+            The bytes read.
+        """
+        if end <= start:
+            return b""
+
+        cache_file = self.cache_file(str(path))
+        meta_file = cache_file.with_suffix(".json")
+        async with self._lock(cache_file):
+            cached = cache_file.stat().st_size if cache_file.exists() else 0
+            meta = self._read_meta(meta_file, str(path))
+            if cached > stat.size:
+                # the object is rewritten with a smaller size
+                cached = 0
+            elif (
+                meta is not None
+                and stat.generation is not None
+                and meta.get("generation") != stat.generation
+                and stat.size <= meta.get("size", 0)
+            ):
+                # the object is rewritten without growing
+                cached = 0
+
+            if cached < end:
+                overlap = min(cached, OVERLAP_SIZE)
+                data = await read_range(path, cached - overlap, stat.size)
+                if overlap:
+                    with cache_file.open("rb") as fh:
+                        fh.seek(cached - overlap)
+                        if fh.read(overlap) != data[:overlap]:
+                            # the object is rewritten, start over
+                            cached = 0
+                            data = await read_range(path, 0, stat.size)
+                        else:
+                            data = data[overlap:]
+
+                with cache_file.open("r+b" if cached else "wb") as fh:
+                    fh.seek(cached)
+                    fh.write(data)
+                    fh.truncate()
+
+                meta_file.write_text(
+                    json.dumps(
+                        {
+                            "uri": str(path),
+                            "generation": stat.generation,
+                            "size": cached + len(data),
+                        }
+                    )
+                )
+
+            with cache_file.open("rb") as fh:
+                fh.seek(start)
+                return fh.read(end - start)
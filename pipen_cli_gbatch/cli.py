@@ -0,0 +1,234 @@
+"""The `pipen gbatch` CLI plugin.
+
+This module is the entry point of the plugin (see `pipen_cli` entry points), which
+is imported by `pipen` on every run, whichever subcommand is used. So it only
+imports what is already loaded by `pipen` itself, and the heavy modules (the
+daemons, the xqute plugins, the cloud clients, ...) are imported on first use.
+"""
+
+from __future__ import annotations
+
+import sys
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Sequence
+
+from diot import Diot
+from pipen.cli import AsyncCLIPlugin
+from pipen.defaults import CONFIG_FILES
+
+from .profiles import load_cached_profile, profile_key, save_cached_profile
+from .version import __version__
+
+
+class CliGbatchPlugin(AsyncCLIPlugin):
+    """Simplify running commands via Google Cloud Batch.
+
+    This CLI plugin provides a command-line interface for executing arbitrary
+    commands on Google Cloud Batch through the pipen framework. It wraps
+    commands as single-process pipelines and provides various execution modes.
+    """
+
+    __version__ = __version__
+    name = "gbatch"  # type: ignore
+
+    @classmethod
+    async def _get_defaults_from_config(
+        cls,
+        config_files: Sequence[str | Path],
+        profile: str | None,
+    ) -> dict:
+        """Get the default configurations from the given config files and profile.
+
+        Args:
+            config_files: List of configuration file paths to load.
+            profile: The profile name to use for configuration.
+
+        The resolved configurations are cached (see `profiles`), and loaded
+        from the cache as long as the config files are not changed.
+
+        Returns:
+            Dictionary containing scheduler options from the configuration.
+        """
+        if not profile:
+            return {}
+
+        key = profile_key(config_files, profile)
+        cached = load_cached_profile(key)
+        if cached is not None:
+            return Diot(cached)
+
+        from simpleconf import ProfileConfig
+
+        conf = await ProfileConfig.a_load(
+            *config_files,
+            ignore_nonexist=True,
+            allow_missing_base=True,
+        )
+        conf = ProfileConfig.use_profile(conf, profile, allow_missing_base=True)
+        conf = ProfileConfig.detach(conf)
+        save_cached_profile(key, conf)
+        return conf
+
+    def __init__(self, parser, subparser):
+        """Initialize the CLI plugin with argument parsing configuration.
+
+        The arguments are added to the subparser on its first parse, since the
+        plugin is constructed for every run of `pipen`, whichever subcommand
+        is used.
+
+        Args:
+            parser: The main argument parser.
+            subparser: The subparser for this specific command.
+        """
+        super().__init__(parser, subparser)
+        self._arguments_added = False
+        subparser.usage = "pipen gbatch [options] -- <command>"
+        subparser.pre_parse = self._pre_parse  # type: ignore
+        subparser.epilog = """\033[1;4mExamples\033[0m:
+
+  \u200b
+  # Run a command and wait for it to complete
+  > pipen gbatch --mount-as-cwd gs://my-bucket/workdir -- \\
+      python myscript.py --input input.txt --output output.txt
+
+  \u200b
+  # Use named mounts
+  > pipen gbatch --mount-as-cwd  gs://my-bucket/workdir \\
+      --mount INFILE=gs://bucket/path/to/file \\
+      --mount OUTDIR=gs://bucket/path/to/outdir -- \\
+      bash -c 'cat $INFILE > $OUTDIR/output.txt'
+
+  \u200b
+  # Run a command in a detached mode
+  > pipen gbatch --nowait --project $PROJECT --location $LOCATION \\
+      --workdir gs://my-bucket/workdir -- \\
+      python myscript.py --input input.txt --output output.txt
+
+  \u200b
+  # If you have a profile defined in ~/.pipen.toml or ./.pipen.toml
+  # `scheduler_opts` in the profile will be used to start the daemon,
+  # other options will be brought as default to the pipen pipeline by the command
+  > pipen gbatch --profile myprofile -- \\
+      python myscript.py --input input.txt --output output.txt
+
+  \u200b
+  # View the logs of a previously run command
+  > pipen gbatch --view-logs all --name my-daemon-name \\
+      --workdir gs://my-bucket/workdir
+
+  \u200b
+  # Attach to the last 100 lines of the logs, and keep following
+  > pipen gbatch --view-logs stdout --tail 100 --name my-daemon-name \\
+      --workdir gs://my-bucket/workdir
+        """  # noqa: E501
+
+    def _add_arguments(self) -> None:
+        """Add command-line arguments specific to the gbatch plugin, once."""
+        if self._arguments_added:
+            return
+
+        from .argspec import load_args_spec
+
+        self._arguments_added = True
+        args_def = load_args_spec()
+        mutually_exclusive_groups = args_def.get("mutually_exclusive_groups", [])
+        groups = args_def.get("groups", [])
+        arguments = args_def.get("arguments", [])
+        self.subparser._add_decedents(
+            mutually_exclusive_groups, groups, [], arguments, []
+        )
+
+    def _pre_parse(self, parser, args: Sequence[str], namespace: Namespace):
+        """Add the arguments on the first parse of the subcommand, and pre-parse
+        the nested arguments (see `pipen_args`).
+        """
+        from pipen_args.parser_ import _pre_parse
+
+        self._add_arguments()
+        return _pre_parse(parser, args, namespace)
+
+    async def parse_args(self, known_parsed, unparsed_argv: list[str]) -> Namespace:
+        """Parse command-line arguments and apply configuration defaults.
+
+        Args:
+            known_parsed: Previously parsed arguments.
+            unparsed_argv: List of unparsed command-line arguments.
+
+        Returns:
+            Namespace containing parsed arguments with applied defaults.
+
+        Raises:
+            SystemExit: If command arguments are not properly formatted.
+        """
+        # Check if there is any unknown args
+        known_parsed = await super().parse_args(known_parsed, unparsed_argv)
+        # pipen gbatch with no arguments
+        if not hasattr(known_parsed, "command"):
+            self.subparser.print_help()
+            sys.exit(0)
+
+        if known_parsed.command:
+            if known_parsed.command[0] != "--":
+                from .mixin import error_and_exit
+                error_and_exit("The command to run must be after '--'.")
+
+            known_parsed.command = known_parsed.command[1:]
+
+        defaults = await self.__class__._get_defaults_from_config(
+            CONFIG_FILES,
+            known_parsed.profile,
+        )
+        default_scheduler_opts = defaults.pop("scheduler_opts", {})
+
+        def is_valid(val: Any) -> bool:
+            """Check if a value is valid (not None, not empty string, not empty list).
+            """
+            if val is None:
+                return False
+            if isinstance(val, bool):
+                return True
+            return bool(val)
+
+        # update parsed with the defaults
+        for key, val in default_scheduler_opts.items():
+            if key == "mount" and val and getattr(known_parsed, key, None):
+                if not isinstance(val, (tuple, list)):
+                    val = [val]
+                val = list(val)
+
+                kp_mount = getattr(known_parsed, key)
+                val.extend(kp_mount)
+                setattr(known_parsed, key, val)
+                continue
+
+            if (
+                key == "command"
+                or val is None
+                or is_valid(getattr(known_parsed, key, None))
+            ):
+                continue
+
+            setattr(known_parsed, key, val)
+
+        if not getattr(known_parsed, "plain", None):
+            setattr(known_parsed, "_other_opts", defaults)
+        return known_parsed
+
+    async def exec_command(self, args: Namespace) -> None:
+        """Execute the gbatch command with the provided arguments.
+
+        Args:
+            args: Parsed command-line arguments containing configuration and command.
+        """
+        from .daemons import CliGbatchDaemonPlain, CliGbatchDaemonPipeline
+        # the commands of the tasks are not pipen pipelines
+        if (
+            args.plain
+            or getattr(args, "batch_file", None)
+            or getattr(args, "sweep", None)
+            or getattr(args, "scatter", None)
+        ):
+            await CliGbatchDaemonPlain(args, args.command).run()
+        else:
+            await CliGbatchDaemonPipeline(args, args.command).run()
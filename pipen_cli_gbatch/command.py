@@ -0,0 +1,124 @@
+"""The arguments of the command to run, parsed in a single pass.
+
+The daemon looks up a few arguments of the command (`--name`, `--workdir`,
+`--outdir`), and replaces some of them with the paths inside the VM. The command
+may have thousands of arguments (e.g. file lists), and `@file` configurations on
+Google Storage, so the arguments are indexed once, and the configurations are
+loaded once, instead of being scanned and loaded for each lookup.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from diot import Diot
+from panpath import PanPath
+from simpleconf import Config
+
+
+class CommandArgs:
+    """An index of the arguments of a command.
+
+    The `--key=value` and `--key value` arguments are indexed by their keys (the
+    first occurrence of each form, with `--key=value` taking precedence), and the
+    values not found are looked up in the `@file` configurations, merged in the
+    order they are given, as `pipen-args` does (`@file.txt` is excluded, which
+    holds arguments instead of a configuration). The replacements are written to
+    the command list in place, so it is always the serialized command.
+
+    Attributes:
+        command: The command, as a list of arguments.
+    """
+
+    def __init__(self, command: list[str]) -> None:
+        """Index the arguments of the command.
+
+        Args:
+            command: The command, as a list of arguments.
+        """
+        self.command = command
+        # the indexes of the --key=value arguments
+        self._equal: dict[str, int] = {}
+        # the indexes of the --key arguments, followed by the values
+        self._space: dict[str, int] = {}
+        # the @file configurations, loaded on the first lookup not in the command
+        self._config_files: list[str] = []
+        self._config: Diot | None = None
+
+        for index, item in enumerate(command):
+            if item.startswith("--"):
+                key, equal, _ = item[2:].partition("=")
+                (self._equal if equal else self._space).setdefault(key, index)
+            elif item.startswith("@") and not item.endswith(".txt"):
+                self._config_files.append(item[1:])
+
+    def _space_index(self, key: str) -> int | None:
+        """Get the index of the value of a `--key value` argument.
+
+        Args:
+            key: The argument name (without '--' prefix).
+
+        Returns:
+            The index of the value, or None if there is no such argument, or it
+            has no value.
+        """
+        index = self._space.get(key)
+        if index is None or index + 1 >= len(self.command):
+            return None
+        return index + 1
+
+    async def config(self) -> Diot:
+        """Load the `@file` configurations, once.
+
+        Returns:
+            The merged configurations, the latter ones overriding the former ones.
+
+        Raises:
+            FileNotFoundError: If a config file doesn't exist.
+        """
+        if self._config is None:
+            config_files = [PanPath(config_file) for config_file in self._config_files]
+            for config_file in config_files:
+                if not await config_file.a_exists():
+                    raise FileNotFoundError(f"Config file not found: {config_file}")
+            self._config = await Config.a_load(*config_files)
+        return self._config
+
+    async def get(self, key: str) -> Any:
+        """Get the value of an argument.
+
+        Args:
+            key: The argument name (without '--' prefix).
+
+        Returns:
+            The value of the argument in the command, or else in the `@file`
+            configurations, or None if not found.
+
+        Raises:
+            FileNotFoundError: If a config file doesn't exist.
+        """
+        if key in self._equal:
+            return self.command[self._equal[key]].split("=", 1)[1]
+
+        index = self._space_index(key)
+        if index is not None:
+            return self.command[index]
+
+        return (await self.config()).get(key, None)
+
+    def replace(self, key: str, value: Any) -> None:
+        """Replace the value of an argument, or append it if not in the command.
+
+        Args:
+            key: The argument name (without '--' prefix).
+            value: The new value of the argument.
+        """
+        value = str(value)
+        index = self._space_index(key)
+        if key in self._equal:
+            self.command[self._equal[key]] = f"--{key}={value}"
+        elif index is not None:
+            self.command[index] = value
+        else:
+            self._space[key] = len(self.command)
+            self.command.extend([f"--{key}", value])
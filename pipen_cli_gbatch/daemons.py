@@ -13,7 +13,8 @@ from pipen.scheduler import GbatchScheduler
 from xqute import defaults as xqute_defaults
 from xqute.utils import logger
 
-from .mixin import CliGbatchDaemonMixin, error_and_exit, mounted_to_cloud
+from .logs import gs_session
+from .mixin import CliGbatchDaemonMixin, error_and_exit
 
 
 class CliGbatchDaemonPlain(CliGbatchDaemonMixin):
@@ -41,7 +42,11 @@ class CliGbatchDaemonPlain(CliGbatchDaemonMixin):
         if self.config.get("name"):
             return self.config["name"]
 
-        self.config["name"] = f".gbatch-{slugify('-'.join(self.command[:2]))}"
+        parts = self.command[:2]
+        if not parts and self.config.get("batch_file"):
+            parts = [PanPath(self.config["batch_file"]).stem]
+
+        self.config["name"] = f".gbatch-{slugify('-'.join(parts))}"
         return self.config["name"]
 
     async def handle_workdir(self):
@@ -84,11 +89,7 @@ class CliGbatchDaemonPlain(CliGbatchDaemonMixin):
                 # cwd=/mnt/path/workdir
                 # cloud_cwd=gs://bucket/path/workdir
                 # workdir=.pipen
-                cloud_cwd = await mounted_to_cloud(
-                    self.cwd,   # type: ignore
-                    GbatchScheduler.DEFAULT_MOUNTED_ROOT,
-                    self.config.get("mount", self.config.get("volumes", []))
-                )
+                cloud_cwd = (await self.mount_table()).to_cloud(self.cwd)
                 if not cloud_cwd:
                     error_and_exit(
                         "Cannot determine the cloud path for the relative workdir "
@@ -195,18 +196,7 @@ class CliGbatchDaemonPipeline(CliGbatchDaemonMixin):
             arg: The argument name to replace (without '--' prefix).
             value: The new value to set for the argument.
         """
-        cmd_equal = [cmd.startswith(f"--{arg}=") for cmd in self.command]
-        cmd_space = [cmd == f"--{arg}" for cmd in self.command]
-        value = str(value)
-
-        if any(cmd_equal):
-            index = cmd_equal.index(True)
-            self.command[index] = f"--{arg}={value}"
-        elif any(cmd_space) and len(cmd_space) > cmd_space.index(True) + 1:
-            index = cmd_space.index(True)
-            self.command[index + 1] = value
-        else:
-            self.command.extend([f"--{arg}", value])
+        self.command_args.replace(arg, value)
 
     @property
     def daemon_name(self) -> str:
@@ -225,11 +215,7 @@ class CliGbatchDaemonPipeline(CliGbatchDaemonMixin):
             elif self.cwd:
                 # We need to get the cloud path, instead of the path in VM
                 # The only way is to parse the mounts
-                cloud_cwd = await mounted_to_cloud(
-                    self.cwd,   # type: ignore
-                    GbatchScheduler.DEFAULT_MOUNTED_ROOT,
-                    self.config.get("mount", self.config.get("volumes", []))
-                )
+                cloud_cwd = (await self.mount_table()).to_cloud(self.cwd)
                 if not cloud_cwd:
                     error_and_exit(
                         "Cannot determine the cloud path for the relative workdir "
@@ -375,12 +361,13 @@ class CliGbatchDaemonPipeline(CliGbatchDaemonMixin):
         Raises:
             SystemExit: If no command is provided.
         """
-        if not self.command:
+        if not self.job_command:
             error_and_exit("No command to run is provided.")
 
         xqute = await self._get_xqute(stdout_file=stdout_file)
-        job = await xqute.scheduler.create_job(0, self.command, envs=self.envs)
+        job = await xqute.scheduler.create_job(0, self.job_command, envs=self.envs)
         if await xqute.scheduler.job_is_running(job):
+            await self._check_stream_running(xqute, job)
             await self._run_nowait(xqute)
             return
 
@@ -389,8 +376,22 @@ class CliGbatchDaemonPipeline(CliGbatchDaemonMixin):
         if await log_file.a_exists():
             await log_file.a_unlink()
 
-        await xqute.feed(self.command, envs=self.envs)
+        # not to rewrite the files being read by the tasks of a running job
+        await self._write_task_files(xqute.scheduler)
+        await xqute.feed(self.job_command, envs=self.envs)
         await xqute.run_until_complete()
+        await self._exit_with_rc(job)
+
+    async def _extra_log_files(self) -> dict[str, PanPath]:
+        """Get the log file of the pipeline to archive, besides stdout/stderr."""
+        command_workdir = await self.command_workdir()
+        return {"RUN": command_workdir / "run-latest.log"}
+
+    async def _run_events(self):
+        """Prepare and run the daemon for events(), pulling the pipeline logs."""
+        await self.prepare()
+        command_workdir = await self.command_workdir()
+        await self._run_wait(stdout_file=command_workdir / "run-latest.log")
 
     async def run(self):
         """Execute the daemon pipeline based on configuration.
@@ -399,21 +400,28 @@ class CliGbatchDaemonPipeline(CliGbatchDaemonMixin):
         - version: Print version information
         - nowait: Run in detached mode
         - view_logs: Display logs from existing job
+        - search: Search the archived logs of existing jobs
+        - archive_logs: Archive the logs of existing jobs locally
         - default: Run and wait for completion
         """
         if self.config.get("version"):
             self._run_version()
             return
 
-        await self.setup()
-        command_workdir = await self.command_workdir()
-        stdout_file = command_workdir / "run-latest.log"
-        self._show_versions()
-        logger.info("Running in PIPELINE mode")
-        self._show_scheduler_opts()
-        if self.config.get("nowait"):
-            await self._run_nowait(stdout_file=stdout_file)
-        elif self.config.get("view_logs"):
-            await self._run_view_logs()
-        else:
-            await self._run_wait(stdout_file=stdout_file)
+        async with gs_session():
+            await self.setup()
+            command_workdir = await self.command_workdir()
+            stdout_file = command_workdir / "run-latest.log"
+            self._show_versions()
+            logger.info("Running in PIPELINE mode")
+            self._show_scheduler_opts()
+            if self.config.get("nowait"):
+                await self._run_nowait(stdout_file=stdout_file)
+            elif self.config.get("view_logs"):
+                await self._run_view_logs()
+            elif self.config.get("search"):
+                await self._run_search()
+            elif self.config.get("archive_logs"):
+                await self._run_archive_logs()
+            else:
+                await self._run_wait(stdout_file=stdout_file)
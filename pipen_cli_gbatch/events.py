@@ -0,0 +1,100 @@
+"""The events of the daemon job, yielded by `daemon.events()`.
+
+Instead of logging the status and the logs of the daemon job, the events are put
+into an asyncio queue by the plugin hooks, and consumed by:
+
+    >>> async for event in daemon.events():
+    ...     if isinstance(event, LogChunk):
+    ...         print(event.stream, event.lines)
+    ...     elif isinstance(event, JobFinished):
+    ...         print(event.status, event.rc, event.elapsed)
+
+The queue is bounded, so that a slow consumer applies back-pressure to the
+hooks (and so to the polling of the job).
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple, Optional, Union
+
+
+class JobSubmitted(NamedTuple):
+    """The daemon job is submitted.
+
+    Attributes:
+        jid: The job id.
+        time: The time of the event.
+        running: Whether the job was already submitted or running, in which
+            case the daemon doesn't wait for it, and no more events follow.
+    """
+
+    jid: Optional[str]
+    time: float
+    running: bool = False
+
+
+class JobStarted(NamedTuple):
+    """The daemon job is picked up by Google Cloud Batch and started.
+
+    Attributes:
+        jid: The job id.
+        time: The time of the event.
+    """
+
+    jid: Optional[str]
+    time: float
+
+
+class JobStatusChanged(NamedTuple):
+    """The status of the daemon job is changed.
+
+    Attributes:
+        status: The name of the new status (e.g. `RUNNING`, `KILLING`,
+            `SUCCEEDED`).
+        time: The time of the event.
+    """
+
+    status: str
+    time: float
+
+
+class LogChunk(NamedTuple):
+    """The lines pulled from the stdout or stderr of the daemon job.
+
+    Attributes:
+        stream: Either `STDOUT` or `STDERR`.
+        lines: The lines, without the trailing newlines.
+        time: The time of the event.
+    """
+
+    stream: str
+    lines: list
+    time: float
+
+
+class JobFinished(NamedTuple):
+    """The daemon job is finished.
+
+    Attributes:
+        status: One of `SUCCEEDED`, `FAILED` and `KILLED`.
+        rc: The return code of the job.
+        submitted_at: The time the job was submitted.
+        started_at: The time the job was started, if it was.
+        time: The time of the event, i.e. when the job was finished.
+    """
+
+    status: str
+    rc: int
+    submitted_at: Optional[float]
+    started_at: Optional[float]
+    time: float
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        """The running time of the job in seconds, if it was started."""
+        if self.started_at is None:
+            return None
+        return self.time - self.started_at
+
+
+JobEvent = Union[JobSubmitted, JobStarted, JobStatusChanged, LogChunk, JobFinished]
@@ -0,0 +1,340 @@
+"""Compressed transport of the logs from the VM of the job to the client.
+
+With `--compress-logs`, the stdout/stderr of the daemon job are piped through a
+small framer in the wrapped job script, which writes them to `job.stdout.gz` and
+`job.stderr.gz` as series of gzip members (frames). Each frame holds the output
+of about a second (`FRAME_INTERVAL`, cut at a line boundary when possible, up to
+`FRAME_MAX_SIZE`), and can be decoded on its own, so that the client only reads
+the new frames, and decompresses them incrementally (`FrameTailer`). Since a
+concatenation of gzip members is a valid gzip file, `gunzip -c job.stdout.gz`
+gives the whole log.
+
+Each frame is followed by an empty gzip member (the index), recording the
+compressed size of the frame in the extra field of its header, so that the
+frames can be read backwards from the end of the file with ranged reads, to
+find where the last lines (`--tail`) or the lines since a time (`--since`)
+start without downloading the whole file.
+
+The framer is written in python, so if `python3` is not available in the
+container, it is skipped, and the logs are written to `job.stdout` and
+`job.stderr` as usual, which are pulled as well.
+"""
+
+from __future__ import annotations
+
+import shlex
+import struct
+import tempfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncGenerator, Awaitable, Callable, Iterator
+
+from panpath import PanPath
+
+from .logs import (
+    TAIL_CHUNK_SIZE,
+    LogTailer,
+    ObjectStat,
+    parse_log_time,
+    read_range,
+    since_offset,
+    stat_object,
+    tail_offset,
+)
+
+# The suffix of the framed log files
+FRAMED_SUFFIX = ".gz"
+# The interval to cut a frame, in seconds
+FRAME_INTERVAL = 1.0
+# The maximum size of the (uncompressed) output in a frame
+FRAME_MAX_SIZE = 1024 * 1024
+
+# The header of the index member, with the extra field `GB` of 8 bytes
+INDEX_HEAD = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x0c\x00GB\x08\x00"
+# The empty deflate block, and the crc32 and the size of the empty content
+INDEX_TAIL = b"\x03\x00" + bytes(8)
+# The size of the index member following each frame
+INDEX_SIZE = len(INDEX_HEAD) + 8 + len(INDEX_TAIL)
+
+_FRAMER = r"""
+import gzip, os, select, struct, sys, time
+interval, maxsize = float(sys.argv[2]), int(sys.argv[3])
+out = open(sys.argv[1], "ab")
+fd = sys.stdin.fileno()
+buf, due, eof = b"", None, False
+while not eof:
+    if select.select([fd], [], [], interval)[0]:
+        chunk = os.read(fd, 65536)
+        eof = not chunk
+        buf += chunk
+        due = due or time.monotonic() + interval
+    now = time.monotonic()
+    if buf and (eof or len(buf) >= maxsize or now >= due):
+        cut = buf.rfind(b"\n") + 1
+        # a line without a newline for long is cut anyway, e.g. a prompt
+        if eof or len(buf) >= maxsize or not cut and now >= due + 5 * interval:
+            cut = len(buf)
+        if cut:
+            frame = gzip.compress(buf[:cut], 6)
+            # the index: an empty member with the size of the frame
+            out.write(frame + INDEX_HEAD + struct.pack("<Q", len(frame)) + INDEX_TAIL)
+            out.flush()
+            buf = buf[cut:]
+            due = now + interval if buf else None
+""".replace("INDEX_HEAD", repr(INDEX_HEAD)).replace("INDEX_TAIL", repr(INDEX_TAIL))
+
+FRAMER_INIT = f"""
+# Compressed logs (pipen-cli-gbatch): gzip frames, each decodable on its own
+_gbatch_frames() {{
+    python3 -c {shlex.quote(_FRAMER)} "$1" {FRAME_INTERVAL} {FRAME_MAX_SIZE}
+}}
+"""
+
+FRAMER_PREP = r"""
+# Compressed logs (pipen-cli-gbatch): pipe stdout/stderr through the framer
+if command -v python3 > /dev/null 2>&1 && [[ "$cmd" == *{redirects} ]]; then
+    cmd="{{ {{ ${{cmd%{redirects}}} | _gbatch_frames {stdout}; }} 2>&1 1>&3 \
+| _gbatch_frames {stderr}; }} 3>&1"
+fi
+"""
+
+
+def render_framer_prep(stdout_file: str, stderr_file: str) -> str:
+    """Render the bash code to pipe the output of the job through the framer.
+
+    The redirections of stdout/stderr to the files, appended to the command by
+    the wrapped job script, are replaced by the pipes to the framer, writing to
+    the files with `FRAMED_SUFFIX`.
+
+    Args:
+        stdout_file: The stdout file of the job, inside the VM.
+        stderr_file: The stderr file of the job, inside the VM.
+
+    Returns:
+        The bash code to be inserted into the wrapped job script.
+    """
+    redirects = f" 1>{stdout_file} 2>{stderr_file}"
+    return FRAMER_PREP.format(
+        redirects=shlex.quote(redirects),
+        stdout=shlex.quote(stdout_file + FRAMED_SUFFIX),
+        stderr=shlex.quote(stderr_file + FRAMED_SUFFIX),
+    )
+
+
+def parse_index(data: bytes) -> int | None:
+    """Parse an index member, see `INDEX_SIZE`.
+
+    Args:
+        data: The bytes of the index member.
+
+    Returns:
+        The compressed size of the frame before the index, or None if the bytes
+        are not an index member (e.g. the file is framed without the indexes).
+    """
+    if (
+        len(data) != INDEX_SIZE
+        or not data.startswith(INDEX_HEAD)
+        or not data.endswith(INDEX_TAIL)
+    ):
+        return None
+    return struct.unpack_from("<Q", data, len(INDEX_HEAD))[0]
+
+
+def iter_frames(data: bytes) -> Iterator[tuple[int, bytes]]:
+    """Decompress the complete frames at the beginning of the bytes.
+
+    Args:
+        data: The bytes starting at a frame boundary.
+
+    Yields:
+        The offset of the end of each frame in the bytes, and the decompressed
+        bytes of the frame. The incomplete last frame, if any, is not yielded.
+
+    Raises:
+        zlib.error: If the bytes are not gzip frames.
+    """
+    view = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        out = decompressor.decompress(view[pos:])
+        if not decompressor.eof:
+            return
+        pos = len(data) - len(decompressor.unused_data)
+        yield pos, out
+
+
+class FrameTailer(LogTailer):
+    """Pull the new lines of a framed log file, see `iter_frames`.
+
+    The offset only advances over the complete frames, so an incomplete frame
+    (still being written) is read again with the next pull.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # the offset of the frame where the residue starts
+        self._residue_start = 0
+        # the decompressed bytes to skip after seeking (--tail/--since)
+        self._skip = 0
+
+    @property
+    def consumed(self) -> int:
+        """The offset of the frames pulled, before the one of the residue."""
+        return self._residue_start if self.residue else self.offset
+
+    def _reset(self) -> None:
+        """Start over from the beginning of the log file."""
+        super()._reset()
+        self._residue_start = 0
+        self._skip = 0
+
+    def _feed(self, data: bytes) -> bytes:
+        """Decompress the complete frames read from the offset."""
+        start = self.offset
+        residue = self.residue
+        texts = []
+        for end, text in iter_frames(data):
+            if b"\n" in text or (text and not residue):
+                self._residue_start = start
+            _, newline, tail = text.rpartition(b"\n")
+            residue = tail if newline else residue + text
+            texts.append(text)
+            start = self.offset + end
+        self.offset = start
+
+        out = b"".join(texts)
+        if self._skip:
+            out, self._skip = out[self._skip:], max(0, self._skip - len(out))
+        return out
+
+    async def _iter_frames_backward(
+        self,
+        size: int,
+    ) -> AsyncGenerator[tuple[int, bytes], None]:
+        """Iterate over the frames from the end, by the indexes after them.
+
+        The bytes are read backwards in ranged chunks. If the file doesn't end
+        with an index (e.g. framed without the indexes, or a frame is being
+        written), the whole file is read and the frames are decompressed from
+        the beginning instead.
+
+        Args:
+            size: The size of the file.
+
+        Yields:
+            The offset of the start of each frame and the decompressed bytes.
+        """
+        end = start = size
+        buffer = b""
+        while end > 0:
+            if end - INDEX_SIZE < start and start > 0:
+                chunk_start = max(0, min(end - INDEX_SIZE, start - TAIL_CHUNK_SIZE))
+                buffer = await read_range(self.logfile, chunk_start, start) + buffer
+                start = chunk_start
+            frame_size = parse_index(buffer[end - INDEX_SIZE - start:end - start])
+            if frame_size is None or frame_size > end - INDEX_SIZE:
+                break
+            frame_start = end - INDEX_SIZE - frame_size
+            if frame_start < start:
+                buffer = await read_range(self.logfile, frame_start, start) + buffer
+                start = frame_start
+            yield frame_start, zlib.decompress(
+                buffer[frame_start - start:end - INDEX_SIZE - start],
+                wbits=31,
+            )
+            end = frame_start
+            buffer = buffer[:end - start]
+
+        if end == size:
+            data = await read_range(self.logfile, 0, size)  # type: ignore[arg-type]
+            frames, start = [], 0
+            for end, out in iter_frames(data):
+                frames.append((start, out))
+                start = end
+            for frame in reversed(frames):
+                yield frame
+
+    async def _seek_frames(
+        self,
+        offset_of: Callable[[PanPath, int], Awaitable[int]],
+        covered: Callable[[list[bytes]], bool],
+    ) -> None:
+        """Start from an offset of the decompressed log, found by `offset_of`.
+
+        The frames are read backwards until `covered` tells that the lines
+        completed by the frames read are enough to find the offset.
+        """
+        stat = await stat_object(self.logfile)  # type: ignore[arg-type]
+        if stat is None:
+            await self._seek(0, ObjectStat(0))
+            return
+
+        frames: list[tuple[int, bytes]] = []
+        head = b""
+        async for start, out in self._iter_frames_backward(stat.size):
+            frames.insert(0, (start, out))
+            # the first line may be continued by the frames before
+            head, *lines = (out + head).split(b"\n")
+            if covered(lines):
+                break
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # find the offset with the same logic as the plain log files
+            text = PanPath(Path(tmpdir) / "log")
+            text.write_bytes(b"".join(out for _, out in frames))
+            offset = await offset_of(text, text.stat().st_size)
+
+        start, skip = 0, offset
+        for i, (start, out) in enumerate(frames):
+            if skip < len(out) or i == len(frames) - 1:
+                break
+            skip -= len(out)
+        await self._seek(start, stat)
+        self._skip = skip
+
+    async def seek_tail(self, lines: int) -> None:
+        """Start from the last `lines` lines of the log file.
+
+        Args:
+            lines: The number of the lines.
+        """
+        if self.logfile is None:
+            return
+
+        count = 0
+
+        def covered(completed: list[bytes]) -> bool:
+            nonlocal count
+            count += len(completed)
+            # one more for the newline at the end of the file
+            return count > lines
+
+        await self._seek_frames(
+            lambda path, size: tail_offset(path, size, lines),
+            covered,
+        )
+
+    async def seek_since(self, since: datetime) -> None:
+        """Start from the first lines of pipen logs logged since a time.
+
+        Args:
+            since: The time since when the lines are logged.
+        """
+        if self.logfile is None:
+            return
+
+        now = datetime.now()
+
+        def covered(completed: list[bytes]) -> bool:
+            for line in completed:
+                time = parse_log_time(line, now)
+                if time is not None and time < since:
+                    return True
+            return False
+
+        await self._seek_frames(
+            lambda path, size: since_offset(path, size, since),
+            covered,
+        )
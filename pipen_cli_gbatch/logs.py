@@ -0,0 +1,835 @@
+"""Tail the logs of the daemon job incrementally with byte-range reads.
+
+`LogsPopulator` (from `pipen-poplog`) re-opens a cloud log file on each poll and
+seeks by streaming, so it effectively downloads the file from byte 0 every time.
+`LogTailer` stats the object first (size and generation), and only reads the new
+bytes with a ranged read. The offset of the consumed lines can be persisted to a
+local state file of the viewer (see `offset_state_file`), so that a later
+reattach (`--view-logs`) resumes from there instead of re-reading the whole file.
+Nothing is written to the workdir on the cloud, which may not be writable for the
+viewer, and is shared by the other viewers.
+
+Note that the generation of an object changes whenever it is updated (gcsfuse
+uploads a new generation on each flush), so it only tells whether the file has
+changed. Whether a file is rewritten (e.g. the job is resubmitted) is detected by
+the size shrinking, or, when resuming from a persisted offset, by the first bytes
+of the file (`HEAD_SIZE`) not matching the ones recorded.
+
+The lines are compacted before being returned (`LineCompactor`): the progress
+bars rewritten with carriage returns (e.g. by `tqdm`) are collapsed to their
+latest states, and the runs of repeated identical lines are reported once per
+pull.
+
+To attach to a long log without replaying it (`--tail` and `--since`), the file is
+read backwards from the end in ranged chunks (`TAIL_CHUNK_SIZE`), until the start
+of the lines to show is found.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import weakref
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TextIO,
+)
+
+from panpath import GSPath, PanPath
+
+if TYPE_CHECKING:  # pragma: no cover
+    from gcloud.aio.storage import Storage
+
+    from .cache import LogCache
+
+# The number of the first bytes of a log file to record, to tell if it's rewritten
+HEAD_SIZE = 64
+# The size of the chunks to read backwards from the end of a log file
+TAIL_CHUNK_SIZE = 64 * 1024
+
+# The timestamps of pipen logs, e.g. `05-17 12:00:00`, see `pipen.utils.logger`
+_LOG_TIME = re.compile(rb"^\[?(\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)([smhd])")
+_DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+# The directory of the offsets of the logs pulled by the viewers on this host
+OFFSET_STATE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "pipen-gbatch",
+    "offsets",
+)
+# The clients of Google Storage, one for each event loop
+_STORAGES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+# The number of the running `gs_session()` blocks of each event loop
+_SESSIONS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+class ObjectStat(NamedTuple):
+    """The stat of a log file.
+
+    Attributes:
+        size: The size of the file in bytes.
+        generation: The generation of the object on the cloud, which changes
+            when the object is rewritten. None for local files.
+    """
+
+    size: int
+    generation: Optional[str] = None
+
+
+async def gs_storage() -> Storage:
+    """Get the client of Google Storage shared in the running event loop.
+
+    The raw requests (metadata, ranged reads and listings with the sizes) are not
+    covered by the public API of `panpath`, so they are issued by a client of our
+    own, created once for each event loop.
+
+    Returns:
+        The client of Google Storage.
+    """
+    from gcloud.aio.storage import Storage
+
+    loop = asyncio.get_running_loop()
+    storage = _STORAGES.get(loop)
+    if storage is None:
+        storage = _STORAGES[loop] = Storage()
+    return storage
+
+
+@asynccontextmanager
+async def gs_session() -> AsyncIterator[None]:
+    """Close the client of Google Storage (see `gs_storage`) when done.
+
+    The blocks can be nested or run concurrently in the same event loop (e.g.
+    the daemons submitted by `submit_many`), and the shared client is closed
+    when the last one exits, so that no sessions are left unclosed.
+    """
+    loop = asyncio.get_running_loop()
+    _SESSIONS[loop] = _SESSIONS.get(loop, 0) + 1
+    try:
+        yield
+    finally:
+        _SESSIONS[loop] -= 1
+        if not _SESSIONS[loop]:
+            del _SESSIONS[loop]
+            storage = _STORAGES.pop(loop, None)
+            if storage is not None:
+                await storage.close()
+
+
+def offset_state_file(logfile: str | PanPath) -> Path:
+    """Get the local state file to persist the offset of a log file to.
+
+    Args:
+        logfile: The path to the log file.
+
+    Returns:
+        The state file under `OFFSET_STATE_DIR`, keyed by the URI of the log file.
+    """
+    digest = hashlib.sha1(str(logfile).encode()).hexdigest()
+    return Path(OFFSET_STATE_DIR) / f"{digest}.offset"
+
+
+def _is_not_found(exc: Exception) -> bool:
+    """Check if an exception from the cloud client is a 404."""
+    return getattr(exc, "status", None) == 404
+
+
+async def stat_object(path: PanPath) -> ObjectStat | None:
+    """Get the size (and the generation) of a log file.
+
+    For Google Storage Bucket paths, a single metadata request is issued.
+
+    Args:
+        path: The path to the log file.
+
+    Returns:
+        The stat of the file, or None if it doesn't exist.
+    """
+    if isinstance(path, GSPath):
+        storage = await gs_storage()
+        try:
+            meta = await storage.download_metadata(path.parts[1], path.key)
+        except Exception as exc:
+            if _is_not_found(exc):
+                return None
+            raise
+        return ObjectStat(int(meta.get("size", 0)), meta.get("generation"))
+
+    try:
+        return ObjectStat((await path.a_stat()).st_size)
+    except FileNotFoundError:
+        return None
+
+
+async def read_range(path: PanPath, start: int, end: int) -> bytes:
+    """Read the bytes in `[start, end)` of a log file.
+
+    Args:
+        path: The path to the log file.
+        start: The start offset.
+        end: The end offset (exclusive).
+
+    Returns:
+        The bytes read.
+    """
+    if end <= start:
+        return b""
+
+    if isinstance(path, GSPath):
+        storage = await gs_storage()
+        return await storage.download(
+            path.parts[1],
+            path.key,
+            headers={"Range": f"bytes={start}-{end - 1}"},
+        )
+
+    async with path.a_open("rb") as fh:
+        await fh.seek(start)
+        return await fh.read(end - start)
+
+
+def parse_duration(duration: str) -> timedelta:
+    """Parse a duration, e.g. `90s`, `10m`, `1h30m` or `2d`.
+
+    Args:
+        duration: The duration, with units of `s`, `m`, `h` and `d`.
+
+    Returns:
+        The parsed duration.
+
+    Raises:
+        ValueError: If the duration is invalid.
+    """
+    duration = duration.strip().lower()
+    matches = list(_DURATION.finditer(duration))
+    if not matches or "".join(m.group(0) for m in matches) != duration:
+        raise ValueError(
+            f"Invalid duration: {duration!r}, expecting something like "
+            "'90s', '10m', '1h30m' or '2d'."
+        )
+
+    return sum(
+        (
+            timedelta(**{_DURATION_UNITS[m.group(2)]: float(m.group(1))})
+            for m in matches
+        ),
+        timedelta(),
+    )
+
+
+def parse_log_time(line: bytes, now: datetime) -> datetime | None:
+    """Parse the timestamp at the beginning of a line of pipen logs.
+
+    The timestamps have no years, so the year of `now` is assumed, unless the
+    time would be in the future.
+
+    Args:
+        line: The line of the logs.
+        now: The current time.
+
+    Returns:
+        The time of the line, or None if the line is not timestamped.
+    """
+    matched = _LOG_TIME.match(line)
+    if not matched:
+        return None
+
+    try:
+        time = datetime.strptime(
+            f"{now.year}-{matched.group(1).decode()}",
+            "%Y-%m-%d %H:%M:%S",
+        )
+    except ValueError:  # e.g. 02-29 in a non-leap year
+        return None
+    if time > now + timedelta(days=1):
+        time = time.replace(year=now.year - 1)
+    return time
+
+
+async def iter_lines_backward(
+    path: PanPath,
+    size: int,
+    chunk_size: int = TAIL_CHUNK_SIZE,
+) -> AsyncGenerator[tuple[int, bytes], None]:
+    """Iterate over the lines of a log file from the end, in ranged chunks.
+
+    Args:
+        path: The path to the log file.
+        size: The size of the file, from which to read backwards.
+        chunk_size: The number of bytes to read each time.
+
+    Yields:
+        The offset of the start of each line and the line, without the newline.
+        An incomplete last line is also yielded.
+    """
+    end = size
+    buffer = b""
+    last = True
+    while end > 0:
+        start = max(0, end - chunk_size)
+        buffer = await read_range(path, start, end) + buffer
+        end = start
+        pieces = buffer.split(b"\n")
+        # the first piece may be a part of a line, unless it's the start of the file
+        buffer = pieces.pop(0) if start > 0 else b""
+        pos = start + len(buffer) + (1 if start > 0 else 0) + len(b"\n".join(pieces))
+        for piece in reversed(pieces):
+            pos -= len(piece)
+            if piece or not last:  # skip the newline at the end of the file
+                yield pos, piece
+            last = False
+            pos -= 1
+
+
+async def tail_offset(path: PanPath, size: int, lines: int) -> int:
+    """Find the offset where the last `lines` lines of a log file start.
+
+    Args:
+        path: The path to the log file.
+        size: The size of the file.
+        lines: The number of the lines.
+
+    Returns:
+        The offset of the start of the last `lines` lines.
+    """
+    offset = size
+    if lines <= 0:
+        return offset
+
+    count = 0
+    async for offset, _ in iter_lines_backward(path, size):
+        count += 1
+        if count >= lines:
+            break
+    return offset
+
+
+async def since_offset(path: PanPath, size: int, since: datetime) -> int:
+    """Find the offset of the first lines of pipen logs logged since a time.
+
+    The lines are scanned backwards until one timestamped before `since`. The
+    lines without timestamps (e.g. tracebacks) belong to the timestamped line
+    before them.
+
+    Args:
+        path: The path to the log file.
+        size: The size of the file.
+        since: The time since when the lines are logged.
+
+    Returns:
+        The offset of the start of the first line logged since `since`.
+    """
+    now = datetime.now()
+    offset = size
+    async for start, line in iter_lines_backward(path, size):
+        time = parse_log_time(line, now)
+        if time is None:
+            continue
+        if time < since:
+            break
+        offset = start
+    return offset
+
+
+async def list_logs(
+    workdir: PanPath,
+    pattern: str,
+    filenames: Sequence[str],
+) -> dict[str, tuple[PanPath, ObjectStat]]:
+    """List the log files of the daemons matching a name pattern under a workdir.
+
+    For Google Storage Bucket paths, the log files of all the daemons are listed
+    by a single (paged) listing request, with their sizes and generations.
+
+    Args:
+        workdir: The workdir of the daemons.
+        pattern: The glob pattern of the names of the daemons.
+        filenames: The names of the log files, e.g. `job.stdout`.
+
+    Returns:
+        A dict with the names of the daemons and the names of the log files
+        (`<name>/<filename>`) as the keys, and the paths and the stats of the
+        log files as the values.
+    """
+    out = {}
+    if not isinstance(workdir, GSPath):
+        async for daemon_dir in workdir.a_glob(pattern):
+            for filename in filenames:
+                path = daemon_dir / "0" / filename
+                stat = await stat_object(path)
+                if stat is not None:
+                    out[f"{daemon_dir.name}/{filename}"] = (path, stat)
+        return out
+
+    bucket = workdir.parts[1]
+    base = f"{workdir.key.rstrip('/')}/" if workdir.key else ""
+    glob = filenames[0] if len(filenames) == 1 else f"{{{','.join(filenames)}}}"
+    params = {
+        # the literal part of the pattern narrows the listing
+        "prefix": base + re.split(r"[*?\[{]", pattern, maxsplit=1)[0],
+        "matchGlob": f"{base}{pattern}/0/{glob}",
+    }
+    storage = await gs_storage()
+    while True:
+        response = await storage.list_objects(bucket, params=params)
+        for item in response.get("items", []):
+            name, _, rest = item["name"][len(base):].partition("/")
+            filename = rest[2:] if rest.startswith("0/") else None
+            if filename in filenames and fnmatchcase(name, pattern):
+                out[f"{name}/{filename}"] = (
+                    PanPath(f"gs://{bucket}/{item['name']}"),
+                    ObjectStat(int(item.get("size", 0)), item.get("generation")),
+                )
+
+        if not response.get("nextPageToken"):
+            break
+        params["pageToken"] = response["nextPageToken"]
+
+    return out
+
+
+class LogObjectPoller:
+    """Detect the changed log files of the daemons by listing them.
+
+    Instead of fetching (or stat'ing) each log file on each poll, the log files
+    of the daemons matching a name pattern are listed at once (a single request
+    for Google Storage Bucket paths, see `list_logs()`), and their sizes and
+    generations are compared against the ones from the last poll, so that only
+    the changed ones are read.
+
+    Attributes:
+        workdir: The workdir of the daemons.
+        pattern: The glob pattern of the names of the daemons.
+        filenames: The names of the log files, e.g. `job.stdout`.
+        table: The stats of the log files from the last poll.
+    """
+
+    def __init__(
+        self,
+        workdir: str | PanPath,
+        pattern: str,
+        filenames: Sequence[str],
+    ) -> None:
+        """Initialize the poller.
+
+        Args:
+            workdir: The workdir of the daemons.
+            pattern: The glob pattern (or the name) of the daemons.
+            filenames: The names of the log files, e.g. `job.stdout`.
+        """
+        self.workdir = PanPath(workdir) if isinstance(workdir, str) else workdir
+        self.pattern = pattern
+        self.filenames = list(filenames)
+        self.table: dict[str, ObjectStat] = {}
+
+    async def poll(self) -> dict[str, tuple[PanPath, ObjectStat]]:
+        """List the log files, and find the changed ones since the last poll.
+
+        Returns:
+            The log files that are new or changed, keyed by
+            `<daemon name>/<log file name>`, with the paths and the stats.
+        """
+        listed = await list_logs(self.workdir, self.pattern, self.filenames)
+        changed = {
+            key: (path, stat)
+            for key, (path, stat) in listed.items()
+            if self.table.get(key) != stat
+        }
+        self.table = {key: stat for key, (_, stat) in listed.items()}
+        return changed
+
+
+def write_lines(lines: list[str], file: TextIO | None = None, prefix: str = "") -> None:
+    """Write the lines pulled in a single batch, bypassing logging.
+
+    The lines are written to the underlying binary buffer of the file (if any),
+    so that it's cheap for a job emitting lots of lines, and the output can be
+    piped as is.
+
+    Args:
+        lines: The lines, without the trailing newlines.
+        file: The file to write to, `sys.stdout` by default.
+        prefix: The prefix of each line.
+    """
+    if not lines:
+        return
+
+    file = file or sys.stdout
+    data = "".join(f"{prefix}{line}\n" for line in lines)
+    buffer = getattr(file, "buffer", None)
+    if buffer is None:
+        file.write(data)
+        file.flush()
+        return
+
+    # keep the order with what's written to the text layer
+    file.flush()
+    buffer.write(data.encode(getattr(file, "encoding", None) or "utf-8", "replace"))
+    buffer.flush()
+
+
+def collapse_cr(line: bytes) -> bytes:
+    """Collapse the carriage-return rewrites of a line to its latest state.
+
+    Args:
+        line: The line, without the trailing newline.
+
+    Returns:
+        The text after the last carriage return (ignoring the trailing ones).
+    """
+    return line.rstrip(b"\r").rpartition(b"\r")[2]
+
+
+class LineCompactor:
+    """Compact the lines pulled from a log file, across the pulls.
+
+    Attributes:
+        collapse_repeats: Whether to collapse the runs of repeated identical
+            (non-empty) lines.
+    """
+
+    def __init__(self, collapse_repeats: bool = True) -> None:
+        """Initialize the compactor.
+
+        Args:
+            collapse_repeats: Whether to collapse the runs of repeated identical
+                (non-empty) lines. The first line of a run is kept, and the
+                number of the others is reported once per pull.
+        """
+        self.collapse_repeats = collapse_repeats
+        self._last: bytes | None = None
+
+    def compact(self, lines: list[bytes]) -> list[bytes]:
+        """Compact the lines of a pull.
+
+        Args:
+            lines: The lines, without the trailing newlines.
+
+        Returns:
+            The compacted lines.
+        """
+        out = []
+        repeats = 0
+        for line in lines:
+            line = collapse_cr(line)
+            if self.collapse_repeats and line and line == self._last:
+                repeats += 1
+                continue
+
+            if repeats:
+                out.append(_repeated(repeats))
+                repeats = 0
+            out.append(line)
+            self._last = line
+
+        if repeats:
+            out.append(_repeated(repeats))
+        return out
+
+
+class LineFilter:
+    """Filter the lines pulled by regular expressions, like `grep`.
+
+    The patterns are compiled once (as bytes patterns), and the lines are
+    filtered before being decoded.
+
+    Attributes:
+        grep: The compiled pattern the lines to keep must match.
+        grep_v: The compiled pattern the lines to keep must not match.
+    """
+
+    def __init__(self, grep: str | None = None, grep_v: str | None = None) -> None:
+        """Initialize the filter.
+
+        Args:
+            grep: The pattern the lines to keep must match.
+            grep_v: The pattern the lines to keep must not match.
+
+        Raises:
+            re.error: If any of the patterns is invalid.
+        """
+        self.grep = re.compile(grep.encode()) if grep else None
+        self.grep_v = re.compile(grep_v.encode()) if grep_v else None
+
+    def filter(self, lines: list[bytes]) -> list[bytes]:
+        """Filter the lines.
+
+        Args:
+            lines: The lines, without the trailing newlines.
+
+        Returns:
+            The lines to keep.
+        """
+        if self.grep:
+            lines = [line for line in lines if self.grep.search(line)]
+        if self.grep_v:
+            lines = [line for line in lines if not self.grep_v.search(line)]
+        return lines
+
+
+def _repeated(n: int) -> bytes:
+    """The line to report the number of the repeats of the last line."""
+    return f"... (the line above repeated {n} more time{'s' if n > 1 else ''})".encode()
+
+
+class LogTailer:
+    """Pull the new lines of a log file, compatible with `LogsPopulator`.
+
+    Attributes:
+        logfile: The path to the log file.
+        state_file: The local file to persist the offset to, if any, see
+            `offset_state_file`.
+        residue: The incomplete last line from the last read.
+        counter: The number of lines pulled, see `increment_counter()`.
+        offset: The offset of the bytes read so far.
+        generation: The generation of the log file when it was last read.
+        head: The first bytes of the log file.
+        compactor: The compactor of the lines pulled.
+        line_filter: The filter of the lines pulled, if any.
+        cache: The local cache to read the cloud log files through, if any.
+    """
+
+    def __init__(
+        self,
+        logfile: str | PanPath | None = None,
+        state_file: str | Path | PanPath | None = None,
+        collapse_repeats: bool = True,
+        line_filter: LineFilter | None = None,
+        cache: LogCache | None = None,
+    ) -> None:
+        """Initialize the tailer.
+
+        Args:
+            logfile: The path to the log file.
+            state_file: The local file to persist the offset to, if any, see
+                `offset_state_file`.
+            collapse_repeats: Whether to collapse the runs of repeated identical
+                lines, see `LineCompactor`.
+            line_filter: The filter of the lines pulled, applied to the complete
+                lines (with carriage returns collapsed) before they are decoded.
+            cache: The local cache to read the cloud log files through, shared
+                with the other viewers on the same host, see `LogCache`.
+        """
+        self.logfile = PanPath(logfile) if isinstance(logfile, str) else logfile
+        self.state_file = PanPath(state_file) if state_file else None
+        self.residue: bytes = b""
+        self.counter = 0
+        self.offset = 0
+        self.generation: str | None = None
+        self.head: bytes = b""
+        self.compactor = LineCompactor(collapse_repeats)
+        self.line_filter = line_filter
+        self.cache = cache
+        self._state_loaded = False
+        # the head from the persisted state to verify against the file
+        self._head_to_verify: bytes | None = None
+
+    def increment_counter(self, n: int = 1) -> None:
+        """Increment the counter of the lines pulled."""
+        self.counter += n
+
+    @property
+    def consumed(self) -> int:
+        """The offset of the complete lines pulled so far."""
+        return self.offset - len(self.residue or b"")
+
+    async def _load_state(self) -> None:
+        """Load the persisted offset, if it is for the same log file."""
+        self._state_loaded = True
+        if not self.state_file or not await self.state_file.a_exists():
+            return
+
+        try:
+            state: dict[str, Any] = json.loads(await self.state_file.a_read_text())
+        except (ValueError, OSError):
+            return
+
+        if state.get("logfile") == str(self.logfile):
+            self.offset = int(state.get("offset", 0))
+            self.generation = state.get("generation")
+            self.head = bytes.fromhex(state.get("head", ""))
+            self._head_to_verify = self.head
+            self.residue = b""
+
+    async def _read(self, start: int, end: int, stat: ObjectStat) -> bytes:
+        """Read the bytes of the log file, through the cache for cloud files."""
+        if self.cache is not None and isinstance(self.logfile, GSPath):
+            return await self.cache.read_range(self.logfile, start, end, stat)
+        return await read_range(self.logfile, start, end)  # type: ignore[arg-type]
+
+    async def _seek(self, offset: int | None, stat: ObjectStat) -> None:
+        """Start from an offset, instead of the persisted one."""
+        self._state_loaded = True
+        self._head_to_verify = None
+        self.residue = b""
+        self.generation = None
+        self.offset = offset or 0
+        self.head = (
+            await read_range(self.logfile, 0, min(HEAD_SIZE, stat.size))
+            if self.offset
+            else b""
+        )
+
+    async def seek_tail(self, lines: int) -> None:
+        """Start from the last `lines` lines of the log file.
+
+        Args:
+            lines: The number of the lines.
+        """
+        if self.logfile is None:
+            return
+
+        stat = await stat_object(self.logfile)
+        if stat is None:
+            await self._seek(0, ObjectStat(0))
+        else:
+            await self._seek(await tail_offset(self.logfile, stat.size, lines), stat)
+
+    async def seek_since(self, since: datetime) -> None:
+        """Start from the first lines of pipen logs logged since a time.
+
+        Args:
+            since: The time since when the lines are logged.
+        """
+        if self.logfile is None:
+            return
+
+        stat = await stat_object(self.logfile)
+        if stat is None:
+            await self._seek(0, ObjectStat(0))
+        else:
+            await self._seek(await since_offset(self.logfile, stat.size, since), stat)
+
+    def _reset(self) -> None:
+        """Start over from the beginning of the log file."""
+        self.offset = 0
+        self.residue = b""
+        self.head = b""
+
+    async def save_state(self) -> None:
+        """Persist the offset of the complete lines pulled so far.
+
+        The offset is only a hint to resume from, so it is not persisted if the
+        state file is not writable.
+        """
+        if not self.state_file or self.logfile is None:
+            return
+
+        content = json.dumps(
+            {
+                "logfile": str(self.logfile),
+                "offset": self.consumed,
+                "generation": self.generation,
+                "head": self.head.hex(),
+            }
+        )
+        # written to a temporary file and renamed, for the concurrent viewers
+        tmp_file = self.state_file.with_name(
+            f"{self.state_file.name}.{os.getpid()}.tmp"
+        )
+        with suppress(Exception):
+            await self.state_file.parent.a_mkdir(parents=True, exist_ok=True)
+            await tmp_file.a_write_text(content)
+            await tmp_file.a_replace(self.state_file)
+
+    async def populate(self) -> list[str]:
+        """Pull the new complete lines of the log file.
+
+        Returns:
+            The new lines, without the trailing newlines. The incomplete last line
+            is kept as the residue for the next pull.
+        """
+        if self.logfile is None:
+            return []
+
+        return await self.populate_stat(await stat_object(self.logfile))
+
+    async def populate_stat(self, stat: ObjectStat | None) -> list[str]:
+        """Pull the new complete lines of the log file, with its stat known.
+
+        This is used when the stats of many log files are fetched at once (e.g.
+        by a listing), so that no request is issued for the unchanged files.
+
+        Args:
+            stat: The stat of the log file, None if it doesn't exist.
+
+        Returns:
+            The new lines, without the trailing newlines.
+        """
+        if self.logfile is None or stat is None:
+            return []
+
+        if not self._state_loaded:
+            await self._load_state()
+
+        if self._head_to_verify is not None:
+            head = self._head_to_verify
+            self._head_to_verify = None
+            if (
+                stat.size < len(head)
+                or await self._read(0, len(head), stat) != head
+            ):
+                self._reset()
+
+        if stat.size < self.offset:
+            # the file is rewritten (e.g. the job is resubmitted)
+            self._reset()
+        elif stat.generation is not None and stat.generation == self.generation:
+            # not changed since last read
+            return []
+        self.generation = stat.generation
+
+        if stat.size <= self.offset:
+            return []
+
+        data = await self._read(self.offset, stat.size, stat)
+        if len(self.head) < HEAD_SIZE and self.offset <= len(self.head):
+            self.head = (self.head + data[len(self.head) - self.offset:])[:HEAD_SIZE]
+        data = self._feed(data)
+        # only split by newlines, carriage returns are collapsed by the compactor
+        lines = ((self.residue or b"") + data).split(b"\n")
+        self.residue = lines.pop(-1)
+
+        if lines:
+            await self.save_state()
+        return self._decode(lines)
+
+    def _feed(self, data: bytes) -> bytes:
+        """Advance the offset over the bytes read, returning the bytes of lines."""
+        self.offset += len(data)
+        return data
+
+    def _decode(self, lines: list[bytes]) -> list[str]:
+        """Filter, compact and decode the complete lines."""
+        if self.line_filter:
+            lines = self.line_filter.filter([collapse_cr(line) for line in lines])
+        return [line.decode() for line in self.compactor.compact(lines)]
+
+    def residue_lines(self) -> list[str]:
+        """The incomplete last line, compacted, e.g. to show it at the end.
+
+        Returns:
+            The compacted residue as lines, empty if there is no residue.
+        """
+        if not self.residue:
+            return []
+        return self._decode([self.residue])
+
+    async def destroy(self) -> None:
+        """Persist the offset, there is no handler to close."""
+        await self.save_state()
@@ -1,22 +1,97 @@
 from __future__ import annotations
 
 import asyncio
+import re
+import shlex
 import sys
+import time
+from copy import deepcopy
+from datetime import datetime
 from abc import abstractmethod
 from argparse import Namespace
+from contextlib import suppress
 from pathlib import Path
+from typing import AsyncGenerator
 
 from diot import Diot
-from simpleconf import Config
 from panpath import LocalPath, PanPath, GSPath
+from rich.console import Console
 from rich.logging import RichHandler
-from xqute import Xqute, plugin
-from xqute.utils import logger, sanitize_mounts
+from xqute import Scheduler, Xqute, plugin
+from xqute.schedulers import get_scheduler
+from xqute.schedulers.gbatch_scheduler import GbatchScheduler
+from xqute.utils import logger
 from pipen import __version__ as pipen_version
-from pipen_poplog import LogsPopulator
 
+from .archive import ARCHIVE_FILE, LogArchive
+from .cache import DEFAULT_LOG_CACHE_DIR, LogCache
+from .command import CommandArgs
+from .mounts import MountTable
+from .events import JobEvent, JobSubmitted
+from .frames import FRAMED_SUFFIX, FrameTailer
+from .logs import (
+    LineFilter,
+    LogObjectPoller,
+    LogTailer,
+    gs_session,
+    list_logs,
+    offset_state_file,
+    parse_duration,
+    write_lines,
+)
+from .polling import AdaptiveInterval
+from .scatter import (
+    SCATTER_LIST,
+    SCATTER_MOUNT,
+    list_inputs,
+    shard_inputs,
+    split_pattern,
+)
+from .tasks import (
+    POOL_RUNNER,
+    TASK_RUNNER,
+    TASKS_MANIFEST,
+    GbatchTasksScheduler,
+    expand_sweep,
+    format_manifest,
+    load_batch_file,
+    load_sweep_file,
+)
 from .version import __version__
 
+# Options for the daemon itself, not passed to the scheduler
+DAEMON_OPTS = (
+    "workdir",
+    "error_strategy",
+    "num_retries",
+    "jobname_prefix",
+    "COMMAND",
+    "nowait",
+    "view_logs",
+    "command",
+    "name",
+    "profile",
+    "version",
+    "loglevel",
+    "mounts",
+    "plain",
+    "batch_file",
+    "sweep",
+    "scatter",
+    "shards",
+    "parallel",
+    "tail",
+    "since",
+    "raw_logs",
+    "stream",
+    "grep",
+    "grep_v",
+    "log_cache",
+    "archive_logs",
+    "search",
+    "compress_logs",
+)
+
 
 def error_and_exit(msg: str) -> None:
     """Print error message and exit."""
@@ -39,24 +114,19 @@ async def mounted_to_cloud(
 ) -> PanPath | None:
     """Convert a mounted local path to a Google Storage path based on mounts.
 
+    The mounts are sanitized for each call, use `MountTable` (see
+    `CliGbatchDaemonMixin.mount_table()`) to convert multiple paths.
+
     Args:
         mounted: The local path that is mounted.
+        mounted_root: The root of the named mounts in the VM.
         mounts: A single mount string or a list of mount strings in the format
             "source:target".
 
     Returns:
         The corresponding Google Storage path if found, None otherwise.
     """
-    mounts: list[tuple[PanPath, Path]] = (
-        await sanitize_mounts(mounts, mounted_root)
-    )[0]
-
-    for host, mount in mounts:
-        if mounted.is_relative_to(mount):
-            rel = mounted.relative_to(mount)
-            return PanPath(host) / rel
-
-    return None
+    return (await MountTable.build(mounts, mounted_root)).to_cloud(mounted)
 
 
 class CliGbatchDaemonMixin:
@@ -103,11 +173,21 @@ class CliGbatchDaemonMixin:
                 for key, val in (item.split("=", 1) for item in self.config.labels)
             }
         self.command = command
-        # cache for command arguments
-        self._command_args: dict = {}
+        # the index of the command arguments, see command_args
+        self._command_args: CommandArgs | None = None
         # envs sent to the command, can be used in the future to pass some information
         # to the command without using command line arguments
         self.envs: dict = {}
+        # commands to run as the tasks of a single job (e.g. from --batch-file)
+        self.tasks: list[str] = []
+        # the parameters of the tasks (e.g. rows from --sweep), for the manifest
+        self.task_params: list[dict[str, str]] = []
+        # the paths (inside the VM) of the input files of each task (--scatter)
+        self.task_inputs: list[list[str]] = []
+        # the queue of the events of the daemon job, see events()
+        self._events: asyncio.Queue | None = None
+        # the mounts and the table built from them, see mount_table()
+        self._mount_table: tuple[list[str], MountTable] | None = None
 
     @property
     @abstractmethod
@@ -136,6 +216,13 @@ class CliGbatchDaemonMixin:
             and truncated if necessary)
         """
 
+    @property
+    def command_args(self) -> CommandArgs:
+        """The index of the arguments of the command, built once."""
+        if self._command_args is None or self._command_args.command is not self.command:
+            self._command_args = CommandArgs(self.command)
+        return self._command_args
+
     async def _get_arg_from_command(self, arg: str) -> str | None:
         """Get the value of the given argument from the command line.
 
@@ -148,32 +235,245 @@ class CliGbatchDaemonMixin:
         Raises:
             FileNotFoundError: If a config file is specified but doesn't exist.
         """
-        if arg in self._command_args:
-            return self._command_args[arg]
-
-        cmd_equal = [cmd.startswith(f"--{arg}=") for cmd in self.command]
-        cmd_space = [cmd == f"--{arg}" for cmd in self.command]
-        cmd_at = [cmd.startswith("@") for cmd in self.command]
-
-        if any(cmd_equal):
-            index = cmd_equal.index(True)
-            value = self.command[index].split("=", 1)[1]
-        elif any(cmd_space) and len(cmd_space) > cmd_space.index(True) + 1:
-            index = cmd_space.index(True)
-            value = self.command[index + 1]
-        elif any(cmd_at):
-            index = cmd_at.index(True)
-            config_file = PanPath(self.command[index][1:])
-            if not await config_file.a_exists():
-                raise FileNotFoundError(f"Config file not found: {config_file}")
-            # content = await config_file.a_read_text()
-            conf = await Config.a_load_one(config_file)
-            value = conf.get(arg, None)
-        else:
-            value = None
+        return await self.command_args.get(arg)
+
+    @property
+    def job_command(self) -> list[str]:
+        """The command of the daemon job.
+
+        When running in the task array mode, it is the task runner defined in the
+        wrapped job script, which picks the command of each task, or the pool
+        runner, which runs all the commands in a single task.
+        """
+        if self.tasks and self.parallel is not None:
+            return [POOL_RUNNER]
+        if self.tasks:
+            return [TASK_RUNNER]
+        return self.command
+
+    @property
+    def raw_logs(self) -> bool:
+        """Whether to write the logs of the job as is, instead of logging them."""
+        return bool(self.config.get("raw_logs") or self.config.get("stream"))
+
+    def line_filter(self) -> LineFilter | None:
+        """Compile the filter of the lines of the logs from `grep` and `grep_v`.
+
+        Returns:
+            The filter, or None if neither is given.
+
+        Raises:
+            SystemExit: If any of the patterns is invalid.
+        """
+        grep = self.config.get("grep")
+        grep_v = self.config.get("grep_v")
+        if not grep and not grep_v:
+            return None
+
+        try:
+            return LineFilter(grep, grep_v)
+        except re.error as e:
+            error_and_exit(f"Invalid pattern for --grep/--grep-v: {e}")
+
+    @property
+    def parallel(self) -> int | None:
+        """The size of the local pool to run the tasks in a single task."""
+        return self.config.get("parallel")
+
+    async def _load_tasks(self):
+        """Load the commands to run as the tasks of a single job.
+
+        Raises:
+            SystemExit: If the batch file, the sweep file or the scatter
+                pattern is not valid.
+        """
+        if self.parallel is not None and (
+            not isinstance(self.parallel, int) or self.parallel < 0
+        ):
+            error_and_exit("`--parallel` must be a non-negative integer.")
 
-        self._command_args[arg] = value
-        return value
+        if self.parallel is not None and not any(
+            self.config.get(opt) for opt in ("batch_file", "sweep", "scatter")
+        ):
+            error_and_exit(
+                "`--parallel` can only be used with `--batch-file`, `--sweep` "
+                "or `--scatter` for `pipen gbatch`."
+            )
+
+        modes = [
+            opt for opt in ("batch_file", "sweep", "scatter") if self.config.get(opt)
+        ]
+        if len(modes) > 1:
+            error_and_exit(
+                " and ".join(f"`--{opt.replace('_', '-')}`" for opt in modes)
+                + " cannot be used together for `pipen gbatch`."
+            )
+
+        if self.config.get("sweep"):
+            await self._load_sweep(self.config["sweep"])
+            return
+
+        if self.config.get("scatter"):
+            await self._load_scatter(self.config["scatter"])
+            return
+
+        batch_file = self.config.get("batch_file")
+
+        if not batch_file:
+            return
+
+        if self.command:
+            error_and_exit(
+                "No command should be provided after `--` when `--batch-file` "
+                "is used for `pipen gbatch`."
+            )
+
+        try:
+            self.tasks = await load_batch_file(batch_file)
+        except FileNotFoundError as exc:
+            error_and_exit(str(exc))
+
+        if not self.tasks:
+            error_and_exit(f"No commands found in the batch file: {batch_file}")
+
+    async def _load_sweep(self, sweep: str):
+        """Expand the command template with the rows of the sweep file.
+
+        Args:
+            sweep: The path to the sweep file.
+
+        Raises:
+            SystemExit: If the sweep file or the command template is not valid.
+        """
+        if not self.command:
+            error_and_exit(
+                "A command template should be provided after `--` when `--sweep` "
+                "is used for `pipen gbatch`."
+            )
+
+        try:
+            self.task_params = await load_sweep_file(sweep)
+        except (FileNotFoundError, ValueError) as exc:
+            error_and_exit(str(exc))
+
+        if not self.task_params:
+            error_and_exit(f"No rows found in the sweep file: {sweep}")
+
+        try:
+            self.tasks = expand_sweep(self.command, self.task_params)
+        except ValueError as exc:
+            error_and_exit(str(exc))
+
+    async def _load_scatter(self, pattern: str):
+        """Shard the input files matching the pattern, one shard per task.
+
+        The base directory of the pattern is mounted to the VM, and each task
+        runs the command with `GBATCH_SCATTER_LIST` pointing to the list file
+        of the input files (paths inside the VM) of its shard.
+
+        Args:
+            pattern: The glob pattern of the input files.
+
+        Raises:
+            SystemExit: If the command, the number of shards or the pattern
+                is not valid.
+        """
+        if not self.command:
+            error_and_exit(
+                "A command should be provided after `--` when `--scatter` "
+                "is used for `pipen gbatch`."
+            )
+
+        shards = self.config.get("shards")
+        if not isinstance(shards, int) or shards < 1:
+            error_and_exit(
+                "A positive `--shards` is required when `--scatter` "
+                "is used for `pipen gbatch`."
+            )
+
+        inputs = await list_inputs(pattern)
+        if not inputs:
+            error_and_exit(f"No input files found matching: {pattern}")
+
+        base, _ = split_pattern(pattern)
+        self._add_named_mount(SCATTER_MOUNT, base)
+        mounted_base = (await self.mount_table()).named_mounts[SCATTER_MOUNT]
+
+        sizes = dict(inputs)
+        command = (
+            f"export {SCATTER_MOUNT}={shlex.quote(mounted_base)}; "
+            f'export GBATCH_SCATTER_LIST="$GBATCH_TASK_DIR/{SCATTER_LIST}"; '
+            f"{shlex.join(self.command)}"
+        )
+        for shard in shard_inputs(inputs, shards):
+            self.task_inputs.append(
+                [
+                    f"{mounted_base}/{PanPath(path).relative_to(PanPath(base))}"
+                    for path in shard
+                ]
+            )
+            self.task_params.append(
+                {
+                    "files": str(len(shard)),
+                    "bytes": str(sum(sizes[path] for path in shard)),
+                }
+            )
+            self.tasks.append(command)
+
+        if len(self.tasks) < shards:
+            logger.warning(
+                f"Only {len(inputs)} input files found, "
+                f"using {len(self.tasks)} shards instead of {shards}."
+            )
+
+    async def _write_task_files(self, scheduler: Scheduler) -> None:
+        """Save the files of the tasks to the daemon workdir.
+
+        The manifest maps the task indexes to the parameters and the commands,
+        so that the results can be collected without querying each task.
+        With `--scatter`, the list of the input files of each task is also saved
+        to the directory of the task.
+        """
+        if not self.tasks:
+            return
+
+        manifest = scheduler.workdir / TASKS_MANIFEST
+        await manifest.a_write_text(format_manifest(self.tasks, self.task_params))
+
+        for i, paths in enumerate(self.task_inputs):
+            taskdir = scheduler.workdir / str(i)
+            await taskdir.a_mkdir(parents=True, exist_ok=True)
+            await taskdir.joinpath(SCATTER_LIST).a_write_text(
+                "".join(f"{path}\n" for path in paths)
+            )
+
+    def _task_groups(self) -> list[dict]:
+        """Get the taskGroups with the taskCount for the tasks.
+
+        With a local pool, all the commands are run by a single task.
+        """
+        task_count = 1 if self.parallel is not None else len(self.tasks)
+        task_groups = deepcopy(list(self.config.get("taskGroups") or [])) or [{}]
+        task_groups[0] = {**(task_groups[0] or {}), "taskCount": task_count}
+        return task_groups
+
+    async def mount_table(self) -> MountTable:
+        """The table of the mounts of the job, built once for the same mounts.
+
+        Returns:
+            The table of the mounts, to translate the paths in the VM to the cloud.
+        """
+        mounts = self.config.get("mount", self.config.get("volumes", []))
+        if not isinstance(mounts, (list, tuple)):
+            mounts = [mounts] if mounts else []
+        mounts = list(mounts)
+
+        if self._mount_table is None or self._mount_table[0] != mounts:
+            self._mount_table = (
+                mounts,
+                await MountTable.build(mounts, GbatchScheduler.DEFAULT_MOUNTED_ROOT),
+            )
+        return self._mount_table[1]
 
     def _add_mount(self, source: str | GSPath, target: str) -> None:
         """Add a mount point to the configuration.
@@ -182,13 +482,32 @@ class CliGbatchDaemonMixin:
             source: The source path (local or GCS path).
             target: The target mount path inside the container.
         """
+        self._append_mount(f"{source}:{target}")
+
+    def _add_named_mount(self, name: str, source: str | GSPath) -> None:
+        """Add a named mount to the configuration.
+
+        The target inside the container is decided by the scheduler, see
+        `MountTable.named_mounts`.
+
+        Args:
+            name: The name of the mount, exported as an environment variable.
+            source: The source path (local or GCS path).
+        """
+        self._append_mount(f"{name}={source}")
+
+    def _append_mount(self, mount_spec: str) -> None:
+        """Append a mount to the `mount` option of the configuration.
+
+        Args:
+            mount_spec: The mount, as `source:target` or `name=source`.
+        """
         mount = self.config.get("mount", [])
         if not isinstance(mount, (list, tuple, set)):
             mount = [mount]
         else:
             mount = list(mount)
-        # mount the workdir
-        mount.append(f"{source}:{target}")
+        mount.append(mount_spec)
 
         self.config["mount"] = mount
 
@@ -199,44 +518,104 @@ class CliGbatchDaemonMixin:
             Configured Xqute instance with appropriate plugins and scheduler options.
         """
         plugins: list = ["-xqute.pipen"]
-        if (
+        if self._events is not None:
+            from .plugins import XquteCliGbatchEventsPlugin
+            plugins.append(
+                XquteCliGbatchEventsPlugin(
+                    self._events,
+                    stdout_file=stdout_file,
+                    compressed=bool(self.config.get("compress_logs")),
+                )
+            )
+        elif (
             not self.config.get("nowait")
             and not self.config.get("view_logs")
             and "logging" not in plugin.get_all_plugin_names()
         ):
             from .plugins import XquteCliGbatchPlugin
-            plugins.append(XquteCliGbatchPlugin(stdout_file=stdout_file))
+            plugins.append(
+                XquteCliGbatchPlugin(
+                    stdout_file=stdout_file,
+                    raw=self.raw_logs,
+                    # keep the output as is to be piped to the local tools
+                    collapse_repeats=not self.config.get("stream"),
+                    line_filter=self.line_filter(),
+                    compressed=bool(self.config.get("compress_logs")),
+                )
+            )
+
+        if self.tasks:
+            from .plugins import XquteCliGbatchTasksPlugin
+            plugins.append(XquteCliGbatchTasksPlugin(self.tasks, self.parallel))
+
+        if self.config.get("compress_logs"):
+            from .plugins import XquteCliGbatchFramesPlugin
+            plugins.append(XquteCliGbatchFramesPlugin())
 
         return Xqute(
-            "gbatch",
+            self._scheduler_type(),
             error_strategy=self.config.get("error_strategy"),
             num_retries=self.config.get("num_retries"),
             jobname_prefix=self.config.get("jobname_prefix"),
-            scheduler_opts={
-                key: val
-                for key, val in self.config.items()
-                if key
-                not in (
-                    "workdir",
-                    "error_strategy",
-                    "num_retries",
-                    "jobname_prefix",
-                    "COMMAND",
-                    "nowait",
-                    "view_logs",
-                    "command",
-                    "name",
-                    "profile",
-                    "version",
-                    "loglevel",
-                    "mounts",
-                    "plain",
-                )
-            },
+            scheduler_opts=self._scheduler_opts(),
             workdir=f'{self.config.get("workdir")}/{self.daemon_name}',
             plugins=plugins,
         )
 
+    def _scheduler_opts(self) -> dict:
+        """Get the options passed to the gbatch scheduler."""
+        scheduler_opts = {
+            key: val for key, val in self.config.items() if key not in DAEMON_OPTS
+        }
+        if self.tasks:
+            scheduler_opts["taskGroups"] = self._task_groups()
+        return scheduler_opts
+
+    def _scheduler_type(self) -> str | type[Scheduler]:
+        """The scheduler of the daemon job, guarding the meta files of the job
+        from the tasks (see `GbatchTasksScheduler`) in the task array mode.
+        """
+        return GbatchTasksScheduler if self.tasks else "gbatch"
+
+    def _get_scheduler(self) -> Scheduler:
+        """Create a gbatch scheduler without an Xqute instance.
+
+        This is used to submit the daemon job only, without the overhead of
+        the Xqute instance (plugin context, signal handlers and queues). The
+        plugins (e.g. the tasks plugin) are to be enabled by the caller.
+
+        Returns:
+            The gbatch scheduler.
+        """
+        return get_scheduler(self._scheduler_type())(
+            workdir=f'{self.config.get("workdir")}/{self.daemon_name}',
+            error_strategy=self.config.get("error_strategy"),
+            num_retries=self.config.get("num_retries"),
+            jobname_prefix=self.config.get("jobname_prefix"),
+            **self._scheduler_opts(),
+        )
+
+    async def _submit(self, scheduler: Scheduler) -> tuple[str, bool]:
+        """Submit the daemon job, unless it is already submitted or running.
+
+        Args:
+            scheduler: The gbatch scheduler.
+
+        Returns:
+            The job id and whether the job is newly submitted.
+        """
+        job = await scheduler.create_job(0, self.job_command, envs=self.envs)
+        jid = await job.get_jid()
+        if await scheduler.job_is_running(job):
+            return jid, False
+
+        # not to rewrite the files being read by the tasks of a running job
+        await self._write_task_files(scheduler)
+        await scheduler.submit_job_and_update_status(job)
+        if jid is None:
+            jid = await job.get_jid()
+        return jid, True
+
     def _run_version(self):
         """Print version information for pipen-cli-gbatch and pipen."""
         print(f"pipen-cli-gbatch version: v{__version__}")
@@ -251,22 +630,7 @@ class CliGbatchDaemonMixin:
         """Log the scheduler options for debugging purposes."""
         logger.info("Scheduler Options:")
         for key, val in self.config.items():
-            if key in (
-                "workdir",
-                "error_strategy",
-                "num_retries",
-                "jobname_prefix",
-                "COMMAND",
-                "nowait",
-                "view_logs",
-                "command",
-                "name",
-                "profile",
-                "version",
-                "loglevel",
-                "mounts",
-                "plain",
-            ):
+            if key in DAEMON_OPTS:
                 continue
 
             logger.info(f"- {key}: {val}")
@@ -282,12 +646,98 @@ class CliGbatchDaemonMixin:
         Raises:
             SystemExit: If workdir is not a valid Google Storage bucket path.
         """
-        logger.addHandler(RichHandler(show_path=False, show_time=False))
+        logger.addHandler(
+            RichHandler(
+                show_path=False,
+                show_time=False,
+                # leave stdout to the raw logs of the job, so that it can be piped
+                console=Console(stderr=True) if self.raw_logs else None,
+            )
+        )
         # logger.addFilter(DuplicateFilter())
-        logger.setLevel(self.config.get("loglevel", "INFO").upper())
+        loglevel = self.config.get("loglevel", "INFO").upper()
+        if self.config.get("stream") and loglevel == "INFO":
+            # only the output of the job, like a local process
+            loglevel = "WARNING"
+        logger.setLevel(loglevel)
+
+        await self.prepare()
+
+    async def prepare(self):
+        """Prepare the configuration for the daemon, without touching logging.
+
+        Validates workdir requirements, initializes daemon name and job name
+        prefix, and loads the tasks.
+
+        Raises:
+            SystemExit: If workdir is not a valid Google Storage bucket path.
+        """
+        if self.config.get("stream") and (
+            self.config.get("nowait") or self.config.get("view_logs")
+        ):
+            error_and_exit("--stream cannot be used with --nowait or --view-logs.")
+        if (self.config.get("archive_logs") or self.config.get("search")) and (
+            self.config.get("nowait")
+            or self.config.get("view_logs")
+            or self.config.get("stream")
+        ):
+            error_and_exit(
+                "--archive-logs and --search cannot be used with --nowait, "
+                "--view-logs or --stream."
+            )
 
         await self.handle_workdir()
         self.config["jobname_prefix"] = await self.jobname_prefix()
+        # after the --workdir/--outdir of the command are replaced with the
+        # mounted paths, so that the templates in them are expanded as well
+        await self._load_tasks()
+
+    async def events(self, maxsize: int = 1024) -> AsyncGenerator[JobEvent, None]:
+        """Run the daemon and wait for completion, yielding the job events.
+
+        Instead of logging the status and the logs of the job, the events (see
+        `pipen_cli_gbatch.events`) are yielded as they happen. Events are
+        buffered in a queue of `maxsize`, so that a slow consumer applies
+        back-pressure to the polling of the job.
+
+        Args:
+            maxsize: The maximum number of the events buffered.
+
+        Yields:
+            The events of the daemon job.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._events = queue
+        async with gs_session():
+            runner = asyncio.create_task(self._run_events())
+            try:
+                while not runner.done():
+                    getter = asyncio.ensure_future(queue.get())
+                    await asyncio.wait(
+                        {getter, runner},
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if getter.done():
+                        yield getter.result()
+                    else:
+                        getter.cancel()
+
+                while not queue.empty():
+                    yield queue.get_nowait()
+
+                # raise the exception from the run, if any
+                await runner
+            finally:
+                self._events = None
+                if not runner.done():
+                    runner.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await runner
+
+    async def _run_events(self):
+        """Prepare and run the daemon for events()."""
+        await self.prepare()
+        await self._run_wait()
 
     async def _run_wait(self, stdout_file: Path | None = None):
         """Run the pipeline and wait for completion.
@@ -295,17 +745,62 @@ class CliGbatchDaemonMixin:
         Raises:
             SystemExit: If no command is provided.
         """
-        if not self.command:
+        if not self.job_command:
             error_and_exit("No command to run is provided.")
 
         xqute = await self._get_xqute(stdout_file=stdout_file)
-        job = await xqute.scheduler.create_job(0, self.command, envs=self.envs)
+        job = await xqute.scheduler.create_job(0, self.job_command, envs=self.envs)
         if await xqute.scheduler.job_is_running(job):
+            await self._check_stream_running(xqute, job)
             await self._run_nowait(xqute)
             return
 
-        await xqute.feed(self.command, envs=self.envs)
+        # not to rewrite the files being read by the tasks of a running job
+        await self._write_task_files(xqute.scheduler)
+        await xqute.feed(self.job_command, envs=self.envs)
         await xqute.run_until_complete()
+        await self._exit_with_rc(job)
+
+    async def _check_stream_running(self, xqute: Xqute, job) -> None:
+        """Exit with an error if the job to stream is already running.
+
+        The streaming mode can't attach to a running job, since polling it again
+        resets its status, and falling back to the detached mode exits with 0
+        silently, as the logging is turned off for streaming.
+
+        Args:
+            xqute: The xqute instance.
+            job: The daemon job.
+
+        Raises:
+            SystemExit: If streaming and the job is already running.
+        """
+        if not self.config.get("stream") or self._events is not None:
+            return
+
+        jid = await job.get_jid()
+        error_and_exit(
+            f"Job is already running: {jid}\n"
+            "--stream cannot attach to a running job. Use --view-logs to follow "
+            "its logs, or cancel it by:\n"
+            "> gcloud batch jobs cancel "
+            f"--location {xqute.scheduler.location} {jid}"  # type: ignore
+        )
+
+    async def _exit_with_rc(self, job) -> None:
+        """Exit with the return code of the job in streaming mode.
+
+        Args:
+            job: The daemon job.
+
+        Raises:
+            SystemExit: With the return code of the job, if streaming.
+        """
+        if not self.config.get("stream"):
+            return
+
+        rc = await job.get_rc()
+        sys.exit(rc if 0 <= rc < 256 else 1)
 
     async def _run_nowait(
         self,
@@ -321,15 +816,21 @@ class CliGbatchDaemonMixin:
             SystemExit: If no command is provided.
         """
         """Run the pipeline without waiting for completion."""
-        if not self.command:
+        if not self.job_command:
             error_and_exit("No command to run is provided.")
 
         xqute = xqute or await self._get_xqute(stdout_file=stdout_file)
 
         try:
-            job = await xqute.scheduler.create_job(0, self.command, envs=self.envs)
-            jid = await job.get_jid()
-            if await xqute.scheduler.job_is_running(job):
+            jid, submitted = await self._submit(xqute.scheduler)
+            if self._events is not None:
+                # the events are all the output, like the stream mode
+                await self._events.put(
+                    JobSubmitted(jid, time.time(), running=not submitted)
+                )
+                return
+
+            if not submitted:
                 logger.info(f"Job is already submited or running: {jid}")
                 logger.info("")
                 logger.info("To cancel the job, run:")
@@ -338,9 +839,6 @@ class CliGbatchDaemonMixin:
                     f"--location {xqute.scheduler.location} {jid}"  # type: ignore
                 )
             else:
-                await xqute.scheduler.submit_job_and_update_status(job)
-                if jid is None:
-                    jid = await job.get_jid()
                 logger.info(f"Job is running in a detached mode: {jid}")
 
             logger.info("")
@@ -376,6 +874,14 @@ class CliGbatchDaemonMixin:
             logger.info("To check the meta information of the daemon job, go to:")
             logger.info(f"📁 {xqute.scheduler.workdir}/0/")
             logger.info("")
+            if self.tasks:
+                logger.info(
+                    f"The outputs of the {len(self.tasks)} tasks are saved in:"
+                )
+                logger.info(f"📁 {xqute.scheduler.workdir}/<task index>/task.*")
+                logger.info("With the task indexes listed in:")
+                logger.info(f"📁 {xqute.scheduler.workdir}/{TASKS_MANIFEST}")
+                logger.info("")
         finally:
             if xqute.plugin_context:
                 xqute.plugin_context.__exit__()
@@ -385,52 +891,235 @@ class CliGbatchDaemonMixin:
 
         Continuously monitors and displays stdout/stderr logs based on the
         view_logs configuration. Supports viewing 'stdout', 'stderr', or 'all'.
+        Starts from the last `tail` lines or the lines logged `since` a duration
+        ago, if given, otherwise resumes from the offsets of the last pull.
+
+        If the name is a glob pattern (e.g. `sweep-*`), the logs of all the
+        matching daemons under the workdir are followed, with the lines prefixed
+        by the names of the daemons. The log files are discovered (with their
+        sizes) by a single listing per poll, and only the changed ones are read
+        (see `LogObjectPoller`). The compressed logs (`--compress-logs`) are
+        decompressed incrementally (see `FrameTailer`).
 
         Raises:
-            SystemExit: If workdir is not found or when interrupted by user.
-        """
-        log_source = {}
-        workdir = PanPath(self.config["workdir"]) / self.config["name"] / "0"
-        if not await workdir.a_exists():
-            error_and_exit(f"Workdir not found: {workdir}")
-
-        if self.config.view_logs == "stdout":
-            log_source["STDOUT"] = workdir.joinpath("job.stdout")
-        elif self.config.view_logs == "stderr":
-            log_source["STDERR"] = workdir.joinpath("job.stderr")
-        else:  #
-            log_source["STDOUT"] = workdir.joinpath("job.stdout")
-            log_source["STDERR"] = workdir.joinpath("job.stderr")
-
-        poplulators = {
-            key: LogsPopulator(logfile=val) for key, val in log_source.items()
-        }
+            SystemExit: If workdir is not found, `tail` or `since` is invalid, or
+                when interrupted by user.
+        """
+        name = self.config["name"]
+        root = PanPath(self.config["workdir"])
+        multiplexed = bool(re.search(r"[*?[]", name))
+        if not multiplexed and not await (root / name / "0").a_exists():
+            error_and_exit(f"Workdir not found: {root / name / '0'}")
+
+        streams = [
+            stream
+            for stream in ("STDOUT", "STDERR")
+            if self.config.view_logs not in ("stdout", "stderr")
+            or self.config.view_logs == stream.lower()
+        ]
+        filenames = [f"job.{stream.lower()}" for stream in streams]
+        # the compressed logs of the job, if --compress-logs is used
+        filenames += [f"{filename}{FRAMED_SUFFIX}" for filename in filenames]
+
+        tail = self.config.get("tail")
+        since = self.config.get("since")
+        if tail is not None and since:
+            error_and_exit("--tail and --since cannot be used together.")
+        if tail is not None and tail < 0:
+            error_and_exit("--tail must be non-negative.")
+        if since:
+            try:
+                since = datetime.now() - parse_duration(since)
+            except ValueError as e:
+                error_and_exit(str(e))
+
+        line_filter = self.line_filter()
+        log_cache = self.config.get("log_cache")
+        # True when --log-cache is given without a directory
+        cache = (
+            LogCache(None if log_cache is True else log_cache) if log_cache else None
+        )
+        # keyed by <daemon name>/<log file name>
+        poplulators: dict[str, LogTailer] = {}
 
-        logger.info(f"Pulling logs from: {', '.join(log_source.keys())}")
+        async def _tailer(logfile: PanPath) -> LogTailer:
+            # resume from the offsets of the last pull, if any
+            tailer_class = (
+                FrameTailer if logfile.name.endswith(FRAMED_SUFFIX) else LogTailer
+            )
+            populator = tailer_class(
+                logfile=logfile,
+                state_file=offset_state_file(logfile),
+                line_filter=line_filter,
+                cache=cache,
+            )
+            if tail is not None:
+                await populator.seek_tail(tail)
+            elif since:
+                await populator.seek_since(since)
+            return populator
+
+        def _prefix(key: str) -> str:
+            daemon, _, filename = key.rpartition("/")
+            prefix = f"[{daemon}] " if multiplexed else ""
+            if len(streams) > 1:
+                stream = filename[4:].removesuffix(FRAMED_SUFFIX)
+                prefix += f"/{stream.upper()} "
+            return prefix
+
+        poller = LogObjectPoller(root, name, filenames)
+        if not multiplexed:
+            logger.info(f"Pulling logs from: {', '.join(streams)}")
+        else:
+            logger.info(
+                f"Pulling logs ({', '.join(streams)}) from the daemons matching "
+                f"{name!r} under: {root}"
+            )
         logger.info("Press Ctrl-C (twice if needed) to stop.")
         print("")
 
+        interval = AdaptiveInterval()
         try:
             while True:
-                for key, populator in poplulators.items():
-                    lines = await populator.populate()
-                    for line in lines:
-                        if len(log_source) > 1:
-                            print(f"/{key} {line}")
-                        else:
-                            print(line)
-                await asyncio.sleep(5)
+                # a single listing to find the changed log files
+                changed = await poller.poll()
+                keys = sorted(changed)
+                for key in keys:
+                    if key not in poplulators:
+                        poplulators[key] = await _tailer(changed[key][0])
+
+                # fetch the changed logs concurrently
+                results = await asyncio.gather(
+                    *(poplulators[key].populate_stat(changed[key][1]) for key in keys)
+                )
+                for key, lines in zip(keys, results):
+                    write_lines(lines, prefix=_prefix(key))
+                # fast while the logs are growing, backed off while idle
+                await asyncio.sleep(interval.update(any(results)))
         except KeyboardInterrupt:
             for key, populator in poplulators.items():
-                if populator.residue:
-                    if len(log_source) > 1:
-                        print(f"/{key} {populator.residue.decode()}")
-                    else:
-                        print(populator.residue.decode())
+                write_lines(populator.residue_lines(), prefix=_prefix(key))
             print("")
             logger.info("Stopped pulling logs.")
             sys.exit(0)
 
+    async def _extra_log_files(self) -> dict[str, PanPath]:
+        """Get the log files to archive besides the stdout/stderr of the job.
+
+        Returns:
+            The paths to the log files, keyed by their streams.
+        """
+        return {}
+
+    def _log_archive(self) -> LogArchive:
+        """Open the local archive of the logs.
+
+        Returns:
+            The archive, at the file given by `--archive-logs`, or `logs.sqlite`
+            under the default log cache directory.
+        """
+        archive_logs = self.config.get("archive_logs")
+        # True when --archive-logs is given without a file
+        if isinstance(archive_logs, str):
+            return LogArchive(archive_logs)
+        return LogArchive(Path(DEFAULT_LOG_CACHE_DIR) / ARCHIVE_FILE)
+
+    async def _archive_logs(self, archive: LogArchive) -> None:
+        """Download the logs of the daemons matching the name into the archive.
+
+        The log files unchanged since they were archived are skipped.
+
+        Args:
+            archive: The archive of the logs.
+
+        Raises:
+            SystemExit: If no log files are found.
+        """
+        name = self.config["name"]
+        root = PanPath(self.config["workdir"])
+        if not isinstance(root, GSPath) and not await root.a_exists():
+            error_and_exit(f"Workdir not found: {root}")
+
+        # a single listing to find the log files of the matching daemons
+        logs = await list_logs(root, name, ["job.stdout", "job.stderr"])
+        sources = []
+        for key, (path, _) in sorted(logs.items()):
+            daemon, _, filename = key.rpartition("/")
+            sources.append((daemon, filename[4:].upper(), path))
+        if not re.search(r"[*?[]", name):
+            for stream, path in (await self._extra_log_files()).items():
+                sources.append((name, stream, path))
+
+        archived = 0
+        for daemon, stream, path in sources:
+            nlines = await archive.archive(daemon, stream, path, str(root))
+            if nlines is None:
+                continue
+            archived += 1
+            logger.info(f"Archived {nlines} lines: [{daemon}] /{stream}")
+
+        if not archive.archived(name, str(root)):
+            error_and_exit(
+                f"No logs found for the daemons matching {name!r} under: {root}"
+            )
+        logger.info(
+            f"Archived {archived} log file(s), "
+            f"{len(sources) - archived} up to date, in: {archive.db_file}"
+        )
+
+    async def _run_archive_logs(self):
+        """Download the logs of the daemons into the local archive, once.
+
+        The logs are stored as compressed chunks, indexed by the line numbers
+        and the timestamps, so that they can be searched (`--search`) without
+        downloading them again.
+        """
+        with self._log_archive() as archive:
+            await self._archive_logs(archive)
+
+    async def _run_search(self):
+        """Search the archived logs of the daemons matching the name.
+
+        The logs are archived (or refreshed) first with `--archive-logs`. The
+        matching lines are written to stdout, prefixed with the names of the
+        daemons, the streams and the line numbers, like `grep -n`.
+
+        Raises:
+            SystemExit: If the pattern or `since` is invalid, or no logs are
+                archived for the name.
+        """
+        pattern = self.config["search"]
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            error_and_exit(f"Invalid pattern for --search: {e}")
+
+        since = self.config.get("since")
+        if since:
+            try:
+                since = datetime.now() - parse_duration(since)
+            except ValueError as e:
+                error_and_exit(str(e))
+
+        name = self.config["name"]
+        workdir = str(PanPath(self.config["workdir"]))
+        with self._log_archive() as archive:
+            if self.config.get("archive_logs"):
+                await self._archive_logs(archive)
+            elif not archive.archived(name, workdir):
+                error_and_exit(
+                    f"No logs archived for the daemons matching {name!r}, "
+                    "archive them first with --archive-logs."
+                )
+
+            batch = []
+            for hit in archive.search(pattern, name, since or None, workdir):
+                batch.append(f"[{hit.daemon}] /{hit.stream}:{hit.lineno}: {hit.line}")
+                if len(batch) >= 1024:
+                    write_lines(batch)
+                    batch.clear()
+            write_lines(batch)
+
     async def run(self):
         """Execute the daemon pipeline based on configuration.
 
@@ -438,19 +1127,26 @@ class CliGbatchDaemonMixin:
         - version: Print version information
         - nowait: Run in detached mode
         - view_logs: Display logs from existing job
+        - search: Search the archived logs of existing jobs
+        - archive_logs: Archive the logs of existing jobs locally
         - default: Run and wait for completion
         """
         if self.config.get("version"):
             self._run_version()
             return
 
-        await self.setup()
-        self._show_versions()
-        logger.info("Running in PLAIN mode")
-        self._show_scheduler_opts()
-        if self.config.get("nowait"):
-            await self._run_nowait()
-        elif self.config.get("view_logs"):
-            await self._run_view_logs()
-        else:
-            await self._run_wait()
+        async with gs_session():
+            await self.setup()
+            self._show_versions()
+            logger.info("Running in PLAIN mode")
+            self._show_scheduler_opts()
+            if self.config.get("nowait"):
+                await self._run_nowait()
+            elif self.config.get("view_logs"):
+                await self._run_view_logs()
+            elif self.config.get("search"):
+                await self._run_search()
+            elif self.config.get("archive_logs"):
+                await self._run_archive_logs()
+            else:
+                await self._run_wait()
@@ -0,0 +1,88 @@
+"""The table of the mounts of the job, to translate the paths in the VM to the cloud.
+
+The mounts are sanitized (see `xqute.utils.sanitize_mounts`, which checks the
+named mounts on the cloud) once, when the table is built, and the targets are
+indexed in a trie of their path parts, so that a path in the VM is resolved by
+the longest mount target it is under, in the time of the depth of the path,
+regardless of the number of the mounts.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from panpath import PanPath
+from xqute.utils import sanitize_mounts
+
+# The key of the host path in the nodes of the trie, not a path part
+_HOST = None
+
+
+class MountTable:
+    """The mounts of the job, indexed by their targets.
+
+    Attributes:
+        mounts: The sanitized mounts, as (host path, target path) tuples.
+        named_mounts: The targets of the named mounts (`name=host_path`).
+    """
+
+    def __init__(
+        self,
+        mounts: list[tuple[PanPath, Path]],
+        named_mounts: dict[str, str] | None = None,
+    ) -> None:
+        """Index the sanitized mounts.
+
+        Args:
+            mounts: The sanitized mounts, as (host path, target path) tuples.
+            named_mounts: The targets of the named mounts.
+        """
+        self.mounts = mounts
+        self.named_mounts = named_mounts or {}
+        self._trie: dict = {}
+        for host, target in mounts:
+            node = self._trie
+            for part in Path(target).parts:
+                node = node.setdefault(part, {})
+            node.setdefault(_HOST, host)
+
+    @classmethod
+    async def build(
+        cls,
+        mounts: str | list[str] | None,
+        mounted_root: str,
+    ) -> MountTable:
+        """Sanitize the mounts and build the table.
+
+        Args:
+            mounts: A single mount string or a list of mount strings in the format
+                "source:target" or "name=source".
+            mounted_root: The root of the named mounts in the VM.
+
+        Returns:
+            The table of the mounts.
+        """
+        return cls(*await sanitize_mounts(mounts, mounted_root))
+
+    def to_cloud(self, mounted: str | Path) -> PanPath | None:
+        """Convert a path in the VM to the cloud path by the longest mount target.
+
+        Args:
+            mounted: The path in the VM.
+
+        Returns:
+            The corresponding cloud path if the path is under any mount target,
+            None otherwise.
+        """
+        parts = Path(mounted).parts
+        node, host, depth = self._trie, None, 0
+        for i, part in enumerate(parts):
+            node = node.get(part)
+            if node is None:
+                break
+            if _HOST in node:
+                host, depth = node[_HOST], i + 1
+
+        if host is None:
+            return None
+        return PanPath(host).joinpath(*parts[depth:])
@@ -1,21 +1,37 @@
 from __future__ import annotations
 
 import asyncio
+import os
 import sys
+import time
 from typing import Any, Sequence
-from argparse import Namespace
 from contextlib import suppress
 from pathlib import Path
+from uuid import uuid4
 
-from simpleconf import Config, ProfileConfig
-from panpath import GSPath, PanPath
+from panpath import GSPath
 from xqute import plugin
 from xqute.utils import logger
-from pipen.defaults import CONFIG_FILES
-from pipen.cli import AsyncCLIPlugin
-from pipen_args.parser_ import _pre_parse
-from pipen_poplog import LogsPopulator
-from .version import __version__
+from .cli import CliGbatchPlugin  # noqa: F401, for backward compatibility
+from .events import (
+    JobFinished,
+    JobStarted,
+    JobStatusChanged,
+    JobSubmitted,
+    LogChunk,
+)
+from .frames import (
+    FRAMED_SUFFIX,
+    FRAMER_INIT,
+    FrameTailer,
+    render_framer_prep,
+)
+from .logs import LineFilter, LogObjectPoller, LogTailer, write_lines
+from .polling import AdaptiveInterval
+from .tasks import render_tasks_init
+
+# The maximum number of chunks of lines pulled in the background to hold
+LOG_QUEUE_SIZE = 1024
 
 
 class XquteCliGbatchPlugin:
@@ -24,36 +40,254 @@ class XquteCliGbatchPlugin:
     This plugin monitors job execution and continuously pulls stdout/stderr logs
     from the Google Cloud Batch job, displaying them in real-time during execution.
 
+    Once the job is started, the logs are pulled by a background task into a
+    bounded queue, and the polling hook only drains the queue, so that a slow
+    read of the logs doesn't delay the status checks of the job (and vice versa).
+    The task is stopped (with the logs flushed) when the job is finished. The
+    log files under the metadir of the job are checked by a single listing per
+    pull, and only the changed ones are read.
+
+    The compressed logs of the job (`--compress-logs`, see
+    `pipen_cli_gbatch.frames`), if any, are pulled along with the plain ones.
+
     Attributes:
         name (str): The plugin name.
-        stdout_populator (LogsPopulator): Handles stdout log population.
-        stderr_populator (LogsPopulator): Handles stderr log population.
+        stdout_populator (LogTailer): Handles stdout log population.
+        stderr_populator (LogTailer): Handles stderr log population.
+        stdout_frames (FrameTailer | None): Handles the compressed stdout of
+            the job, if compressed.
+        stderr_frames (FrameTailer | None): Handles the compressed stderr of
+            the job, if compressed.
+        interval (AdaptiveInterval): The interval to pull the logs, which is
+            reset when new lines are pulled and backed off when idle.
+        raw (bool): Whether to write the lines to stdout/stderr as is, in
+            batches, instead of logging them.
     """
 
     def __init__(
         self,
         name: str = "logging",
         stdout_file: str | Path | GSPath | None = None,
+        raw: bool = False,
+        collapse_repeats: bool = True,
+        line_filter: LineFilter | None = None,
+        compressed: bool = False,
     ):
         """Initialize the logging plugin.
 
         Args:
             name: The plugin name.
-            log_start: Whether to start logging when job starts.
+            stdout_file: The running logs of the pipeline to pull as stdout.
+            raw: Whether to write the lines to stdout/stderr as is, in batches,
+                instead of logging them.
+            collapse_repeats: Whether to collapse the runs of repeated identical
+                lines of the logs.
+            line_filter: The filter of the lines of the logs, if any.
+            compressed: Whether the stdout/stderr of the job are compressed on
+                the VM, see `XquteCliGbatchFramesPlugin`.
         """
         self.name = name
         self.stdout_file = stdout_file
-        self.stdout_populator = LogsPopulator()
-        self.stderr_populator = LogsPopulator()
+        self.raw = raw
+        self.stdout_populator = LogTailer(
+            collapse_repeats=collapse_repeats,
+            line_filter=line_filter,
+        )
+        self.stderr_populator = LogTailer(
+            collapse_repeats=collapse_repeats,
+            line_filter=line_filter,
+        )
+        self.stdout_frames: FrameTailer | None = None
+        self.stderr_frames: FrameTailer | None = None
+        if compressed:
+            self.stdout_frames = FrameTailer(
+                collapse_repeats=collapse_repeats,
+                line_filter=line_filter,
+            )
+            self.stderr_frames = FrameTailer(
+                collapse_repeats=collapse_repeats,
+                line_filter=line_filter,
+            )
+        self.interval = AdaptiveInterval()
+        # the monotonic time of the next pull, without the background task
+        self._next_pull = 0.0
+        # the background task pulling the logs, and its queue of (stream, lines)
+        self._tailer: asyncio.Task | None = None
+        self._lines: asyncio.Queue | None = None
+        self._wake: asyncio.Event | None = None
+        self._stopping: asyncio.Event | None = None
+        # the poller of the log files under the metadir of the job, and the keys
+        # of the log files in its listing
+        self._poller: LogObjectPoller | None = None
+        self._poll_keys: dict[str, str] = {}
+
+    def _poll_now(self) -> None:
+        """Reset the interval and pull the logs as soon as possible."""
+        self.interval.reset()
+        self._next_pull = 0.0
+        if self._wake:
+            self._wake.set()
+
+    def _populators(self) -> list[tuple[str, LogTailer]]:
+        """Get the streams and the tailers of the logs, the compressed ones included.
+
+        Returns:
+            The streams and the tailers.
+        """
+        return [
+            (stream, populator)
+            for stream, populator in (
+                ("STDOUT", self.stdout_populator),
+                ("STDERR", self.stderr_populator),
+                ("STDOUT", self.stdout_frames),
+                ("STDERR", self.stderr_frames),
+            )
+            if populator
+        ]
+
+    async def _pull(self) -> list[tuple[str, list[str]]]:
+        """Pull the new lines of stdout and stderr concurrently.
+
+        Returns:
+            The streams and the lines pulled from them.
+        """
+        populators = self._populators()
+        # the log files of the daemon are checked by a single listing, and only
+        # the changed ones are read
+        changed = await self._poller.poll() if self._poller else {}
+        pulls = []
+        for _, populator in populators:
+            key = self._poll_keys.get(str(populator.logfile))  # type: ignore
+            if key is None:
+                pulls.append(populator.populate())  # type: ignore
+            elif key in changed:
+                pulls.append(populator.populate_stat(changed[key][1]))  # type: ignore
+            else:
+                pulls.append(asyncio.sleep(0, result=[]))
+
+        # fetch both streams concurrently, one round trip per pull
+        results = await asyncio.gather(*pulls)
+        for (_, populator), lines in zip(populators, results):
+            populator.increment_counter(len(lines))  # type: ignore
+        return [
+            (stream, lines) for (stream, _), lines in zip(populators, results) if lines
+        ]
+
+    def _init_frames(self, scheduler) -> None:
+        """Set up the tailers of the compressed stdout/stderr of the job."""
+        metadir = scheduler.workdir.joinpath("0")
+        for attr, populator, filename in (
+            ("stdout_frames", self.stdout_populator, "job.stdout"),
+            ("stderr_frames", self.stderr_populator, "job.stderr"),
+        ):
+            frames = getattr(self, attr)
+            if not frames:
+                continue
+            if str(populator.logfile) != str(metadir / filename):  # type: ignore
+                # e.g. the running logs of the pipeline are pulled as stdout
+                setattr(self, attr, None)
+                continue
+            frames.logfile = metadir / f"{filename}{FRAMED_SUFFIX}"
+
+    def _init_poller(self, scheduler) -> None:
+        """Set up the poller of the log files under the metadir of the job."""
+        metadir = scheduler.workdir.joinpath("0")
+        self._poll_keys = {
+            str(populator.logfile): f"{scheduler.workdir.name}/{filename}"
+            for _, populator in self._populators()
+            for filename in (
+                "job.stdout",
+                "job.stderr",
+                f"job.stdout{FRAMED_SUFFIX}",
+                f"job.stderr{FRAMED_SUFFIX}",
+            )
+            if str(populator.logfile) == str(metadir / filename)
+        }
+        self._poller = (
+            LogObjectPoller(
+                scheduler.workdir.parent,
+                scheduler.workdir.name,
+                [key.rpartition("/")[2] for key in self._poll_keys.values()],
+            )
+            if self._poll_keys
+            else None
+        )
+
+    def _start_tailer(self) -> None:
+        """Start the background task to pull the logs into the queue."""
+        self._lines = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._tailer = asyncio.create_task(self._tail())
+
+    async def _tail(self) -> None:
+        """Pull the logs into the queue until stopped."""
+        while not self._stopping.is_set():  # type: ignore
+            self._wake.clear()  # type: ignore
+            try:
+                chunks = await self._pull()
+            except Exception as exc:  # keep tailing on transient errors
+                logger.debug(f"Failed to pull the logs: {exc}")
+                chunks = []
+
+            for chunk in chunks:
+                await self._lines.put(chunk)  # type: ignore
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    self._wake.wait(),  # type: ignore
+                    self.interval.update(bool(chunks)),
+                )
+
+    async def _drain(self) -> None:
+        """Emit the lines in the queue pulled by the background task."""
+        while self._lines and not self._lines.empty():
+            stream, lines = self._lines.get_nowait()
+            await self._emit_lines(stream, lines)
+
+    async def _stop_tailer(self) -> None:
+        """Stop the background task after its ongoing pull, flushing the queue."""
+        if self._tailer is None:
+            return
+
+        self._stopping.set()  # type: ignore
+        self._wake.set()  # type: ignore
+        while not self._tailer.done():
+            # keep draining, in case the task is blocked by a full queue
+            await self._drain()
+            await asyncio.wait({self._tailer}, timeout=0.1)
+        self._tailer = None
+        await self._drain()
 
     def _clear_residues(self):
         """Clear any remaining log residues and display them."""
-        if self.stdout_populator and self.stdout_populator.residue:
-            logger.info(f"/STDOUT {self.stdout_populator.residue.decode()}")
-            self.stdout_populator.residue = ""
-        if self.stderr_populator and self.stderr_populator.residue:
-            logger.error(f"/STDERR {self.stderr_populator.residue.decode()}")
-            self.stderr_populator.residue = ""
+        for stream, populator in self._populators():
+            if populator.residue:
+                self._show_lines(stream, populator.residue_lines())
+                populator.residue = b""
+
+    def _show_lines(self, stream: str, lines: list[str]) -> None:
+        """Log the lines, or write them as is in raw mode.
+
+        Args:
+            stream: Either `STDOUT` or `STDERR`.
+            lines: The lines to show.
+        """
+        if self.raw:
+            try:
+                write_lines(lines, sys.stdout if stream == "STDOUT" else sys.stderr)
+            except BrokenPipeError:
+                # the reader is gone (e.g. `| head`), discard the rest of the
+                # output, but keep waiting for the job for its return code
+                logger.warning(f"{stream} is closed, discarding the rest of it.")
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                file = sys.stdout if stream == "STDOUT" else sys.stderr
+                os.dup2(devnull, file.fileno())
+            return
+
+        log = logger.info if stream == "STDOUT" else logger.error
+        for line in lines:
+            log(f"/{stream} {line}")
 
     @plugin.impl
     async def on_job_started(self, scheduler, job):
@@ -64,6 +298,7 @@ class XquteCliGbatchPlugin:
             job: The job that started.
         """
         logger.info("Job is picked up by Google Batch, pulling stdout/stderr ...")
+        self._poll_now()
         if not self.stdout_file:
             self.stdout_populator.logfile = scheduler.workdir.joinpath(  # type: ignore
                 "0", "job.stdout"
@@ -110,31 +345,46 @@ class XquteCliGbatchPlugin:
             "0",
             "job.stderr",
         )
+        self._init_frames(scheduler)
+        self._init_poller(scheduler)
+        self._start_tailer()
 
     @plugin.impl
     async def on_job_polling(self, scheduler, job, counter):
-        """Handle job polling event by pulling and displaying logs.
+        """Handle job polling event by displaying the logs pulled.
+
+        The logs pulled by the background task are drained from the queue. If
+        the task is not running (e.g. the job is finished), the logs are pulled
+        directly.
 
         Args:
             scheduler: The scheduler instance.
             job: The job being polled.
-            counter: The polling counter.
+            counter: The polling counter, 0 to pull the logs regardless of
+                the interval (e.g. when the job is finished).
         """
-        if counter % 5 != 0:
-            # Make it less frequent
+        if self._tailer is not None:
+            await self._drain()
+            return
+
+        if counter and time.monotonic() < self._next_pull:
+            # Pull adaptively, fast while the logs are growing
             return
 
-        if self.stdout_populator:
-            stdout_lines = await self.stdout_populator.populate()  # type: ignore
-            self.stdout_populator.increment_counter(len(stdout_lines))  # type: ignore
-            for line in stdout_lines:
-                logger.info(f"/STDOUT {line}")
+        chunks = await self._pull()
+        for stream, lines in chunks:
+            await self._emit_lines(stream, lines)
 
-        if self.stderr_populator:
-            stderr_lines = await self.stderr_populator.populate()
-            self.stderr_populator.increment_counter(len(stderr_lines))
-            for line in stderr_lines:
-                logger.error(f"/STDERR {line}")
+        self._next_pull = time.monotonic() + self.interval.update(bool(chunks))
+
+    async def _emit_lines(self, stream: str, lines: list[str]) -> None:
+        """Display the lines pulled from stdout/stderr.
+
+        Args:
+            stream: Either `STDOUT` or `STDERR`.
+            lines: The lines pulled.
+        """
+        self._show_lines(stream, lines)
 
     @plugin.impl
     async def on_job_killed(self, scheduler, job):
@@ -144,6 +394,7 @@ class XquteCliGbatchPlugin:
             scheduler: The scheduler instance.
             job: The job that was killed.
         """
+        await self._stop_tailer()
         await self.on_job_polling(scheduler, job, 0)
         self._clear_residues()
 
@@ -155,6 +406,7 @@ class XquteCliGbatchPlugin:
             scheduler: The scheduler instance.
             job: The job that failed.
         """
+        await self._stop_tailer()
         with suppress(AttributeError, FileNotFoundError):
             # in case the job failed before started
             await self.on_job_polling(scheduler, job, 0)
@@ -168,6 +420,7 @@ class XquteCliGbatchPlugin:
             scheduler: The scheduler instance.
             job: The job that succeeded.
         """
+        await self._stop_tailer()
         with suppress(AttributeError, FileNotFoundError):
             await self.on_job_polling(scheduler, job, 0)
         self._clear_residues()
@@ -183,180 +436,294 @@ class XquteCliGbatchPlugin:
         # we need to await self.stdout_populator.destroy() but on_shutdown
         # cannot be async. Since the event loop is already running, we need to
         # create tasks instead of using run_until_complete
-        if self.stdout_populator:
-            asyncio.create_task(self.stdout_populator.destroy())
-            self.stdout_populator = None
-        if self.stderr_populator:
-            asyncio.create_task(self.stderr_populator.destroy())
-            self.stderr_populator = None
+        if self._tailer is not None:
+            self._tailer.cancel()
+            self._tailer = None
+        for _, populator in self._populators():
+            asyncio.create_task(populator.destroy())
+        self.stdout_populator = self.stderr_populator = None
+        self.stdout_frames = self.stderr_frames = None
+
 
+class XquteCliGbatchEventsPlugin(XquteCliGbatchPlugin):
+    """Plugin for feeding the events of the daemon job into a queue.
 
-class CliGbatchPlugin(AsyncCLIPlugin):
-    """Simplify running commands via Google Cloud Batch.
+    Instead of logging the status and the logs of the job, typed events (see
+    `pipen_cli_gbatch.events`) are put into the queue, which is consumed by
+    `daemon.events()`. Since the hooks are awaited by the scheduler, a full
+    (bounded) queue slows down the polling until the consumer catches up.
 
-    This CLI plugin provides a command-line interface for executing arbitrary
-    commands on Google Cloud Batch through the pipen framework. It wraps
-    commands as single-process pipelines and provides various execution modes.
+    Attributes:
+        name (str): The plugin name.
+        queue (asyncio.Queue): The queue of the events.
+        submitted_at (float | None): The time the job was submitted.
+        started_at (float | None): The time the job was started.
     """
 
-    __version__ = __version__
-    name = "gbatch"  # type: ignore
+    def __init__(
+        self,
+        queue: asyncio.Queue,
+        name: str = "gbatch_events",
+        stdout_file: str | Path | GSPath | None = None,
+        compressed: bool = False,
+    ):
+        """Initialize the events plugin.
 
-    @classmethod
-    async def _get_defaults_from_config(
-        cls,
-        config_files: Sequence[str | Path],
-        profile: str | None,
-    ) -> dict:
-        """Get the default configurations from the given config files and profile.
+        Args:
+            queue: The queue to put the events into.
+            name: The plugin name.
+            stdout_file: The file of the running logs, if not the stdout of
+                the daemon job.
+            compressed: Whether the stdout/stderr of the job are compressed on
+                the VM, see `XquteCliGbatchFramesPlugin`.
+        """
+        super().__init__(name=name, stdout_file=stdout_file, compressed=compressed)
+        self.queue = queue
+        self.submitted_at: float | None = None
+        self.started_at: float | None = None
+        self._status: str | None = None
+
+    async def _emit_lines(self, stream: str, lines: list[str]) -> None:
+        """Put the lines pulled from stdout/stderr into the queue as a chunk."""
+        if lines:
+            await self.queue.put(LogChunk(stream, list(lines), time.time()))
+
+    async def _change_status(self, status: str) -> None:
+        """Put the status changed event into the queue, if it is changed.
+
+        The status is given by the hooks of the scheduler, instead of being
+        queried from the job while polling.
+        """
+        if status != self._status:
+            self._status = status
+            self._poll_now()
+            await self.queue.put(JobStatusChanged(status, time.time()))
+
+    async def _finish(self, scheduler, job, status: str) -> None:
+        """Pull the remaining logs and put the finished event into the queue."""
+        await self._stop_tailer()
+        with suppress(AttributeError, FileNotFoundError):
+            # in case the job failed before started
+            await self.on_job_polling(scheduler, job, 0)
+
+        for stream, populator in self._populators():
+            if populator.residue:
+                await self._emit_lines(stream, populator.residue_lines())
+                populator.residue = b""
+
+        await self._change_status(status)
+        await self.queue.put(
+            JobFinished(
+                status=status,
+                rc=await job.get_rc(),
+                submitted_at=self.submitted_at,
+                started_at=self.started_at,
+                time=time.time(),
+            )
+        )
+
+    @plugin.impl
+    async def on_job_submitted(self, scheduler, job):
+        """Put the submitted event into the queue.
 
         Args:
-            config_files: List of configuration file paths to load.
-            profile: The profile name to use for configuration.
+            scheduler: The scheduler instance.
+            job: The job that was submitted.
+        """
+        self.submitted_at = time.time()
+        self._status = "SUBMITTED"
+        await self.queue.put(JobSubmitted(await job.get_jid(), self.submitted_at))
 
-        Returns:
-            Dictionary containing scheduler options from the configuration.
+    @plugin.impl
+    async def on_job_started(self, scheduler, job):
+        """Set up the log files and put the started event into the queue.
+
+        Args:
+            scheduler: The scheduler instance.
+            job: The job that started.
         """
-        if not profile:
-            return {}
+        self.started_at = time.time()
+        await self.queue.put(JobStarted(await job.get_jid(), self.started_at))
+        await self._change_status("RUNNING")
+        await super().on_job_started(scheduler, job)
 
-        conf = await ProfileConfig.a_load(
-            *config_files,
-            ignore_nonexist=True,
-            allow_missing_base=True,
-        )
-        conf = ProfileConfig.use_profile(conf, profile, allow_missing_base=True)
-        conf = ProfileConfig.detach(conf)
-        return conf
+    @plugin.impl
+    async def on_job_killing(self, scheduler, job):
+        """Put the status changed event of a job being killed into the queue.
+
+        Args:
+            scheduler: The scheduler instance.
+            job: The job being killed.
+        """
+        await self._change_status("KILLING")
+
+    @plugin.impl
+    async def on_job_killed(self, scheduler, job):
+        """Put the finished event of a killed job into the queue."""
+        await self._finish(scheduler, job, "KILLED")
+
+    @plugin.impl
+    async def on_job_failed(self, scheduler, job):
+        """Put the finished event of a failed job into the queue."""
+        await self._finish(scheduler, job, "FAILED")
 
-    def __init__(self, parser, subparser):
-        """Initialize the CLI plugin with argument parsing configuration.
+    @plugin.impl
+    async def on_job_succeeded(self, scheduler, job):
+        """Put the finished event of a succeeded job into the queue."""
+        await self._finish(scheduler, job, "SUCCEEDED")
+
+
+class XquteCliGbatchTasksPlugin:
+    """Plugin for running a list of commands as the tasks of the daemon job.
+
+    The commands are rendered into the wrapped job script, so that each task of
+    the Google Cloud Batch job picks its own command by `BATCH_TASK_INDEX`, or
+    a single task runs all of them by a local process pool.
+
+    One plugin can also serve the daemon jobs of many schedulers (see
+    `submit_many`), with the tasks registered for each scheduler.
+
+    Attributes:
+        name (str): The plugin name.
+        tasks (list[str]): The commands of the tasks.
+        parallel (int | None): The size of the local pool, if any.
+        run_id (str): The unique id of this run.
+        schedulers (dict): The tasks and the pool sizes registered for
+            the schedulers, overriding `tasks` and `parallel`.
+    """
+
+    def __init__(
+        self,
+        tasks: Sequence[str] = (),
+        parallel: int | None = None,
+        name: str = "gbatch_tasks",
+    ):
+        """Initialize the tasks plugin.
 
         Args:
-            parser: The main argument parser.
-            subparser: The subparser for this specific command.
+            tasks: The commands of the tasks, each as a shell command string.
+            parallel: The size of the local pool to run the commands in a single
+                task (`0` for the number of vCPUs).
+            name: The plugin name.
         """
-        super().__init__(parser, subparser)
-        subparser.usage = "pipen gbatch [options] -- <command>"
-        subparser.pre_parse = _pre_parse  # type: ignore
-        subparser.epilog = """\033[1;4mExamples\033[0m:
-
-  \u200b
-  # Run a command and wait for it to complete
-  > pipen gbatch --mount-as-cwd gs://my-bucket/workdir -- \\
-      python myscript.py --input input.txt --output output.txt
-
-  \u200b
-  # Use named mounts
-  > pipen gbatch --mount-as-cwd  gs://my-bucket/workdir \\
-      --mount INFILE=gs://bucket/path/to/file \\
-      --mount OUTDIR=gs://bucket/path/to/outdir -- \\
-      bash -c 'cat $INFILE > $OUTDIR/output.txt'
-
-  \u200b
-  # Run a command in a detached mode
-  > pipen gbatch --nowait --project $PROJECT --location $LOCATION \\
-      --workdir gs://my-bucket/workdir -- \\
-      python myscript.py --input input.txt --output output.txt
-
-  \u200b
-  # If you have a profile defined in ~/.pipen.toml or ./.pipen.toml
-  # `scheduler_opts` in the profile will be used to start the daemon,
-  # other options will be brought as default to the pipen pipeline by the command
-  > pipen gbatch --profile myprofile -- \\
-      python myscript.py --input input.txt --output output.txt
-
-  \u200b
-  # View the logs of a previously run command
-  > pipen gbatch --view-logs all --name my-daemon-name \\
-      --workdir gs://my-bucket/workdir
-        """  # noqa: E501
-
-        """Add command-line arguments specific to the gbatch plugin."""
-        argfile = PanPath(__file__).parent / "daemon_args.toml"
-        args_def = Config.load(argfile, loader="toml")
-        mutually_exclusive_groups = args_def.get("mutually_exclusive_groups", [])
-        groups = args_def.get("groups", [])
-        arguments = args_def.get("arguments", [])
-        self.subparser._add_decedents(
-            mutually_exclusive_groups, groups, [], arguments, []
-        )
+        self.name = name
+        self.tasks = list(tasks)
+        self.parallel = parallel
+        self.run_id = uuid4().hex[:12]
+        self.schedulers: dict[Any, tuple[list[str], int | None]] = {}
 
-    async def parse_args(self, known_parsed, unparsed_argv: list[str]) -> Namespace:
-        """Parse command-line arguments and apply configuration defaults.
+    def register(
+        self,
+        scheduler: Any,
+        tasks: Sequence[str],
+        parallel: int | None = None,
+    ) -> None:
+        """Register the tasks for the daemon job of a scheduler.
 
         Args:
-            known_parsed: Previously parsed arguments.
-            unparsed_argv: List of unparsed command-line arguments.
+            scheduler: The scheduler of the daemon job.
+            tasks: The commands of the tasks, each as a shell command string.
+            parallel: The size of the local pool to run the commands in a single
+                task (`0` for the number of vCPUs).
+        """
+        self.schedulers[scheduler] = (list(tasks), parallel)
 
-        Returns:
-            Namespace containing parsed arguments with applied defaults.
+    @plugin.impl
+    def on_jobcmd_init(self, scheduler, job) -> str | None:
+        """Define the task runner in the wrapped job script.
+
+        Args:
+            scheduler: The scheduler instance.
+            job: The daemon job.
 
-        Raises:
-            SystemExit: If command arguments are not properly formatted.
+        Returns:
+            The bash code to be inserted into the wrapped job script.
         """
-        # Check if there is any unknown args
-        known_parsed = await super().parse_args(known_parsed, unparsed_argv)
-        # pipen gbatch with no arguments
-        if not hasattr(known_parsed, "command"):
-            self.subparser.print_help()
-            sys.exit(0)
-
-        if known_parsed.command:
-            if known_parsed.command[0] != "--":
-                from .mixin import error_and_exit
-                error_and_exit("The command to run must be after '--'.")
-
-            known_parsed.command = known_parsed.command[1:]
-
-        defaults = await self.__class__._get_defaults_from_config(
-            CONFIG_FILES,
-            known_parsed.profile,
+        tasks, parallel = self.schedulers.get(scheduler, (self.tasks, self.parallel))
+        if not tasks:
+            return None
+
+        # a retried job is a new run, outputs from the failed trial don't count
+        return render_tasks_init(
+            tasks,
+            f"{self.run_id}-{job.trial_count}",
+            parallel=parallel,
         )
-        default_scheduler_opts = defaults.pop("scheduler_opts", {})
-
-        def is_valid(val: Any) -> bool:
-            """Check if a value is valid (not None, not empty string, not empty list).
-            """
-            if val is None:
-                return False
-            if isinstance(val, bool):
-                return True
-            return bool(val)
-
-        # update parsed with the defaults
-        for key, val in default_scheduler_opts.items():
-            if key == "mount" and val and getattr(known_parsed, key, None):
-                if not isinstance(val, (tuple, list)):
-                    val = [val]
-                val = list(val)
-
-                kp_mount = getattr(known_parsed, key)
-                val.extend(kp_mount)
-                setattr(known_parsed, key, val)
-                continue
 
-            if (
-                key == "command"
-                or val is None
-                or is_valid(getattr(known_parsed, key, None))
-            ):
-                continue
 
-            setattr(known_parsed, key, val)
+class XquteCliGbatchFramesPlugin:
+    """Plugin for compressing the logs of the daemon job on the VM.
+
+    The stdout/stderr of the job are piped through a framer in the wrapped job
+    script, writing them as gzip frames (see `pipen_cli_gbatch.frames`), which
+    are pulled and decompressed incrementally by `XquteCliGbatchPlugin`.
+
+    Like `XquteCliGbatchTasksPlugin`, one plugin can serve the daemon jobs of
+    many schedulers (see `submit_many`), with only the registered ones
+    compressing their logs.
+
+    Attributes:
+        name (str): The plugin name.
+        schedulers (set | None): The schedulers of the daemon jobs to compress
+            the logs of, None for all of them.
+    """
+
+    def __init__(
+        self,
+        schedulers: set | None = None,
+        name: str = "gbatch_frames",
+    ):
+        """Initialize the frames plugin.
 
-        if not getattr(known_parsed, "plain", None):
-            setattr(known_parsed, "_other_opts", defaults)
-        return known_parsed
+        Args:
+            schedulers: The schedulers of the daemon jobs to compress the logs
+                of, None for all of them.
+            name: The plugin name.
+        """
+        self.name = name
+        self.schedulers = schedulers
 
-    async def exec_command(self, args: Namespace) -> None:
-        """Execute the gbatch command with the provided arguments.
+    def register(self, scheduler: Any) -> None:
+        """Compress the logs of the daemon job of a scheduler.
 
         Args:
-            args: Parsed command-line arguments containing configuration and command.
+            scheduler: The scheduler of the daemon job.
         """
-        from .daemons import CliGbatchDaemonPlain, CliGbatchDaemonPipeline
-        if args.plain:
-            await CliGbatchDaemonPlain(args, args.command).run()
-        else:
-            await CliGbatchDaemonPipeline(args, args.command).run()
+        if self.schedulers is not None:
+            self.schedulers.add(scheduler)
+
+    def _enabled(self, scheduler: Any) -> bool:
+        """Check if the logs of the daemon job of a scheduler are compressed."""
+        return self.schedulers is None or scheduler in self.schedulers
+
+    @plugin.impl
+    def on_jobcmd_init(self, scheduler, job) -> str | None:
+        """Define the framer in the wrapped job script.
+
+        Args:
+            scheduler: The scheduler instance.
+            job: The daemon job.
+
+        Returns:
+            The bash code to be inserted into the wrapped job script.
+        """
+        return FRAMER_INIT if self._enabled(scheduler) else None
+
+    @plugin.impl
+    def on_jobcmd_prep(self, scheduler, job) -> str | None:
+        """Pipe the stdout/stderr of the job through the framer.
+
+        Args:
+            scheduler: The scheduler instance.
+            job: The daemon job.
+
+        Returns:
+            The bash code to be inserted into the wrapped job script.
+        """
+        if not self._enabled(scheduler):
+            return None
+
+        return render_framer_prep(
+            str(job.stdout_file.mounted),
+            str(job.stderr_file.mounted),
+        )
@@ -0,0 +1,67 @@
+"""Adaptive intervals to pull the logs of the daemon job.
+
+The logs are pulled fast while they are growing, and the interval is backed off
+exponentially (up to a cap) while the job is idle, so that a chatty job is
+followed with little latency, and a job that is quiet for hours doesn't issue
+a request to the bucket every few seconds. New lines or a transition of the job
+status reset the interval.
+"""
+
+from __future__ import annotations
+
+# The interval while the logs are growing, in seconds
+MIN_POLL_INTERVAL = 0.5
+# The cap of the interval while the logs are idle, in seconds
+MAX_POLL_INTERVAL = 30.0
+# The factor to back off the interval by
+POLL_BACKOFF_FACTOR = 2.0
+
+
+class AdaptiveInterval:
+    """An interval that resets on activity and backs off exponentially when idle.
+
+    Attributes:
+        minimum: The interval while active.
+        maximum: The cap of the interval while idle.
+        factor: The factor to back off the interval by.
+        current: The current interval.
+    """
+
+    def __init__(
+        self,
+        minimum: float = MIN_POLL_INTERVAL,
+        maximum: float = MAX_POLL_INTERVAL,
+        factor: float = POLL_BACKOFF_FACTOR,
+    ) -> None:
+        """Initialize the interval.
+
+        Args:
+            minimum: The interval while active.
+            maximum: The cap of the interval while idle.
+            factor: The factor to back off the interval by.
+        """
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor
+        self.current = minimum
+
+    def reset(self) -> float:
+        """Reset the interval to the minimum, returning it."""
+        self.current = self.minimum
+        return self.current
+
+    def backoff(self) -> float:
+        """Back off the interval (up to the maximum), returning it."""
+        self.current = min(self.current * self.factor, self.maximum)
+        return self.current
+
+    def update(self, active: bool) -> float:
+        """Reset the interval if active, otherwise back it off.
+
+        Args:
+            active: Whether there was any activity (e.g. new lines pulled).
+
+        Returns:
+            The interval to wait before the next poll.
+        """
+        return self.reset() if active else self.backoff()
@@ -0,0 +1,120 @@
+"""A persistent cache of the configurations resolved from the profiles.
+
+Resolving a profile loads and merges all the configuration files (`~/.pipen.toml`
+and `./.pipen.toml`), which is repeated by every `pipen gbatch --profile ...`,
+e.g. hundreds of times by a script submitting jobs in bulk. The resolved
+configurations are cached in a JSON file under the user cache directory, keyed
+by the profile and the paths, sizes and modification times of the configuration
+files, so that any change to the files (including one being created or removed)
+falls back to a full load.
+
+This module is imported by the entry point of the plugin, so it only imports
+what is already loaded by `pipen`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Sequence
+
+# The directory of the cached profiles
+PROFILE_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "pipen-gbatch",
+    "profiles",
+)
+
+
+def profile_key(config_files: Sequence[str | Path], profile: str) -> list:
+    """Get the key of a resolved profile.
+
+    Args:
+        config_files: The configuration files to load the profile from.
+        profile: The name of the profile.
+
+    Returns:
+        The profile, and the absolute path, size and modification time (in
+        nanoseconds) of each configuration file (`None`s if it doesn't exist).
+    """
+    files = []
+    for config_file in config_files:
+        path = os.path.abspath(os.path.expanduser(config_file))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            files.append([path, None, None])
+        else:
+            files.append([path, stat.st_size, stat.st_mtime_ns])
+    return [profile, files]
+
+
+def _cache_file(key: list, cache_dir: str | Path | None) -> Path:
+    """Get the cache file of a resolved profile.
+
+    Args:
+        key: The key of the resolved profile, see `profile_key`.
+        cache_dir: The directory of the cache, `PROFILE_CACHE_DIR` by default.
+
+    Returns:
+        The path to the cache file.
+    """
+    digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+    return Path(cache_dir or PROFILE_CACHE_DIR).expanduser() / f"{digest}.json"
+
+
+def load_cached_profile(
+    key: list,
+    cache_dir: str | Path | None = None,
+) -> dict | None:
+    """Load a resolved profile from the cache.
+
+    Args:
+        key: The key of the resolved profile, see `profile_key`.
+        cache_dir: The directory of the cache, `PROFILE_CACHE_DIR` by default.
+
+    Returns:
+        The configurations resolved from the profile, or `None` if they are not
+        cached, or the cache is stale or broken.
+    """
+    try:
+        cached = json.loads(_cache_file(key, cache_dir).read_text())
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    return cached.get("conf")
+
+
+def save_cached_profile(
+    key: list,
+    conf: dict[str, Any],
+    cache_dir: str | Path | None = None,
+) -> None:
+    """Save a resolved profile to the cache.
+
+    Nothing is cached if the configurations are not JSON serializable (e.g. TOML
+    dates, which would not be restored as they are), or the cache is not
+    writable.
+
+    Args:
+        key: The key of the resolved profile, see `profile_key`.
+        conf: The configurations resolved from the profile.
+        cache_dir: The directory of the cache, `PROFILE_CACHE_DIR` by default.
+    """
+    try:
+        content = json.dumps({"key": key, "conf": conf})
+    except (TypeError, ValueError):
+        return
+
+    cache_file = _cache_file(key, cache_dir)
+    with suppress(OSError):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # written to a temporary file and renamed, for the concurrent runs
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(content)
+        os.replace(tmp_file, cache_file)
@@ -0,0 +1,214 @@
+"""Scatter input files into size-balanced shards, one shard per task.
+
+The inputs matching a glob pattern are listed once (with their sizes), and
+bin-packed into shards by the sizes, so that the tasks process roughly the same
+amount of data. The base directory of the pattern is mounted to the VM the way a
+named mount (`GBATCH_SCATTER=<base>`) is, and the paths (inside the VM) of the
+files in each shard are saved to `{workdir}/{daemon_name}/{index}/scatter.list`,
+which is exposed to the task by `GBATCH_SCATTER_LIST`.
+
+The pattern is matched the same way for the local and the cloud inputs, by the
+`matchGlob` rules of Google Storage: `*` and `?` don't match `/`, `**` matches
+across the directories, and `[...]` and `{a,b}` are supported.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+from functools import lru_cache
+from typing import Sequence
+
+from panpath import GSPath, PanPath
+
+from .logs import gs_storage
+
+# The name of the mount of the base directory of the inputs
+SCATTER_MOUNT = "GBATCH_SCATTER"
+# The name of the list file in the directory of each task
+SCATTER_LIST = "scatter.list"
+
+_MAGIC = re.compile(r"[*?[{]")
+
+
+def _class_end(pattern: str, start: int) -> int:
+    """Find the `]` closing a character class.
+
+    Args:
+        pattern: The glob pattern.
+        start: The index right after the opening `[`.
+
+    Returns:
+        The index of the closing `]`, or -1 if the class is not closed. A `]`
+        right after `[`, `[!` or `[^` is a member, not the closing one.
+    """
+    end = start
+    if pattern[end:end + 1] in ("!", "^"):
+        end += 1
+    if pattern[end:end + 1] == "]":
+        end += 1
+    return pattern.find("]", end)
+
+
+@lru_cache(maxsize=None)
+def glob_regex(pattern: str) -> re.Pattern:
+    """Translate a glob pattern into a regular expression by the `matchGlob` rules.
+
+    Args:
+        pattern: The glob pattern, relative to the base directory.
+
+    Returns:
+        The compiled regular expression, to match the whole relative path.
+    """
+    regex, i, n, braces = [], 0, len(pattern), 0
+    while i < n:
+        char = pattern[i]
+        i += 1
+        if char == "*" and pattern.startswith("*", i):
+            i += 1
+            if pattern.startswith("/", i):
+                # `**/` matches zero or more directories
+                i += 1
+                regex.append("(?:.*/)?")
+            else:
+                regex.append(".*")
+        elif char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            end = _class_end(pattern, i)
+            if end < 0:
+                # not closed, a literal `[`, as `fnmatch.translate()` does
+                regex.append(re.escape(char))
+                continue
+            members = pattern[i:end].replace("\\", "\\\\")
+            if members[0] in "!^":
+                members = "^" + members[1:]
+            regex.append(f"[{members}]")
+            i = end + 1
+        elif char == "{" and "}" in pattern[i:]:
+            braces += 1
+            regex.append("(?:")
+        elif char == "," and braces:
+            regex.append("|")
+        elif char == "}" and braces:
+            braces -= 1
+            regex.append(")")
+        else:
+            regex.append(re.escape(char))
+
+    return re.compile("".join(regex))
+
+
+def _recursive(pattern: str) -> bool:
+    """Whether the pattern matches any files not directly under the base."""
+    return "/" in pattern or "**" in pattern
+
+
+def split_pattern(pattern: str) -> tuple[str, str]:
+    """Split a glob pattern into the base directory and the relative pattern.
+
+    Args:
+        pattern: The glob pattern, e.g. `gs://bucket/inputs/*.bam`.
+
+    Returns:
+        The base directory without any glob characters, and the pattern
+        relative to it.
+    """
+    pattern = pattern.rstrip("/")
+    scheme, sep, path = pattern.rpartition("://")
+    parts = path.split("/")
+    for i, part in enumerate(parts):
+        # the bucket can't be a pattern
+        if _MAGIC.search(part) and (i > 0 or not sep):
+            break
+    else:
+        i = len(parts) - 1
+
+    return f"{scheme}{sep}{'/'.join(parts[:i])}", "/".join(parts[i:])
+
+
+async def _list_gs_inputs(base: GSPath, pattern: str) -> list[tuple[str, int]]:
+    """List the objects matching the pattern with a single (paged) listing."""
+    bucket = base.parts[1]
+    prefix = f"{base.key}/" if base.key else ""
+    params = {"prefix": prefix}
+    regex = glob_regex(pattern)
+    if not _recursive(pattern):
+        # only the objects directly under the base directory
+        params["delimiter"] = "/"
+
+    storage = await gs_storage()
+    inputs = []
+    while True:
+        response = await storage.list_objects(
+            bucket,
+            params={key: val for key, val in params.items() if val},
+        )
+        for item in response.get("items", []):
+            name = item["name"]
+            if not name.endswith("/") and regex.fullmatch(name[len(prefix):]):
+                inputs.append((f"gs://{bucket}/{name}", int(item.get("size", 0))))
+
+        if not response.get("nextPageToken"):
+            break
+        params["pageToken"] = response["nextPageToken"]
+
+    return inputs
+
+
+async def list_inputs(pattern: str) -> list[tuple[str, int]]:
+    """List the files matching the glob pattern with their sizes.
+
+    For Google Storage Bucket paths, the objects are listed once with their sizes,
+    instead of being globbed and then stat'ed one by one.
+
+    Args:
+        pattern: The glob pattern, either local or on the cloud.
+
+    Returns:
+        The paths and the sizes of the files, sorted by the paths.
+    """
+    base, rel = split_pattern(pattern)
+    base_path = PanPath(base)
+    if isinstance(base_path, GSPath):
+        inputs = await _list_gs_inputs(base_path, rel)
+    else:
+        inputs = []
+        regex = glob_regex(rel)
+        paths = base_path.a_rglob("*") if _recursive(rel) else base_path.a_glob("*")
+        async for path in paths:
+            if regex.fullmatch(
+                path.relative_to(base_path).as_posix()
+            ) and await path.a_is_file():
+                inputs.append((str(path), (await path.a_stat()).st_size))
+
+    return sorted(inputs)
+
+
+def shard_inputs(
+    inputs: Sequence[tuple[str, int]],
+    shards: int,
+) -> list[list[str]]:
+    """Bin-pack the inputs into shards by their sizes.
+
+    The largest inputs are assigned first, each to the shard with the least
+    total size so far (longest processing time first).
+
+    Args:
+        inputs: The paths and the sizes of the inputs.
+        shards: The number of shards.
+
+    Returns:
+        The paths of the inputs in each shard. Empty shards are dropped when
+        there are fewer inputs than shards.
+    """
+    heap = [(0, i) for i in range(min(shards, len(inputs)))]
+    bins: list[list[str]] = [[] for _ in heap]
+    for path, size in sorted(inputs, key=lambda inp: (-inp[1], inp[0])):
+        total, i = heapq.heappop(heap)
+        bins[i].append(path)
+        heapq.heappush(heap, (total + size, i))
+
+    return [sorted(paths) for paths in bins]
@@ -0,0 +1,160 @@
+"""Submit many daemon jobs concurrently, without waiting for them.
+
+Compared to running the daemons one by one (`await daemon.run()` with `--nowait`),
+the defaults (and the profile) are resolved once for all the daemons, no logging
+handler is installed, the plugins are enabled once for the whole batch, and the
+schedulers are created without the Xqute instances. The submissions run
+concurrently, bounded by `max_concurrency`.
+
+Example:
+    >>> from pipen_cli_gbatch import submit_many
+    >>> async for index, (jid, submitted) in submit_many(
+    ...     [({"name": f"Job{i}"}, ["python", "run.py", str(i)]) for i in range(100)],
+    ...     max_concurrency=16,
+    ...     defaults={"workdir": "gs://my-bucket/workdir", "project": "my-project"},
+    ... ):
+    ...     print(index, jid, "submitted" if submitted else "already running")
+"""
+
+from __future__ import annotations
+
+import asyncio
+from argparse import Namespace
+from typing import (
+    Any,
+    AsyncGenerator,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    Type,
+)
+
+from pipen.defaults import CONFIG_FILES
+from xqute import plugin
+
+from .daemons import CliGbatchDaemonPlain
+from .logs import gs_session
+from .mixin import CliGbatchDaemonMixin
+from .plugins import (
+    CliGbatchPlugin,
+    XquteCliGbatchFramesPlugin,
+    XquteCliGbatchTasksPlugin,
+)
+
+
+class Submission(NamedTuple):
+    """The submission of a daemon job.
+
+    Attributes:
+        jid: The job id, of the existing job if it is already running.
+        submitted: Whether the job is newly submitted, False if it is already
+            running and not submitted again.
+    """
+
+    jid: str | None
+    submitted: bool
+
+
+async def _submit_one(
+    daemon: CliGbatchDaemonMixin,
+    tasks_plugin: XquteCliGbatchTasksPlugin,
+    frames_plugin: XquteCliGbatchFramesPlugin,
+) -> Submission:
+    """Prepare and submit a single daemon job, unless it is already running."""
+    await daemon.prepare()
+    if not daemon.job_command:
+        raise ValueError("No command to run is provided.")
+
+    scheduler = daemon._get_scheduler()
+    if daemon.tasks:
+        tasks_plugin.register(scheduler, daemon.tasks, daemon.parallel)
+    if daemon.config.get("compress_logs"):
+        frames_plugin.register(scheduler)
+
+    return Submission(*await daemon._submit(scheduler))
+
+
+async def submit_many(
+    configs_and_commands: Iterable[tuple[dict | Namespace, Sequence[str]]],
+    max_concurrency: int = 16,
+    defaults: Mapping[str, Any] | None = None,
+    profile: str | None = None,
+    daemon_class: Type[CliGbatchDaemonMixin] = CliGbatchDaemonPlain,
+    return_exceptions: bool = False,
+) -> AsyncGenerator[tuple[int, Submission | BaseException], None]:
+    """Submit many daemon jobs concurrently, yielding the submissions as accepted.
+
+    Args:
+        configs_and_commands: The configurations and the commands of the daemons.
+            The configurations are the same as the ones for the daemon classes,
+            and are consumed lazily, so a generator can be used.
+        max_concurrency: The maximum number of submissions running at a time.
+        defaults: The default configurations shared by all the daemons.
+        profile: The profile to load the default scheduler options from the
+            pipen configuration files, resolved once for all the daemons.
+        daemon_class: The class of the daemons.
+        return_exceptions: Whether to yield the exceptions of the failed
+            submissions instead of raising them.
+
+    Yields:
+        The index of the daemon in `configs_and_commands` and its submission,
+        the job id and whether it is newly submitted (or the exception, if
+        `return_exceptions` is True), in the order of the submissions being
+        accepted. A job already running is not submitted again, and its
+        existing job id is yielded.
+
+    Raises:
+        ValueError: If `max_concurrency` is less than 1.
+    """
+    if max_concurrency < 1:
+        raise ValueError("`max_concurrency` must be at least 1.")
+
+    shared = {}
+    if profile:
+        profile_defaults = await CliGbatchPlugin._get_defaults_from_config(
+            CONFIG_FILES,
+            profile,
+        )
+        shared.update(profile_defaults.get("scheduler_opts", {}))
+    shared.update(defaults or {})
+
+    tasks_plugin = XquteCliGbatchTasksPlugin()
+    frames_plugin = XquteCliGbatchFramesPlugin(schedulers=set())
+    items = iter(enumerate(configs_and_commands))
+    pending: dict[asyncio.Task, int] = {}
+
+    def _fill() -> None:
+        """Start the submissions up to the concurrency limit."""
+        for index, (config, command) in items:
+            if isinstance(config, Namespace):
+                config = vars(config)
+            daemon = daemon_class({**shared, **config}, list(command))
+            submission = _submit_one(daemon, tasks_plugin, frames_plugin)
+            pending[asyncio.create_task(submission)] = index
+            if len(pending) >= max_concurrency:
+                break
+
+    async with gs_session():
+        with plugin.plugins_context(
+            ["-xqute.pipen", tasks_plugin, frames_plugin]
+        ):
+            try:
+                _fill()
+                while pending:
+                    done, _ = await asyncio.wait(
+                        pending,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    for task in done:
+                        index = pending.pop(task)
+                        exc = task.exception()
+                        if exc is not None and not return_exceptions:
+                            raise exc
+                        yield index, exc if exc is not None else task.result()
+                    _fill()
+            finally:
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
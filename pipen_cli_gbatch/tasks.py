@@ -0,0 +1,361 @@
+"""Run a list of commands as the tasks of a single Google Cloud Batch job.
+
+Instead of submitting one job per command, the commands are rendered into the
+wrapped job script of the daemon job, and the job is submitted with
+`taskGroups[0].taskCount` set to the number of commands. Each task picks its
+command by `BATCH_TASK_INDEX` and writes its outputs to
+`{workdir}/{daemon_name}/{index}/`:
+
+- `task.stdout`: The stdout of the command
+- `task.stderr`: The stderr of the command
+- `task.rc`: The return code of the command
+
+Since all the tasks share the same wrapped job script (and the same meta files of
+the daemon job), only task 0 marks the job as running, and only the last finished
+task reports the status and the return code of the whole job, which fails if any
+of the tasks fails (see `GbatchTasksScheduler`).
+
+With a pool size (`--parallel`), the commands are instead run by a local process
+pool in a single task, with the same outputs for each command.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import re
+import shlex
+from typing import Sequence
+
+from panpath import PanPath
+from xqute.schedulers.gbatch_scheduler import GbatchScheduler
+
+# The bash function fed to xqute as the command of the daemon job
+TASK_RUNNER = "_gbatch_run_task"
+# The bash function to run all the commands by a local pool in a single task
+POOL_RUNNER = "_gbatch_run_pool"
+# The manifest of the tasks, saved in the daemon workdir
+TASKS_MANIFEST = "tasks.tsv"
+
+TASKS_WRAPPER_INIT = r"""
+# Task array (pipen-cli-gbatch): {count} task(s)
+export GBATCH_TASK_COUNT={count}
+export GBATCH_RUN_ID={run_id}
+export GBATCH_PARALLEL={parallel}
+export GBATCH_TASK_DIR="$XQUTE_METADIR/${{BATCH_TASK_INDEX:-0}}"
+# the return codes and the tickets of the tasks of this run
+export GBATCH_RUN_DIR="$XQUTE_METADIR/.runs/$GBATCH_RUN_ID"
+# the seconds to wait for the return codes of the tasks on other VMs to be visible
+export GBATCH_RC_WAIT=${{GBATCH_RC_WAIT:-120}}
+
+_gbatch_task() {{
+    local index=$1
+    local taskdir="$XQUTE_METADIR/$index"
+    local rc
+    local -x GBATCH_TASK_INDEX=$index
+    local -x GBATCH_TASK_DIR=$taskdir
+    mkdir -p "$taskdir" "$GBATCH_RUN_DIR/rc" "$GBATCH_RUN_DIR/tickets"
+    rm -f "$taskdir/task.rc"
+    case "$index" in
+{arms}
+        *) echo "No such task: $index" >&2; false ;;
+    esac 1>"$taskdir/task.stdout" 2>"$taskdir/task.stderr"
+    rc=$?
+    echo "$rc" > "$taskdir/task.rc"
+    return $rc
+}}
+
+# Create a file only if it doesn't exist, even if it is created on another VM:
+# the file is opened exclusively, and gcsfuse uploads a new file with the
+# precondition ifGenerationMatch=0 when it is closed (by `cat`, which fails if
+# the upload fails), so that only one of the concurrent creations succeeds.
+_gbatch_create() {{
+    ( set -o noclobber; echo "$2" | cat > "$1" ) 2> /dev/null
+}}
+
+# Take the next ticket of the finished tasks. The tickets are taken in order, one
+# for each task, so the task with the last one is the last finished task. The
+# listing (cached by gcsfuse) may miss the tickets taken on other VMs, but never
+# shows more, so it is only where to start trying.
+_gbatch_ticket() {{
+    local n
+    n=$(ls "$GBATCH_RUN_DIR/tickets" 2> /dev/null | wc -l)
+    while [[ $n -lt $GBATCH_TASK_COUNT ]]; do
+        n=$((n + 1))
+        if _gbatch_create "$GBATCH_RUN_DIR/tickets/$n" "${{BATCH_TASK_INDEX:-0}}"; then
+            echo "$n"
+            return 0
+        fi
+    done
+    return 1
+}}
+
+# The return code of a task of this run, -1 if not visible in time
+_gbatch_rc() {{
+    local deadline=$((SECONDS + GBATCH_RC_WAIT))
+    until cat "$GBATCH_RUN_DIR/rc/$1" 2> /dev/null; do
+        if [[ $SECONDS -ge $deadline ]]; then
+            echo "-1"
+            return
+        fi
+        sleep 1
+    done
+}}
+
+_gbatch_summary() {{
+    local i rc
+    local failed=()
+    for ((i = 0; i < GBATCH_TASK_COUNT; i++)); do
+        rc=$(_gbatch_rc "$i")
+        if [[ "$rc" != "0" ]]; then
+            failed+=("$i")
+        fi
+    done
+    echo "Tasks finished: $GBATCH_TASK_COUNT, failed: ${{#failed[@]}}"
+    if [[ ${{#failed[@]}} -gt 0 ]]; then
+        echo "Failed tasks: ${{failed[*]}}"
+        return 1
+    fi
+}}
+
+_gbatch_run_task() {{
+    local index=${{BATCH_TASK_INDEX:-0}}
+    local ticket
+    _gbatch_task "$index"
+    local rc=$?
+    # a task retried by Cloud Batch is registered already, and doesn't count again
+    if ! _gbatch_create "$GBATCH_RUN_DIR/rc/$index" "$rc" ||
+        ! ticket=$(_gbatch_ticket) ||
+        [[ $ticket -lt $GBATCH_TASK_COUNT ]]; then
+        return $rc
+    fi
+    echo "$index" > "$GBATCH_RUN_DIR/last"
+    _gbatch_summary
+}}
+
+_gbatch_run_pool() {{
+    local i
+    local size=${{GBATCH_PARALLEL:-0}}
+    if [[ $size -le 0 ]]; then
+        size=$(nproc 2>/dev/null || echo 1)
+    fi
+    echo "Running $GBATCH_TASK_COUNT task(s) with a pool of $size process(es)"
+    for ((i = 0; i < GBATCH_TASK_COUNT; i++)); do
+        while [[ $(jobs -rp | wc -l) -ge $size ]]; do
+            wait -n
+        done
+        {{
+            _gbatch_task "$i"
+            _gbatch_create "$GBATCH_RUN_DIR/rc/$i" "$?"
+        }} &
+    done
+    wait
+    _gbatch_summary
+}}
+"""
+
+# Inserted right after the meta file functions are defined in the wrapped job
+# script, before the job is marked as running, see `GbatchTasksScheduler`
+TASKS_WRAPPER_GUARD = r"""
+# Task array (pipen-cli-gbatch): the meta files of the job are shared by the
+# tasks, the job is started by task 0, and ended by the last finished task
+eval "_gbatch_$(declare -f update_metafile)"
+eval "_gbatch_$(declare -f remove_metafile)"
+
+_gbatch_reports() {
+    if [[ ${BATCH_TASK_COUNT:-1} -le 1 ]]; then
+        return 0
+    fi
+    if [[ -z "${GBATCH_RUN_DIR:-}" ]]; then
+        # the task runner is not defined yet, the job is being started
+        [[ "${BATCH_TASK_INDEX:-0}" == "0" ]]
+        return
+    fi
+    [[ "$(cat "$GBATCH_RUN_DIR/last" 2> /dev/null)" == "${BATCH_TASK_INDEX:-0}" ]]
+}
+
+update_metafile() {
+    if [[ -z "${XQUTE_JOB_METADIR:-}" || "$2" == "$XQUTE_JOB_METADIR"/* ]] &&
+        ! _gbatch_reports; then
+        return 0
+    fi
+    _gbatch_update_metafile "$@"
+}
+
+remove_metafile() {
+    if [[ -z "${XQUTE_JOB_METADIR:-}" || "$1" == "$XQUTE_JOB_METADIR"/* ]] &&
+        ! _gbatch_reports; then
+        return 0
+    fi
+    _gbatch_remove_metafile "$@"
+}
+"""
+
+
+class GbatchTasksScheduler(GbatchScheduler):
+    """The gbatch scheduler for the daemon jobs running the commands as tasks.
+
+    All the tasks run the same wrapped job script, which updates the meta files
+    of the job (status, stdout, ...) when it starts and ends. The updates are
+    guarded (`TASKS_WRAPPER_GUARD`) before the first of them, so that the job is
+    marked as running only by task 0, and finished only by the last finished
+    task, which is decided by the tickets of the tasks (`_gbatch_ticket`) instead
+    of the listing of the outputs, cached by gcsfuse on each VM.
+    """
+
+    @property
+    def jobcmd_wrapper_init(self) -> str:
+        """The init script for the job command wrapper, with the guard"""
+        return f"{super().jobcmd_wrapper_init}\n{TASKS_WRAPPER_GUARD}"
+
+
+def render_tasks_init(
+    tasks: Sequence[str],
+    run_id: str,
+    parallel: int | None = None,
+) -> str:
+    """Render the bash code to be inserted into the wrapped job script.
+
+    Args:
+        tasks: The commands of the tasks, each as a shell command string.
+        run_id: The unique id of the run, to tell the outputs of the tasks
+            of this run from those of previous runs.
+        parallel: The size of the local pool to run the commands in a single
+            task (`0` for the number of vCPUs). `None` to run them as the tasks
+            of the job.
+
+    Returns:
+        The bash code defining the task runner.
+    """
+    arms = "\n".join(
+        f"        {i}) bash -c {shlex.quote(task)} ;;"
+        for i, task in enumerate(tasks)
+    )
+    return TASKS_WRAPPER_INIT.format(
+        count=len(tasks),
+        run_id=shlex.quote(run_id),
+        parallel="" if parallel is None else int(parallel),
+        arms=arms,
+    )
+
+
+async def load_batch_file(batch_file: str | PanPath) -> list[str]:
+    """Load the commands from a batch file, one command per line.
+
+    Empty lines and lines starting with `#` are ignored.
+
+    Args:
+        batch_file: The path to the batch file, either local or on the cloud.
+
+    Returns:
+        The list of commands.
+    """
+    batch_file = PanPath(batch_file)
+    if not await batch_file.a_exists():
+        raise FileNotFoundError(f"Batch file not found: {batch_file}")
+
+    content = await batch_file.a_read_text()
+    return [
+        line.strip()
+        for line in content.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+async def load_sweep_file(sweep_file: str | PanPath) -> list[dict[str, str]]:
+    """Load the parameter grid from a CSV/TSV file with a header line.
+
+    Files with a `.csv` extension are comma-separated, others are tab-separated.
+
+    Args:
+        sweep_file: The path to the sweep file, either local or on the cloud.
+
+    Returns:
+        The rows of the grid, each as a dict of column name to value.
+
+    Raises:
+        FileNotFoundError: If the sweep file doesn't exist.
+        ValueError: If a row has more or fewer columns than the header.
+    """
+    sweep_file = PanPath(sweep_file)
+    if not await sweep_file.a_exists():
+        raise FileNotFoundError(f"Sweep file not found: {sweep_file}")
+
+    content = await sweep_file.a_read_text()
+    delimiter = "," if sweep_file.suffix.lower() == ".csv" else "\t"
+    reader = csv.DictReader(io.StringIO(content), delimiter=delimiter)
+    rows = []
+    for row in reader:
+        if not any(row.values()):
+            continue
+        # the missing columns are None, and the extra ones are keyed by None
+        if None in row or None in row.values():
+            raise ValueError(
+                f"Sweep file {sweep_file}, line {reader.line_num}: expected "
+                f"{len(reader.fieldnames or [])} columns as the header."
+            )
+        rows.append(row)
+    return rows
+
+
+def expand_sweep(command: Sequence[str], rows: Sequence[dict[str, str]]) -> list[str]:
+    """Expand the command template with each row of the parameter grid.
+
+    The `{column}` placeholders in each argument of the command are replaced
+    with the values of the row, other braces are kept as they are.
+
+    Args:
+        command: The command template, as a list of arguments.
+        rows: The rows of the parameter grid.
+
+    Returns:
+        The commands of the tasks, each as a shell command string.
+
+    Raises:
+        ValueError: If no placeholders of the columns are used in the command.
+    """
+    placeholder = re.compile(r"\{(\w+)\}")
+    columns = set(rows[0]) if rows else set()
+    if not any(
+        match.group(1) in columns
+        for arg in command
+        for match in placeholder.finditer(arg)
+    ):
+        raise ValueError(
+            "No placeholders of the sweep columns found in the command, "
+            f"use any of {', '.join(f'{{{col}}}' for col in sorted(columns))}."
+        )
+
+    return [
+        shlex.join(
+            placeholder.sub(
+                lambda m, row=row: row.get(m.group(1), m.group(0)),  # type: ignore
+                arg,
+            )
+            for arg in command
+        )
+        for row in rows
+    ]
+
+
+def format_manifest(
+    tasks: Sequence[str],
+    params: Sequence[dict[str, str]] | None = None,
+) -> str:
+    """Format the manifest of the tasks as TSV.
+
+    Args:
+        tasks: The commands of the tasks.
+        params: The parameters of the tasks (e.g. rows of the sweep file).
+
+    Returns:
+        The TSV content with the task index, the parameters and the command.
+    """
+    params = params or [{} for _ in tasks]
+    columns = list(params[0]) if params else []
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+    writer.writerow(["index", *columns, "command"])
+    for i, (task, param) in enumerate(zip(tasks, params)):
+        writer.writerow([i, *(param.get(col, "") for col in columns), task])
+    return out.getvalue()
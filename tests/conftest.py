@@ -39,3 +39,19 @@ def mock_mounts_dir(setup_mock_gcloud):
 
 
 MOCK_MOUNTS_DIR = Path(__file__).parent / "mock" / "mounts"
+
+
+@pytest.fixture(autouse=True)
+def profile_cache_dir(tmp_path, monkeypatch):
+    """Keep the resolved profiles cached in a temporary directory"""
+    cache_dir = tmp_path / "profiles"
+    monkeypatch.setattr("pipen_cli_gbatch.profiles.PROFILE_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def offset_state_dir(tmp_path, monkeypatch):
+    """Keep the offsets of the logs pulled in a temporary directory"""
+    state_dir = tmp_path / "offsets"
+    monkeypatch.setattr("pipen_cli_gbatch.logs.OFFSET_STATE_DIR", str(state_dir))
+    return state_dir
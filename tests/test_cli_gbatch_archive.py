@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import patch
+
+from panpath import PanPath
+from pipen_cli_gbatch import CliGbatchDaemonPlain
+from pipen_cli_gbatch.archive import LogArchive
+
+
+def _daemon(tmp_path, **config):
+    return CliGbatchDaemonPlain(
+        {
+            "workdir": str(tmp_path / "workdir"),
+            "name": "MyName",
+            "archive_logs": str(tmp_path / "logs.sqlite"),
+            **config,
+        },
+        ["cmd"],
+    )
+
+
+async def test_archive_chunks(tmp_path):
+    logfile = PanPath(tmp_path / "job.stdout")
+    logfile.write_text("".join(f"line{i}\n" for i in range(10)) + "last")
+    with patch("pipen_cli_gbatch.archive.CHUNK_LINES", 3), patch(
+        "pipen_cli_gbatch.archive.ARCHIVE_READ_SIZE", 4
+    ):
+        with LogArchive(tmp_path / "logs.sqlite") as archive:
+            assert await archive.archive("MyName", "STDOUT", logfile) == 11
+            # unchanged, not downloaded again
+            assert await archive.archive("MyName", "STDOUT", logfile) is None
+            assert archive.archived() == [("MyName", "STDOUT", 11)]
+            chunks = archive._conn.execute(
+                "SELECT first_line, lines FROM chunks ORDER BY first_line"
+            ).fetchall()
+            assert chunks == [(0, 3), (3, 3), (6, 3), (9, 2)]
+
+            hits = list(archive.search(r"line[19]|last"))
+            assert [(hit.lineno, hit.line) for hit in hits] == [
+                (2, "line1"),
+                (10, "line9"),
+                (11, "last"),
+            ]
+
+            # grown, archived again
+            logfile.write_text("new\n")
+            assert await archive.archive("MyName", "STDOUT", logfile) == 1
+            assert [hit.line for hit in archive.search("")] == ["new"]
+
+    assert await LogArchive(tmp_path / "logs.sqlite").archive(
+        "MyName", "STDERR", PanPath(tmp_path / "nonexist")
+    ) is None
+
+
+async def test_search_since(tmp_path):
+    now = datetime.now()
+
+    def _log(minutes, msg):
+        return f"{(now - timedelta(minutes=minutes)):%m-%d %H:%M:%S} I {msg}\n"
+
+    logfile = PanPath(tmp_path / "run-latest.log")
+    logfile.write_text(
+        _log(30, "old error")
+        + "  old error detail\n"
+        + _log(20, "old")
+        + _log(5, "new error")
+        + "  new error detail\n"
+    )
+    with patch("pipen_cli_gbatch.archive.CHUNK_LINES", 2):
+        with LogArchive(tmp_path / "logs.sqlite") as archive:
+            await archive.archive("MyName", "RUN", logfile)
+            since = now - timedelta(minutes=10)
+            # the chunks logged before are skipped by the index
+            with patch(
+                "pipen_cli_gbatch.archive.zlib.decompress",
+                wraps=zlib.decompress,
+            ) as decompress:
+                hits = list(archive.search("error", since=since))
+            assert decompress.call_count == 2
+            assert [hit.lineno for hit in hits] == [4, 5]
+
+
+async def test_search_since_continued_chunk(tmp_path):
+    now = datetime.now()
+
+    def _log(minutes, msg):
+        return f"{(now - timedelta(minutes=minutes)):%m-%d %H:%M:%S} I {msg}\n"
+
+    logfile = PanPath(tmp_path / "run-latest.log")
+    logfile.write_text(
+        _log(30, "old error")
+        + _log(25, "old")
+        # continued from the line before, in the next chunk
+        + "  old error detail\n"
+        + _log(5, "new error")
+    )
+    with patch("pipen_cli_gbatch.archive.CHUNK_LINES", 2):
+        with LogArchive(tmp_path / "logs.sqlite") as archive:
+            await archive.archive("MyName", "RUN", logfile)
+            hits = list(archive.search("error", since=now - timedelta(minutes=10)))
+            assert [hit.lineno for hit in hits] == [4]
+            assert [hit.lineno for hit in archive.search("error")] == [1, 3, 4]
+
+
+async def test_archive_same_daemon_in_workdirs(tmp_path):
+    for workdir in ("wd1", "wd2"):
+        (tmp_path / workdir).mkdir()
+        (tmp_path / workdir / "job.stdout").write_text(f"{workdir} line\n")
+
+    with LogArchive(tmp_path / "logs.sqlite") as archive:
+        for workdir in ("wd1", "wd2"):
+            logfile = PanPath(tmp_path / workdir / "job.stdout")
+            assert await archive.archive("MyName", "STDOUT", logfile, workdir) == 1
+        assert archive.archived() == [("MyName", "STDOUT", 1)] * 2
+        assert archive.archived(workdir="wd2") == [("MyName", "STDOUT", 1)]
+        assert [hit.line for hit in archive.search("line", workdir="wd2")] == [
+            "wd2 line"
+        ]
+        assert len(list(archive.search("line"))) == 2
+
+
+def test_archive_old_schema(tmp_path):
+    conn = sqlite3.connect(tmp_path / "logs.sqlite")
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, daemon TEXT)")
+    conn.commit()
+    conn.close()
+    # started over with the current schema
+    with LogArchive(tmp_path / "logs.sqlite") as archive:
+        assert archive.archived() == []
+
+
+async def test_run_archive_and_search(tmp_path, capsys):
+    for name in ("sweep-1", "sweep-2"):
+        metadir = tmp_path / "workdir" / name / "0"
+        metadir.mkdir(parents=True)
+        (metadir / "job.stdout").write_text(f"{name} ok\n")
+        (metadir / "job.stderr").write_text(f"{name} ERROR\n")
+
+    daemon = _daemon(tmp_path, name="sweep-*", search="ERROR")
+    await daemon._run_search()
+    out = capsys.readouterr().out.splitlines()
+    assert out == [
+        "[sweep-1] /STDERR:1: sweep-1 ERROR",
+        "[sweep-2] /STDERR:1: sweep-2 ERROR",
+    ]
+
+    # searched without downloading again
+    daemon = _daemon(tmp_path, name="sweep-2", search="ok", archive_logs=None)
+    with patch(
+        "pipen_cli_gbatch.mixin.DEFAULT_LOG_CACHE_DIR", str(tmp_path)
+    ), patch("pipen_cli_gbatch.mixin.list_logs") as list_logs:
+        await daemon._run_search()
+    list_logs.assert_not_called()
+    assert capsys.readouterr().out == "[sweep-2] /STDOUT:1: sweep-2 ok\n"
+
+
+async def test_run_archive_errors(tmp_path):
+    with pytest.raises(ValueError, match="Workdir not found"):
+        await _daemon(tmp_path)._run_archive_logs()
+
+    (tmp_path / "workdir").mkdir()
+    with pytest.raises(ValueError, match="No logs found"):
+        await _daemon(tmp_path)._run_archive_logs()
+
+    with patch(
+        "pipen_cli_gbatch.mixin.DEFAULT_LOG_CACHE_DIR", str(tmp_path)
+    ), pytest.raises(ValueError, match="No logs archived"):
+        await _daemon(tmp_path, search="x", archive_logs=None)._run_search()
+
+    with pytest.raises(ValueError, match="Invalid pattern for --search"):
+        await _daemon(tmp_path, search="(")._run_search()
+
+    with pytest.raises(ValueError, match="cannot be used with"):
+        await _daemon(tmp_path, search="x", view_logs="all").prepare()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from pipen_cli_gbatch import argspec
+from pipen_cli_gbatch._daemon_args import ARGS_SPEC, TOML_SHA256
+from pipen_cli_gbatch.argspec import (
+    compile_args_spec,
+    load_args_spec,
+    parse_args_toml,
+    toml_digest,
+)
+
+
+def test_compiled_spec_up_to_date():
+    # regenerate with `python -m pipen_cli_gbatch.argspec` if this fails
+    assert TOML_SHA256 == toml_digest()
+    assert ARGS_SPEC == parse_args_toml()
+
+
+def test_load_args_spec_returns_copy():
+    with patch.object(argspec, "parse_args_toml") as parse:
+        spec = load_args_spec()
+        spec["arguments"].pop()
+        assert load_args_spec() == ARGS_SPEC
+    parse.assert_not_called()
+
+
+def test_load_args_spec_stale(tmp_path):
+    toml = tmp_path / "daemon_args.toml"
+    toml.write_text('[[arguments]]\nflags = ["--foo"]\n')
+    module = tmp_path / "_daemon_args.py"
+    with patch.object(argspec, "ARGS_TOML", toml), patch.object(
+        argspec, "ARGS_SPEC_MODULE", module
+    ):
+        # parsed on the fly, not compiled at runtime
+        assert load_args_spec() == {"arguments": [{"flags": ["--foo"]}]}
+        assert not module.exists()
+
+        # compiled at development time
+        assert compile_args_spec() == {"arguments": [{"flags": ["--foo"]}]}
+        assert f"TOML_SHA256 = {toml_digest()!r}" in module.read_text()
+        assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_load_args_spec_broken_module():
+    with patch.object(
+        argspec.importlib, "import_module", side_effect=SyntaxError("broken")
+    ), patch.object(argspec, "parse_args_toml", return_value={"a": 1}) as parse:
+        assert load_args_spec() == {"a": 1}
+    parse.assert_called_once()
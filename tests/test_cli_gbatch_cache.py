@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from pipen_cli_gbatch.cache import LogCache
+from pipen_cli_gbatch.logs import LogTailer, ObjectStat
+
+URI = "gs://bucket/workdir/0/job.stdout"
+
+
+@pytest.fixture
+def remote():
+    """A fake log object on GCS, with the downloads recorded"""
+    remote = MagicMock(content=b"", ranges=[])
+
+    async def download(bucket, blob, headers):
+        start, end = headers["Range"][6:].split("-")
+        remote.ranges.append((int(start), int(end) + 1))
+        # let the other viewers try to acquire the lock meanwhile
+        await asyncio.sleep(0.01)
+        return remote.content[int(start):int(end) + 1]
+
+    storage = MagicMock()
+    storage.download = AsyncMock(side_effect=download)
+    remote.storage = storage
+    with patch("pipen_cli_gbatch.logs.gs_storage", AsyncMock(return_value=storage)):
+        yield remote
+
+
+def stat_of(remote, generation="1"):
+    return ObjectStat(len(remote.content), generation)
+
+
+async def test_cache_shared_between_viewers(tmp_path, remote):
+    remote.content = b"line1\nline2\n"
+    viewers = [LogCache(tmp_path), LogCache(tmp_path)]
+    path = PanPath(URI)
+    stat = stat_of(remote)
+    results = await asyncio.gather(
+        *(viewer.read_range(path, 0, stat.size, stat) for viewer in viewers)
+    )
+    assert results == [remote.content, remote.content]
+    # only one of the viewers downloaded the bytes
+    assert remote.ranges == [(0, 12)]
+
+    # appended incrementally, with a few bytes cached fetched to verify
+    remote.content += b"line3\n"
+    stat = stat_of(remote, "2")
+    assert await viewers[1].read_range(path, 12, 18, stat) == b"line3\n"
+    assert remote.ranges[1] == (0, 18)
+    assert await viewers[0].read_range(path, 6, 18, stat) == b"line2\nline3\n"
+    assert len(remote.ranges) == 2
+
+    cache_file = viewers[0].cache_file(URI)
+    assert cache_file.read_bytes() == remote.content
+    assert '"generation": "2"' in cache_file.with_suffix(".json").read_text()
+
+
+async def test_cache_rewritten_object(tmp_path, remote):
+    cache = LogCache(tmp_path)
+    path = PanPath(URI)
+    remote.content = b"0123456789" * 3
+    await cache.read_range(path, 0, 30, stat_of(remote))
+
+    # rewritten and grown
+    remote.content = b"abcdefghij" * 4
+    assert await cache.read_range(path, 30, 40, stat_of(remote)) == b"abcdefghij"
+    assert cache.cache_file(URI).read_bytes() == remote.content
+    assert remote.ranges[-1] == (0, 40)
+
+    # rewritten and shrunk
+    remote.content = b"xyz"
+    assert await cache.read_range(path, 0, 3, stat_of(remote)) == b"xyz"
+    assert cache.cache_file(URI).read_bytes() == b"xyz"
+
+
+async def test_cache_rewritten_same_size(tmp_path, remote):
+    cache = LogCache(tmp_path)
+    path = PanPath(URI)
+    remote.content = b"abc\n"
+    assert await cache.read_range(path, 0, 4, stat_of(remote, "1")) == b"abc\n"
+    # not changed, read from the cache
+    assert await cache.read_range(path, 0, 4, stat_of(remote, "1")) == b"abc\n"
+    assert len(remote.ranges) == 1
+
+    # rewritten with the same size
+    remote.content = b"xyz\n"
+    assert await cache.read_range(path, 0, 4, stat_of(remote, "2")) == b"xyz\n"
+    assert remote.ranges[-1] == (0, 4)
+    assert cache.cache_file(URI).read_bytes() == b"xyz\n"
+
+
+async def test_tailer_through_cache(tmp_path, remote):
+    remote.content = b"a\nb\n"
+    storage = remote.storage
+    storage.download_metadata = AsyncMock(
+        side_effect=lambda *args: {"size": str(len(remote.content)), "generation": "1"}
+    )
+    cache = LogCache(tmp_path)
+    assert await LogTailer(URI, cache=cache).populate() == ["a", "b"]
+    assert await LogTailer(URI, cache=cache).populate() == ["a", "b"]
+    assert len(remote.ranges) == 1
+
+
+def test_default_cache_dir(tmp_path):
+    with patch("pipen_cli_gbatch.cache.DEFAULT_LOG_CACHE_DIR", str(tmp_path / "c")):
+        cache = LogCache()
+    assert cache.cache_dir == tmp_path / "c"
+    assert cache.cache_dir.is_dir()
+
+
+async def test_view_logs_with_cache(tmp_path, capsys):
+    from pipen_cli_gbatch import CliGbatchDaemonPlain
+
+    (tmp_path / "MyName" / "0").mkdir(parents=True)
+    (tmp_path / "MyName" / "0" / "job.stdout").write_text("x\n")
+    daemon = CliGbatchDaemonPlain(
+        {
+            "workdir": str(tmp_path),
+            "name": "MyName",
+            "view_logs": "stdout",
+            "log_cache": True,
+        },
+        ["cmd"],
+    )
+    with patch(
+        "pipen_cli_gbatch.cache.DEFAULT_LOG_CACHE_DIR", str(tmp_path / "cache")
+    ), patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    assert "x" in capsys.readouterr().out
+    assert (tmp_path / "cache").is_dir()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import pytest
+from unittest.mock import patch
+
+from panpath import PanPath
+from simpleconf import Config
+from pipen_cli_gbatch.command import CommandArgs
+from pipen_cli_gbatch.daemons import CliGbatchDaemonPipeline
+
+
+async def test_get():
+    args = CommandArgs(
+        ["cmd", "--a", "1", "--b=2", "--a=3", "--b", "4", "--c", "5", "--c", "6", "--d"]
+    )
+    # --key=value takes precedence, then the first occurrence
+    assert await args.get("a") == "3"
+    assert await args.get("b") == "2"
+    assert await args.get("c") == "5"
+    # no value
+    assert await args.get("d") is None
+    assert await args.get("e") is None
+
+
+async def test_configs_merged_and_loaded_once(tmp_path):
+    tmp_path = PanPath(tmp_path)
+    config1 = tmp_path / "config1.toml"
+    config2 = tmp_path / "config2.toml"
+    await config1.a_write_text("name = 'name1'\noutdir = 'outdir1'\n")
+    await config2.a_write_text("name = 'name2'\n")
+    args = CommandArgs(
+        ["cmd", f"@{config1}", "--workdir", "wd", f"@{config2}", "@args.txt"]
+    )
+    with patch.object(Config, "a_load_one", wraps=Config.a_load_one) as load_one:
+        # the latter config overrides the former one
+        assert await args.get("name") == "name2"
+        assert await args.get("outdir") == "outdir1"
+        assert await args.get("workdir") == "wd"
+        assert await args.get("other") is None
+    assert load_one.call_count == 2
+
+
+async def test_config_not_found(tmp_path):
+    args = CommandArgs(["cmd", "--name", "x", f"@{tmp_path}/nonexist.toml"])
+    # not loaded if the argument is in the command
+    assert await args.get("name") == "x"
+    with pytest.raises(FileNotFoundError):
+        await args.get("outdir")
+
+
+async def test_replace():
+    command = ["cmd", "--a", "1", "--b=2", "--c"]
+    args = CommandArgs(command)
+    args.replace("a", "x")
+    args.replace("b", 3)
+    args.replace("c", "y")
+    args.replace("d", "z")
+    assert command == ["cmd", "--a", "x", "--b=3", "--c", "--c", "y", "--d", "z"]
+    assert await args.get("c") == "y"
+    assert await args.get("d") == "z"
+    args.replace("d", "w")
+    assert command[-2:] == ["--d", "w"]
+
+
+def test_daemon_command_args_follow_command():
+    daemon = CliGbatchDaemonPipeline({}, ["cmd", "--name", "x"])
+    assert daemon.command_args is daemon.command_args
+    daemon.command = ["cmd"]
+    assert daemon.command_args.command is daemon.command
@@ -277,6 +277,59 @@ async def test_get_xqute():
     assert isinstance(xqute, Xqute)
 
 
+async def test_get_xqute_raw_logs():
+    daemon = CliGbatchDaemonPlain(
+        {
+            "workdir": "gs://bucket/path/workdir",
+            "name": "TestRawLogs",
+            "raw_logs": True,
+        },
+        ["cmd"],
+    )
+    await daemon.prepare()
+    with patch("pipen_cli_gbatch.mixin.Xqute") as xqute_cls, patch(
+        "pipen_cli_gbatch.mixin.plugin.get_all_plugin_names", return_value=[]
+    ):
+        await daemon._get_xqute()
+
+    plugins = xqute_cls.call_args.kwargs["plugins"]
+    assert plugins[1].raw is True
+    assert "raw_logs" not in xqute_cls.call_args.kwargs["scheduler_opts"]
+
+
+async def test_stream(tmp_path):
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": "gs://bucket/path/workdir", "name": "Stream", "stream": True},
+        ["cmd"],
+    )
+    assert daemon.raw_logs
+    with patch("pipen_cli_gbatch.mixin.logger") as logger:
+        await daemon.setup()
+    logger.setLevel.assert_called_once_with("WARNING")
+    # the rich messages go to stderr
+    assert logger.addHandler.call_args.args[0].console.stderr
+
+    job = MagicMock(get_rc=AsyncMock(return_value=3))
+    with pytest.raises(SystemExit) as exc:
+        await daemon._exit_with_rc(job)
+    assert exc.value.code == 3
+
+    job.get_rc.return_value = -9
+    with pytest.raises(SystemExit) as exc:
+        await daemon._exit_with_rc(job)
+    assert exc.value.code == 1
+
+    daemon.config.stream = False
+    await daemon._exit_with_rc(job)
+
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": "gs://bucket/path/workdir", "stream": True, "nowait": True},
+        ["cmd"],
+    )
+    with pytest.raises(ValueError, match="--stream cannot be used"):
+        await daemon.prepare()
+
+
 async def test_run_no_command_error():
     daemon = CliGbatchDaemonPipeline({"nowait": True}, [])
     with pytest.raises(ValueError):
@@ -588,6 +641,26 @@ async def test_run_wait_job_is_running(tmp_path):
     m_run_nowait.assert_awaited_once_with(xqute)
 
 
+async def test_run_wait_stream_job_is_running(tmp_path):
+    daemon = CliGbatchDaemonPlain({"stream": True}, ["cmd"])
+    job = MagicMock()
+    job.get_jid = AsyncMock(return_value="jid-123")
+    xqute = MagicMock()
+    xqute.scheduler.workdir = PanPath(tmp_path)
+    xqute.scheduler.location = "us-central1"
+    xqute.scheduler.create_job = AsyncMock(return_value=job)
+    xqute.scheduler.job_is_running = AsyncMock(return_value=True)
+    xqute.feed = AsyncMock()
+    with (
+        patch.object(daemon, "_get_xqute", AsyncMock(return_value=xqute)),
+        patch.object(daemon, "_run_nowait", new_callable=AsyncMock) as m_run_nowait,
+    ):
+        with pytest.raises(ValueError, match="Job is already running: jid-123"):
+            await daemon._run_wait()
+    xqute.feed.assert_not_awaited()
+    m_run_nowait.assert_not_awaited()
+
+
 async def test_run_nowait_jid_refetch(tmp_path, caplog):
     daemon = CliGbatchDaemonPlain({"name": "MyName"}, ["cmd"])
     job = MagicMock()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from xqute.defaults import JobStatus
+from pipen_cli_gbatch import CliGbatchDaemonPlain
+from pipen_cli_gbatch.events import (
+    JobFinished,
+    JobStarted,
+    JobStatusChanged,
+    JobSubmitted,
+    LogChunk,
+)
+from pipen_cli_gbatch.plugins import XquteCliGbatchEventsPlugin
+
+
+def make_job(status=JobStatus.SUBMITTED, rc=0):
+    job = MagicMock()
+    job.get_jid = AsyncMock(return_value="jid-1")
+    job.get_status = AsyncMock(return_value=status)
+    job.get_rc = AsyncMock(return_value=rc)
+    return job
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+async def test_events_plugin(tmp_path):
+    queue = asyncio.Queue()
+    plugin = XquteCliGbatchEventsPlugin(queue)
+    scheduler = MagicMock(workdir=PanPath(tmp_path))
+    (tmp_path / "0").mkdir()
+    (tmp_path / "0" / "job.stdout").write_text("out1\nout2\nresidue")
+    (tmp_path / "0" / "job.stderr").write_text("err1\n")
+
+    job = make_job()
+    await plugin.on_job_submitted(scheduler, job)
+    await plugin.on_job_started(scheduler, job)
+    # let the background task pull the logs
+    await asyncio.sleep(0.1)
+    # the logs pulled are drained
+    await plugin.on_job_polling(scheduler, job, 1)
+    await plugin.on_job_polling(scheduler, job, 5)
+    await plugin.on_job_killing(scheduler, job)
+    await plugin.on_job_polling(scheduler, job, 6)
+    await plugin.on_job_killed(scheduler, job)
+
+    events = drain(queue)
+    assert [type(event) for event in events] == [
+        JobSubmitted,
+        JobStarted,
+        JobStatusChanged,
+        LogChunk,
+        LogChunk,
+        JobStatusChanged,
+        LogChunk,
+        JobStatusChanged,
+        JobFinished,
+    ]
+    assert events[0].jid == "jid-1"
+    assert events[2].status == "RUNNING"
+    assert events[3][:2] == ("STDOUT", ["out1", "out2"])
+    assert events[4][:2] == ("STDERR", ["err1"])
+    assert events[5].status == "KILLING"
+    assert events[6][:2] == ("STDOUT", ["residue"])
+    assert events[7].status == "KILLED"
+    finished = events[-1]
+    assert finished.status == "KILLED"
+    assert finished.rc == 0
+    assert finished.submitted_at == events[0].time
+    assert finished.elapsed == finished.time - events[1].time
+    # the status is given by the hooks, not queried while polling
+    job.get_status.assert_not_awaited()
+
+
+async def test_events_plugin_failed_before_started(tmp_path):
+    queue = asyncio.Queue()
+    plugin = XquteCliGbatchEventsPlugin(queue)
+    job = make_job(rc=1)
+    await plugin.on_job_failed(MagicMock(workdir=PanPath(tmp_path)), job)
+    changed, finished = drain(queue)
+    assert changed.status == "FAILED"
+    assert finished.status == "FAILED"
+    assert finished.rc == 1
+    assert finished.elapsed is None
+
+
+async def test_daemon_events(tmp_path):
+    daemon = CliGbatchDaemonPlain({}, ["echo", "1"])
+
+    async def run_wait(stdout_file=None):
+        assert daemon._events.maxsize == 2
+        await daemon._events.put(JobSubmitted("jid", 0.0))
+        await daemon._events.put(LogChunk("STDOUT", ["1"], 1.0))
+        await daemon._events.put(JobFinished("SUCCEEDED", 0, 0.0, 0.5, 2.0))
+
+    with (
+        patch.object(daemon, "prepare", AsyncMock()),
+        patch.object(daemon, "_run_wait", run_wait),
+    ):
+        events = [event async for event in daemon.events(maxsize=2)]
+
+    assert [type(event) for event in events] == [JobSubmitted, LogChunk, JobFinished]
+    assert daemon._events is None
+
+
+async def test_daemon_events_error_and_break():
+    daemon = CliGbatchDaemonPlain({}, ["echo", "1"])
+
+    async def failed_run_wait(stdout_file=None):
+        await daemon._events.put(JobSubmitted("jid", 0.0))
+        raise RuntimeError("submission failed")
+
+    with (
+        patch.object(daemon, "prepare", AsyncMock()),
+        patch.object(daemon, "_run_wait", failed_run_wait),
+    ):
+        with pytest.raises(RuntimeError, match="submission failed"):
+            async for _ in daemon.events():
+                pass
+
+    cancelled = asyncio.Event()
+
+    async def endless_run_wait(stdout_file=None):
+        try:
+            while True:
+                await daemon._events.put(LogChunk("STDOUT", ["x"], 0.0))
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with (
+        patch.object(daemon, "prepare", AsyncMock()),
+        patch.object(daemon, "_run_wait", endless_run_wait),
+    ):
+        events = daemon.events(maxsize=1)
+        async for _ in events:
+            break
+        await events.aclose()
+
+    assert cancelled.is_set()
+
+
+async def test_get_xqute_with_events():
+    daemon = CliGbatchDaemonPlain(
+        {
+            "workdir": "gs://bucket/path/workdir",
+            "project": "my-gcp-project",
+            "location": "us-central1",
+        },
+        ["echo", "1"],
+    )
+    await daemon.prepare()
+    daemon._events = asyncio.Queue()
+    with patch("pipen_cli_gbatch.mixin.Xqute") as xqute_cls:
+        await daemon._get_xqute()
+
+    plugins = xqute_cls.call_args.kwargs["plugins"]
+    assert plugins[0] == "-xqute.pipen"
+    # the events plugin replaces the logging one
+    assert [type(plg) for plg in plugins[1:]] == [XquteCliGbatchEventsPlugin]
+    assert plugins[1].queue is daemon._events
+
+
+async def test_run_nowait_with_events(caplog):
+    daemon = CliGbatchDaemonPlain({"name": "Job"}, ["echo", "1"])
+    daemon._events = asyncio.Queue()
+    xqute = MagicMock(plugin_context=None)
+    with patch.object(daemon, "_submit", AsyncMock(return_value=("jid", False))):
+        await daemon._run_nowait(xqute)
+
+    (submitted,) = drain(daemon._events)
+    assert submitted.jid == "jid"
+    assert submitted.running
+    # the events are all the output
+    assert not caplog.records
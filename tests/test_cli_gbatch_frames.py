@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import struct
+import subprocess
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from panpath import PanPath
+from pipen_cli_gbatch import CliGbatchDaemonPlain
+from pipen_cli_gbatch.frames import (
+    FRAMER_INIT,
+    INDEX_HEAD,
+    INDEX_SIZE,
+    INDEX_TAIL,
+    FrameTailer,
+    iter_frames,
+    parse_index,
+    render_framer_prep,
+)
+from pipen_cli_gbatch.logs import offset_state_file, read_range
+from pipen_cli_gbatch.plugins import (
+    XquteCliGbatchFramesPlugin,
+    XquteCliGbatchPlugin,
+)
+
+
+def frames(*texts: bytes) -> bytes:
+    return b"".join(gzip.compress(text) for text in texts)
+
+
+def indexed_frames(*texts: bytes) -> bytes:
+    out = []
+    for text in texts:
+        frame = gzip.compress(text)
+        out.append(frame + INDEX_HEAD + struct.pack("<Q", len(frame)) + INDEX_TAIL)
+    return b"".join(out)
+
+
+def test_parse_index():
+    data = indexed_frames(b"a\n")
+    assert len(data) == len(gzip.compress(b"a\n")) + INDEX_SIZE
+    assert parse_index(data[-INDEX_SIZE:]) == len(data) - INDEX_SIZE
+    assert parse_index(data[-INDEX_SIZE - 1:-1]) is None
+    assert parse_index(b"") is None
+    # the indexes are empty gzip members
+    assert gzip.decompress(data + indexed_frames(b"b")) == b"a\nb"
+    assert [text for _, text in iter_frames(data)] == [b"a\n", b""]
+
+
+def test_iter_frames():
+    data = frames(b"a\n", b"b\nc")
+    first = len(frames(b"a\n"))
+    assert list(iter_frames(data)) == [(first, b"a\n"), (len(data), b"b\nc")]
+    # the incomplete last frame is not yielded
+    assert list(iter_frames(data[:-3])) == [(first, b"a\n")]
+    assert list(iter_frames(b"")) == []
+
+
+async def test_frame_tailer(tmp_path):
+    logfile = tmp_path / "job.stdout.gz"
+    logfile.write_bytes(frames(b"line1\nline2\npart"))
+    tailer = FrameTailer(
+        logfile=PanPath(logfile),
+        state_file=PanPath(tmp_path / "job.stdout.gz.offset"),
+    )
+    assert await tailer.populate() == ["line1", "line2"]
+    assert tailer.residue == b"part"
+    # resumed from the frame of the residue
+    assert tailer.consumed == 0
+
+    # a frame being written is read again with the next pull
+    complete = frames(b"ial\nline3\n")
+    with logfile.open("ab") as fh:
+        fh.write(complete[:-5])
+    assert await tailer.populate() == []
+    with logfile.open("ab") as fh:
+        fh.write(complete[-5:])
+    assert await tailer.populate() == ["partial", "line3"]
+    assert tailer.consumed == logfile.stat().st_size
+
+    # resumed from the persisted offset
+    tailer = FrameTailer(
+        logfile=PanPath(logfile),
+        state_file=PanPath(tmp_path / "job.stdout.gz.offset"),
+    )
+    with logfile.open("ab") as fh:
+        fh.write(frames(b"line4\n"))
+    assert await tailer.populate() == ["line4"]
+
+
+async def test_frame_tailer_seek_tail(tmp_path):
+    logfile = tmp_path / "job.stdout.gz"
+    logfile.write_bytes(frames(b"line1\nline2\n", b"line3\nline4\n", b"line5\n"))
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    await tailer.seek_tail(3)
+    assert await tailer.populate() == ["line3", "line4", "line5"]
+
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    await tailer.seek_tail(2)
+    assert await tailer.populate() == ["line4", "line5"]
+
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    await tailer.seek_tail(0)
+    assert await tailer.populate() == []
+
+
+@pytest.mark.parametrize("compose", [frames, indexed_frames])
+async def test_frame_tailer_seek_tail_indexed(tmp_path, compose):
+    logfile = tmp_path / "job.stdout.gz"
+    lines = [os.urandom(32).hex().encode() for _ in range(100)]
+    logfile.write_bytes(compose(*(line + b"\n" for line in lines)) + b"\x1f\x8b")
+    reads = []
+
+    async def read(path, start, end):
+        reads.append((start, end))
+        return await read_range(path, start, end)
+
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    with patch("pipen_cli_gbatch.frames.read_range", read), patch(
+        "pipen_cli_gbatch.frames.TAIL_CHUNK_SIZE", 256
+    ):
+        await tailer.seek_tail(3)
+    assert await tailer.populate() == [line.decode() for line in lines[-3:]]
+    # the file not ending with an index is read as a whole
+    assert reads[-1] == (0, logfile.stat().st_size)
+
+    logfile.write_bytes(compose(*(line + b"\n" for line in lines)))
+    reads.clear()
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    with patch("pipen_cli_gbatch.frames.read_range", read), patch(
+        "pipen_cli_gbatch.frames.TAIL_CHUNK_SIZE", 256
+    ):
+        await tailer.seek_tail(3)
+    assert await tailer.populate() == [line.decode() for line in lines[-3:]]
+    if compose is indexed_frames:
+        # only the last frames are read, backwards
+        assert 0 < min(start for start, _ in reads)
+        assert sum(end - start for start, end in reads) < 1024
+    else:
+        assert reads[-1] == (0, logfile.stat().st_size)
+
+
+async def test_frame_tailer_seek_since_indexed(tmp_path):
+    now = datetime.now()
+    logfile = tmp_path / "job.stdout.gz"
+    lines = [
+        (now - timedelta(minutes=m)).strftime("%m-%d %H:%M:%S").encode()
+        + b" I core    line " + str(i).encode()
+        for i, m in enumerate(range(100, 0, -1))
+    ]
+    logfile.write_bytes(
+        indexed_frames(*(line + b"\n  continued\n" for line in lines))
+    )
+    reads = []
+
+    async def read(path, start, end):
+        reads.append((start, end))
+        return await read_range(path, start, end)
+
+    tailer = FrameTailer(logfile=PanPath(logfile))
+    with patch("pipen_cli_gbatch.frames.read_range", read), patch(
+        "pipen_cli_gbatch.frames.TAIL_CHUNK_SIZE", 256
+    ):
+        await tailer.seek_since(now - timedelta(minutes=2, seconds=30))
+    assert await tailer.populate() == [
+        lines[-2].decode(),
+        "  continued",
+        lines[-1].decode(),
+        "  continued",
+    ]
+    assert 0 < min(start for start, _ in reads)
+
+
+@pytest.mark.skipif(
+    not shutil.which("bash") or not shutil.which("python3"),
+    reason="bash and python3 are required",
+)
+def test_framer_script(tmp_path):
+    stdout = str(tmp_path / "job.stdout")
+    stderr = str(tmp_path / "job.stderr")
+    script = tmp_path / "job.wrapped.sh"
+    script.write_text(
+        "set -u -E -o pipefail\n"
+        + FRAMER_INIT
+        + "cmd=\"bash -c 'echo out1; echo err1 >&2; echo out2; printf out3; exit 3'"
+        + f' 1>{stdout} 2>{stderr}"\n'
+        + render_framer_prep(stdout, stderr)
+        + 'eval "$cmd"\n'
+    )
+    proc = subprocess.run(["bash", str(script)])
+    assert proc.returncode == 3
+    out = (tmp_path / "job.stdout.gz").read_bytes()
+    assert b"".join(text for _, text in iter_frames(out)) == b"out1\nout2\nout3"
+    assert parse_index(out[-INDEX_SIZE:]) is not None
+    assert gzip.decompress((tmp_path / "job.stderr.gz").read_bytes()) == b"err1\n"
+    assert not (tmp_path / "job.stdout").exists()
+
+
+def test_frames_plugin_registered_schedulers():
+    job = MagicMock()
+    job.stdout_file.mounted = "/mnt/disks/workdir/0/job.stdout"
+    job.stderr_file.mounted = "/mnt/disks/workdir/0/job.stderr"
+    plugin = XquteCliGbatchFramesPlugin()
+    assert plugin.on_jobcmd_init("sched", job) == FRAMER_INIT
+    assert "job.stdout.gz" in plugin.on_jobcmd_prep("sched", job)
+
+    plugin = XquteCliGbatchFramesPlugin(schedulers=set())
+    plugin.register("sched1")
+    assert plugin.on_jobcmd_init("sched1", job) == FRAMER_INIT
+    assert plugin.on_jobcmd_init("sched2", job) is None
+    assert plugin.on_jobcmd_prep("sched2", job) is None
+
+
+async def test_plugin_pulls_frames(tmp_path, caplog):
+    plugin = XquteCliGbatchPlugin(compressed=True)
+    scheduler = MagicMock()
+    scheduler.workdir = PanPath(tmp_path / "Daemon")
+    metadir = tmp_path / "Daemon" / "0"
+    metadir.mkdir(parents=True)
+    (metadir / "job.stdout").write_text("")
+    (metadir / "job.stderr").write_text("!! Job killed\n")
+    (metadir / "job.stdout.gz").write_bytes(frames(b"out1\n", b"out2\n"))
+    with patch.object(plugin, "_start_tailer"):
+        await plugin.on_job_started(scheduler, MagicMock())
+    assert sorted(plugin._poll_keys.values()) == [
+        "Daemon/job.stderr",
+        "Daemon/job.stderr.gz",
+        "Daemon/job.stdout",
+        "Daemon/job.stdout.gz",
+    ]
+    assert await plugin._pull() == [
+        ("STDERR", ["!! Job killed"]),
+        ("STDOUT", ["out1", "out2"]),
+    ]
+
+
+async def test_get_xqute_compress_logs(tmp_path):
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": "gs://bucket/workdir", "name": "MyName", "compress_logs": True},
+        ["cmd"],
+    )
+    with patch("pipen_cli_gbatch.mixin.Xqute") as xqute, patch(
+        "pipen_cli_gbatch.mixin.plugin.get_all_plugin_names", return_value=[]
+    ):
+        await daemon._get_xqute()
+    plugins = xqute.call_args.kwargs["plugins"]
+    assert any(isinstance(p, XquteCliGbatchFramesPlugin) for p in plugins)
+    logging = next(p for p in plugins if isinstance(p, XquteCliGbatchPlugin))
+    assert logging.stdout_frames is not None
+    assert "compress_logs" not in daemon._scheduler_opts()
+
+
+async def test_view_logs_frames(tmp_path, capsys):
+    metadir = tmp_path / "MyName" / "0"
+    metadir.mkdir(parents=True)
+    (metadir / "job.stdout").write_text("")
+    (metadir / "job.stdout.gz").write_bytes(frames(b"line1\nline2\n", b"line3\n"))
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": str(tmp_path), "name": "MyName", "view_logs": "all", "tail": 2},
+        ["cmd"],
+    )
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert [line for line in out.splitlines() if line.startswith("/STD")] == [
+        "/STDOUT line2",
+        "/STDOUT line3",
+    ]
+    assert offset_state_file(PanPath(metadir / "job.stdout.gz")).exists()
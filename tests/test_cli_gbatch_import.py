@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+# The modules not to be imported with the entry point of the plugin
+HEAVY_MODULES = (
+    "pipen_cli_gbatch.plugins",
+    "pipen_cli_gbatch.daemons",
+    "pipen_cli_gbatch.mixin",
+    "pipen_cli_gbatch.submit",
+    "pipen_cli_gbatch.logs",
+    "pipen_cli_gbatch.argspec",
+    "pipen_cli_gbatch._daemon_args",
+    "pipen_args",
+    "pipen_poplog",
+    "rich.console",
+    "panpath.gs_path",
+    "slugify",
+)
+
+
+def _imported_by_entry_point() -> list[str]:
+    """The modules imported by the plugin, besides the ones by `pipen.cli`."""
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import pipen.cli; import pipen_cli_gbatch",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    names = [
+        line.rpartition("|")[2].strip()
+        for line in proc.stderr.splitlines()
+        if line.startswith("import time:") and line.count("|") == 2
+    ]
+    # the children are reported before their parents
+    return names[names.index("pipen.cli") + 1:names.index("pipen_cli_gbatch") + 1]
+
+
+def test_entry_point_imports_no_heavy_modules():
+    imported = _imported_by_entry_point()
+    assert "pipen_cli_gbatch.cli" in imported
+    for module in HEAVY_MODULES:
+        assert not any(
+            name == module or name.startswith(f"{module}.") for name in imported
+        ), f"{module} is imported with the entry point"
+
+
+def test_lazy_attributes():
+    import pipen_cli_gbatch
+    from pipen_cli_gbatch.daemons import CliGbatchDaemonPlain
+    from pipen_cli_gbatch.plugins import CliGbatchPlugin
+
+    assert pipen_cli_gbatch.CliGbatchDaemonPlain is CliGbatchDaemonPlain
+    assert pipen_cli_gbatch.CliGbatchPlugin is CliGbatchPlugin
+    assert callable(pipen_cli_gbatch.submit_many)
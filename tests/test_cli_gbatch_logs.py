@@ -0,0 +1,629 @@
+from __future__ import annotations
+
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from pipen_cli_gbatch import CliGbatchDaemonPlain
+from pipen_cli_gbatch.logs import (
+    LineCompactor,
+    LineFilter,
+    LogObjectPoller,
+    LogTailer,
+    collapse_cr,
+    ObjectStat,
+    gs_session,
+    gs_storage,
+    iter_lines_backward,
+    list_logs,
+    offset_state_file,
+    parse_duration,
+    parse_log_time,
+    read_range,
+    since_offset,
+    stat_object,
+    tail_offset,
+    write_lines,
+)
+
+
+class NotFound(Exception):
+    status = 404
+
+
+@pytest.fixture
+def storage():
+    storage = MagicMock()
+    with patch(
+        "pipen_cli_gbatch.logs.gs_storage", AsyncMock(return_value=storage)
+    ):
+        yield storage
+
+
+async def test_stat_and_read_local(tmp_path):
+    logfile = PanPath(tmp_path / "job.stdout")
+    assert await stat_object(logfile) is None
+    logfile.write_text("0123456789")
+    assert await stat_object(logfile) == ObjectStat(10, None)
+    assert await read_range(logfile, 3, 7) == b"3456"
+    assert await read_range(logfile, 7, 7) == b""
+
+
+async def test_gs_session():
+    clients = []
+
+    def new_client():
+        client = MagicMock()
+        client.close = AsyncMock()
+        clients.append(client)
+        return client
+
+    with patch("gcloud.aio.storage.Storage", side_effect=new_client):
+        async with gs_session():
+            storage = await gs_storage()
+            assert await gs_storage() is storage
+            async with gs_session():
+                assert await gs_storage() is storage
+            # still used by the outer block
+            storage.close.assert_not_awaited()
+        storage.close.assert_awaited_once()
+
+        # a new client for the next session
+        async with gs_session():
+            assert await gs_storage() is not storage
+        # no client created, nothing to close
+        async with gs_session():
+            pass
+    assert len(clients) == 2
+    clients[1].close.assert_awaited_once()
+
+
+async def test_stat_and_read_gs(storage):
+    logfile = PanPath("gs://bucket/workdir/0/job.stdout")
+    storage.download_metadata = AsyncMock(
+        return_value={"size": "10", "generation": "123"}
+    )
+    storage.download = AsyncMock(return_value=b"3456")
+    assert await stat_object(logfile) == ObjectStat(10, "123")
+    storage.download_metadata.assert_awaited_once_with("bucket", "workdir/0/job.stdout")
+    assert await read_range(logfile, 3, 7) == b"3456"
+    storage.download.assert_awaited_once_with(
+        "bucket", "workdir/0/job.stdout", headers={"Range": "bytes=3-6"}
+    )
+
+    storage.download_metadata = AsyncMock(side_effect=NotFound())
+    assert await stat_object(logfile) is None
+    storage.download_metadata = AsyncMock(side_effect=RuntimeError())
+    with pytest.raises(RuntimeError):
+        await stat_object(logfile)
+
+
+async def test_tailer_gs_reads_new_bytes_only(storage):
+    content = b"line1\nline2\npart"
+    storage.download_metadata = AsyncMock(
+        return_value={"size": str(len(content)), "generation": "1"}
+    )
+
+    async def download(bucket, blob, headers):
+        start, end = headers["Range"][6:].split("-")
+        return content[int(start):int(end) + 1]
+
+    storage.download = AsyncMock(side_effect=download)
+    tailer = LogTailer("gs://bucket/workdir/0/job.stdout")
+    assert await tailer.populate() == ["line1", "line2"]
+    assert tailer.residue == b"part"
+
+    # unchanged generation, nothing is downloaded
+    assert await tailer.populate() == []
+    assert storage.download.await_count == 1
+
+    content += b"ial\n"
+    storage.download_metadata.return_value = {
+        "size": str(len(content)),
+        "generation": "2",
+    }
+    assert await tailer.populate() == ["partial"]
+    assert storage.download.await_args.kwargs["headers"] == {"Range": "bytes=16-19"}
+
+
+async def test_tailer_local(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    tailer = LogTailer(str(logfile))
+    assert await tailer.populate() == []
+
+    logfile.write_text("a\nb")
+    assert await tailer.populate() == ["a"]
+    assert tailer.residue == b"b"
+    assert await tailer.populate() == []
+
+    with logfile.open("a") as fh:
+        fh.write("c\nd\n")
+    assert await tailer.populate() == ["bc", "d"]
+    assert tailer.offset == 7
+
+    # rewritten with a smaller size
+    logfile.write_text("x\n")
+    assert await tailer.populate() == ["x"]
+
+
+async def test_tailer_persisted_offset(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    state_file = tmp_path / "job.stdout.offset"
+    logfile.write_text("a\nb\npart")
+    tailer = LogTailer(str(logfile), state_file=str(state_file))
+    assert await tailer.populate() == ["a", "b"]
+    state = json.loads(state_file.read_text())
+    # the incomplete line is not consumed
+    assert state["offset"] == 4
+    assert bytes.fromhex(state["head"]) == b"a\nb\npart"
+
+    # reattach and resume
+    with logfile.open("a") as fh:
+        fh.write("ial\nc\n")
+    tailer = LogTailer(str(logfile), state_file=str(state_file))
+    assert await tailer.populate() == ["partial", "c"]
+
+    # the file is rewritten and grows beyond the offset
+    logfile.write_text("new1\nnew2\nnew3\nnew4\n")
+    tailer = LogTailer(str(logfile), state_file=str(state_file))
+    assert await tailer.populate() == ["new1", "new2", "new3", "new4"]
+
+    # state of another log file is ignored
+    tailer = LogTailer(str(tmp_path / "other"), state_file=str(state_file))
+    (tmp_path / "other").write_text("o\n")
+    assert await tailer.populate() == ["o"]
+
+
+async def test_tailer_state_not_writable(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    logfile.write_text("a\nb\n")
+    # the parent of the state file is a file
+    (tmp_path / "readonly").write_text("")
+    state_file = tmp_path / "readonly" / "job.stdout.offset"
+    tailer = LogTailer(str(logfile), state_file=state_file)
+    assert await tailer.populate() == ["a", "b"]
+    await tailer.destroy()
+    assert not state_file.exists()
+
+
+def test_offset_state_file(offset_state_dir):
+    state_file = offset_state_file("gs://bucket/wd/Job/0/job.stdout")
+    assert state_file.parent == offset_state_dir
+    assert state_file == offset_state_file(PanPath("gs://bucket/wd/Job/0/job.stdout"))
+    assert state_file != offset_state_file("gs://bucket/wd/Job/0/job.stderr")
+
+
+async def test_view_logs_resumes(tmp_path, capsys):
+    metadir = tmp_path / "MyName" / "0"
+    metadir.mkdir(parents=True)
+    (metadir / "job.stdout").write_text("old-line\n")
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": str(tmp_path), "name": "MyName", "view_logs": "stdout"},
+        ["cmd"],
+    )
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt) as sleep:
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    assert "old-line" in capsys.readouterr().out
+    # new lines pulled, poll fast
+    sleep.assert_called_once_with(0.5)
+    # the offsets are persisted locally, not in the workdir
+    assert not (metadir / "job.stdout.offset").exists()
+    assert offset_state_file(PanPath(metadir / "job.stdout")).exists()
+
+    with (metadir / "job.stdout").open("a") as fh:
+        fh.write("new-line\n")
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert "new-line" in out
+    assert "old-line" not in out
+
+
+@pytest.mark.parametrize("content", ["", "a\nbb\n\nccc\n", "a\nbb\n\nccc"])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 100])
+async def test_iter_lines_backward(tmp_path, content, chunk_size):
+    logfile = PanPath(tmp_path / "job.stdout")
+    logfile.write_text(content)
+    lines = [
+        item
+        async for item in iter_lines_backward(logfile, len(content), chunk_size)
+    ]
+    expected = []
+    offset = 0
+    for line in content.split("\n"):
+        expected.append((offset, line.encode()))
+        offset += len(line) + 1
+    if content.endswith("\n") or not content:
+        expected.pop()
+    assert lines == expected[::-1]
+
+
+async def test_tail_offset(tmp_path):
+    logfile = PanPath(tmp_path / "job.stdout")
+    content = "".join(f"line{i}\n" for i in range(1000))
+    logfile.write_text(content)
+    size = len(content)
+    assert await tail_offset(logfile, size, 0) == size
+    assert content[await tail_offset(logfile, size, 2):] == "line998\nline999\n"
+    assert await tail_offset(logfile, size, 5000) == 0
+
+
+async def test_tail_offset_reads_only_the_end(storage):
+    content = b"".join(b"line%d\n" % i for i in range(100_000))
+    ranges = []
+
+    async def download(bucket, blob, headers):
+        ranges.append(headers["Range"])
+        start, end = headers["Range"][6:].split("-")
+        return content[int(start):int(end) + 1]
+
+    storage.download = AsyncMock(side_effect=download)
+    logfile = PanPath("gs://bucket/workdir/0/job.stdout")
+    offset = await tail_offset(logfile, len(content), 10)
+    assert content[offset:].splitlines()[0] == b"line99990"
+    assert len(ranges) == 1
+
+
+def test_parse_duration():
+    assert parse_duration("90s") == timedelta(seconds=90)
+    assert parse_duration("1h30m") == timedelta(hours=1, minutes=30)
+    assert parse_duration("2d") == timedelta(days=2)
+    assert parse_duration("0.5h") == timedelta(minutes=30)
+    for invalid in ("", "10", "10x", "1h 30m", "h"):
+        with pytest.raises(ValueError):
+            parse_duration(invalid)
+
+
+def test_parse_log_time():
+    now = datetime(2024, 1, 1, 0, 10, 0)
+    assert parse_log_time(b"01-01 00:05:00 I core  hello", now) == datetime(
+        2024, 1, 1, 0, 5, 0
+    )
+    assert parse_log_time(b"[01-01 00:05:00] I core  hello", now) == datetime(
+        2024, 1, 1, 0, 5, 0
+    )
+    # logged last year
+    assert parse_log_time(b"12-31 23:55:00 I core  hello", now) == datetime(
+        2023, 12, 31, 23, 55, 0
+    )
+    assert parse_log_time(b"Traceback (most recent call last):", now) is None
+
+
+async def test_since_offset(tmp_path):
+    logfile = PanPath(tmp_path / "job.stdout")
+    now = datetime.now()
+    lines = [
+        f"{(now - timedelta(minutes=m)).strftime('%m-%d %H:%M:%S')} I core  {m}m ago"
+        for m in (60, 30, 5)
+    ]
+    lines.insert(2, "  no timestamp")
+    content = "\n".join(lines) + "\n"
+    logfile.write_text(content)
+    size = len(content)
+
+    offset = await since_offset(logfile, size, now - timedelta(minutes=10))
+    assert content[offset:].splitlines() == [lines[-1]]
+    offset = await since_offset(logfile, size, now - timedelta(minutes=45))
+    assert content[offset:].splitlines() == lines[1:]
+    offset = await since_offset(logfile, size, now - timedelta(hours=2))
+    assert offset == 0
+
+
+async def test_tailer_seek_tail(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    state_file = tmp_path / "job.stdout.offset"
+    logfile.write_text("a\nb\nc\nd\n")
+    state_file.write_text(
+        json.dumps({"logfile": str(logfile), "offset": 2, "head": b"a\n".hex()})
+    )
+    tailer = LogTailer(str(logfile), state_file=str(state_file))
+    await tailer.seek_tail(2)
+    assert await tailer.populate() == ["c", "d"]
+    with logfile.open("a") as fh:
+        fh.write("e\n")
+    assert await tailer.populate() == ["e"]
+
+    tailer = LogTailer(str(tmp_path / "nonexist"))
+    await tailer.seek_tail(2)
+    assert await tailer.populate() == []
+
+
+async def test_view_logs_tail_since(tmp_path, capsys):
+    metadir = tmp_path / "MyName" / "0"
+    metadir.mkdir(parents=True)
+    (metadir / "job.stdout").write_text("".join(f"line{i}\n" for i in range(10)))
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": str(tmp_path), "name": "MyName", "view_logs": "stdout", "tail": 2},
+        ["cmd"],
+    )
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert "line8" in out
+    assert "line9" in out
+    assert "line7" not in out
+
+    daemon.config.tail = None
+    daemon.config.since = "1x"
+    with pytest.raises(ValueError, match="Invalid duration"):
+        await daemon._run_view_logs()
+
+    daemon.config.tail = 1
+    daemon.config.since = "1m"
+    with pytest.raises(ValueError, match="cannot be used together"):
+        await daemon._run_view_logs()
+
+
+def test_write_lines():
+    raw = io.BytesIO()
+    file = io.TextIOWrapper(raw, encoding="utf-8")
+    file.write("before\n")
+    write_lines(["a", "ü"], file, prefix="/STDOUT ")
+    write_lines([], file)
+    assert raw.getvalue() == "before\n/STDOUT a\n/STDOUT ü\n".encode()
+
+    # no binary buffer
+    file = io.StringIO()
+    write_lines(["a", "b"], file)
+    assert file.getvalue() == "a\nb\n"
+
+
+def test_collapse_cr():
+    assert collapse_cr(b"plain") == b"plain"
+    assert collapse_cr(b" 10%\r 50%\r100%") == b"100%"
+    assert collapse_cr(b"crlf\r") == b"crlf"
+    assert collapse_cr(b"") == b""
+
+
+def test_line_compactor():
+    compactor = LineCompactor()
+    assert compactor.compact([b"a", b"a", b"a", b"", b"", b"b", b"b"]) == [
+        b"a",
+        b"... (the line above repeated 2 more times)",
+        b"",
+        b"",
+        b"b",
+        b"... (the line above repeated 1 more time)",
+    ]
+    # the run continues across pulls, reported once per pull
+    assert compactor.compact([b"b", b"b"]) == [
+        b"... (the line above repeated 2 more times)"
+    ]
+    assert compactor.compact([b"x\rb", b"c"]) == [
+        b"... (the line above repeated 1 more time)",
+        b"c",
+    ]
+
+    compactor = LineCompactor(collapse_repeats=False)
+    assert compactor.compact([b"a", b"1\r2", b"a\ra"]) == [b"a", b"2", b"a"]
+
+
+async def test_tailer_compacts_progress_bars(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    logfile.write_bytes(b"start\r\n 10%\r 50%\r100%\nepoch\nepoch\n 1%\r 2%")
+    tailer = LogTailer(str(logfile))
+    assert await tailer.populate() == [
+        "start",
+        "100%",
+        "epoch",
+        "... (the line above repeated 1 more time)",
+    ]
+    assert tailer.residue_lines() == [" 2%"]
+
+
+def test_line_filter():
+    lines = [b"INFO start", b"ERROR bad", b"WARNING meh", b"ERROR ignore me"]
+    assert LineFilter("ERROR").filter(lines) == [b"ERROR bad", b"ERROR ignore me"]
+    assert LineFilter(grep_v="^INFO").filter(lines) == lines[1:]
+    assert LineFilter("ERROR|WARN", "ignore").filter(lines) == lines[1:3]
+
+
+async def test_tailer_filters_across_pulls(tmp_path):
+    logfile = tmp_path / "job.stdout"
+    logfile.write_text("keep 1\ndrop\nke")
+    tailer = LogTailer(str(logfile), line_filter=LineFilter("keep"))
+    assert await tailer.populate() == ["keep 1"]
+    with logfile.open("a") as fh:
+        # the line split across the pulls is matched as a whole
+        fh.write("ep 2\nprogress 1%\rkeep 3\nkee")
+    assert await tailer.populate() == ["keep 2", "keep 3"]
+    assert tailer.residue_lines() == []
+
+
+async def test_view_logs_grep(tmp_path, capsys):
+    metadir = tmp_path / "MyName" / "0"
+    metadir.mkdir(parents=True)
+    (metadir / "job.stdout").write_text("a1\nb1\na2\n")
+    daemon = CliGbatchDaemonPlain(
+        {
+            "workdir": str(tmp_path),
+            "name": "MyName",
+            "view_logs": "stdout",
+            "grep": "^a",
+            "grep_v": "2",
+        },
+        ["cmd"],
+    )
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert "a1" in out
+    assert "b1" not in out
+    assert "a2" not in out
+
+    daemon.config.grep = "("
+    with pytest.raises(ValueError, match="Invalid pattern"):
+        daemon.line_filter()
+
+
+async def test_list_logs_local(tmp_path):
+    for name in ("sweep-1", "sweep-2", "other"):
+        (tmp_path / name / "0").mkdir(parents=True)
+        (tmp_path / name / "0" / "job.stdout").write_text(name)
+    (tmp_path / "sweep-1" / "0" / "job.stderr").write_text("err")
+
+    listed = await list_logs(PanPath(tmp_path), "sweep-*", ["job.stdout", "job.stderr"])
+    assert sorted(listed) == [
+        "sweep-1/job.stderr",
+        "sweep-1/job.stdout",
+        "sweep-2/job.stdout",
+    ]
+    path, stat = listed["sweep-2/job.stdout"]
+    assert str(path) == str(tmp_path / "sweep-2" / "0" / "job.stdout")
+    assert stat == ObjectStat(7)
+
+
+async def test_list_logs_gs(storage):
+    pages = [
+        {
+            "items": [
+                {"name": "wd/sweep-1/0/job.stdout", "size": "3", "generation": "1"},
+                {"name": "wd/sweep-1/1/job.stdout", "size": "3", "generation": "1"},
+            ],
+            "nextPageToken": "token",
+        },
+        {
+            "items": [
+                {"name": "wd/sweep-2/0/job.stderr", "size": "5", "generation": "2"},
+                {"name": "wd/other/0/job.stdout", "size": "5", "generation": "2"},
+            ]
+        },
+    ]
+    calls = []
+
+    async def list_objects(bucket, params):
+        calls.append(dict(params))
+        return pages[len(calls) - 1]
+
+    storage.list_objects = AsyncMock(side_effect=list_objects)
+    listed = await list_logs(
+        PanPath("gs://bucket/wd"), "sweep-*", ["job.stdout", "job.stderr"]
+    )
+    assert listed == {
+        "sweep-1/job.stdout": (
+            PanPath("gs://bucket/wd/sweep-1/0/job.stdout"),
+            ObjectStat(3, "1"),
+        ),
+        "sweep-2/job.stderr": (
+            PanPath("gs://bucket/wd/sweep-2/0/job.stderr"),
+            ObjectStat(5, "2"),
+        ),
+    }
+    assert calls == [
+        {
+            "prefix": "wd/sweep-",
+            "matchGlob": "wd/sweep-*/0/{job.stdout,job.stderr}",
+        },
+        {
+            "prefix": "wd/sweep-",
+            "matchGlob": "wd/sweep-*/0/{job.stdout,job.stderr}",
+            "pageToken": "token",
+        },
+    ]
+
+
+async def test_view_logs_multiplexed(tmp_path, capsys):
+    for name in ("sweep-1", "sweep-2", "other"):
+        (tmp_path / name / "0").mkdir(parents=True)
+        (tmp_path / name / "0" / "job.stdout").write_text(f"out of {name}\n")
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": str(tmp_path), "name": "sweep-*", "view_logs": "stdout"},
+        ["cmd"],
+    )
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert "[sweep-1] out of sweep-1" in out
+    assert "[sweep-2] out of sweep-2" in out
+    assert "other" not in out
+    # offsets are persisted per daemon
+    logfile = PanPath(tmp_path / "sweep-1" / "0" / "job.stdout")
+    assert offset_state_file(logfile).exists()
+
+    daemon.config.view_logs = "all"
+    (tmp_path / "sweep-2" / "0" / "job.stderr").write_text("err\n")
+    with patch("asyncio.sleep", side_effect=KeyboardInterrupt):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+    out = capsys.readouterr().out
+    assert "[sweep-2] /STDERR err" in out
+    assert "out of" not in out
+
+
+async def test_log_object_poller(tmp_path):
+    for name in ("sweep-1", "sweep-2"):
+        (tmp_path / name / "0").mkdir(parents=True)
+        (tmp_path / name / "0" / "job.stdout").write_text("a")
+    poller = LogObjectPoller(str(tmp_path), "sweep-*", ["job.stdout", "job.stderr"])
+    assert sorted(await poller.poll()) == ["sweep-1/job.stdout", "sweep-2/job.stdout"]
+    assert await poller.poll() == {}
+
+    (tmp_path / "sweep-2" / "0" / "job.stdout").write_text("ab")
+    (tmp_path / "sweep-1" / "0" / "job.stderr").write_text("e")
+    changed = await poller.poll()
+    assert sorted(changed) == ["sweep-1/job.stderr", "sweep-2/job.stdout"]
+    assert changed["sweep-2/job.stdout"][1] == ObjectStat(2)
+    assert len(poller.table) == 3
+
+
+async def test_view_logs_reads_changed_only(storage, capsys):
+    generations = {"a": "1", "b": "1"}
+    contents = {"a": b"a1\n", "b": b"b1\n"}
+
+    async def list_objects(bucket, params):
+        return {
+            "items": [
+                {
+                    "name": f"wd/sweep-{key}/0/job.stdout",
+                    "size": str(len(contents[key])),
+                    "generation": generations[key],
+                }
+                for key in contents
+            ]
+        }
+
+    async def download(bucket, blob, headers):
+        start, end = headers["Range"][6:].split("-")
+        return contents[blob.split("/")[1][-1]][int(start):int(end) + 1]
+
+    storage.list_objects = AsyncMock(side_effect=list_objects)
+    storage.download = AsyncMock(side_effect=download)
+    # no offset states
+    storage.download_metadata = AsyncMock(side_effect=NotFound())
+    daemon = CliGbatchDaemonPlain(
+        {"workdir": "gs://bucket/wd", "name": "sweep-*", "view_logs": "stdout"},
+        ["cmd"],
+    )
+
+    ticks = 0
+
+    async def sleep(_):
+        nonlocal ticks
+        ticks += 1
+        if ticks == 1:
+            contents["b"] += b"b2\n"
+            generations["b"] = "2"
+        elif ticks > 2:
+            raise KeyboardInterrupt
+
+    with patch("asyncio.sleep", side_effect=sleep), patch.object(
+        PanPath("gs://bucket/wd").__class__, "a_write_text", AsyncMock()
+    ):
+        with pytest.raises(SystemExit):
+            await daemon._run_view_logs()
+
+    out = capsys.readouterr().out
+    assert out.count("[sweep-a] a1") == 1
+    assert "[sweep-b] b2" in out
+    assert storage.list_objects.await_count == 3
+    # a1, b1 and b2, nothing for the unchanged ones
+    assert storage.download.await_count == 3
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from panpath import PanPath
+from xqute.utils import sanitize_mounts
+from pipen_cli_gbatch import CliGbatchDaemonPipeline
+from pipen_cli_gbatch.mixin import mounted_to_cloud
+from pipen_cli_gbatch.mounts import MountTable
+
+
+async def test_to_cloud_longest_prefix():
+    table = await MountTable.build(
+        [
+            "gs://bucket/a:/mnt/data",
+            "gs://bucket/a/other:/mnt/data/sub",
+            "gs://bucket/c:/mnt/datasets",
+        ],
+        "/mnt/disks",
+    )
+    assert table.to_cloud("/mnt/data/x/y") == PanPath("gs://bucket/a/x/y")
+    assert table.to_cloud("/mnt/data/sub/x") == PanPath("gs://bucket/a/other/x")
+    assert table.to_cloud("/mnt/data/sub") == PanPath("gs://bucket/a/other")
+    # not a prefix of the path parts
+    assert table.to_cloud("/mnt/datasets/x") == PanPath("gs://bucket/c/x")
+    assert table.to_cloud("/mnt/dat") is None
+    assert table.to_cloud("/mnt") is None
+    assert table.to_cloud("relative/path") is None
+
+
+async def test_named_mounts(tmp_path):
+    table = await MountTable.build(f"NAME={tmp_path}", "/mnt/disks")
+    assert table.named_mounts == {"NAME": "/mnt/disks/NAMED_MOUNTS/NAME"}
+    assert table.to_cloud("/mnt/disks/NAMED_MOUNTS/NAME/f") == PanPath(tmp_path / "f")
+
+
+async def test_mounted_to_cloud():
+    mounted = PanPath("/mnt/data/x")
+    assert await mounted_to_cloud(
+        mounted, "/mnt/disks", "gs://bucket/a:/mnt/data"
+    ) == PanPath("gs://bucket/a/x")
+    assert await mounted_to_cloud(mounted, "/mnt/disks", None) is None
+
+
+async def test_daemon_mount_table_built_once():
+    daemon = CliGbatchDaemonPipeline(
+        {"workdir": ".pipen", "cwd": "/mnt/data/proj", "mount": "gs://b/a:/mnt/data"},
+        ["cmd", "--name", "Pipeline"],
+    )
+    with patch(
+        "pipen_cli_gbatch.mounts.sanitize_mounts", wraps=sanitize_mounts
+    ) as sanitize:
+        await daemon.handle_workdir()
+        workdir = await daemon.command_workdir()
+        assert workdir == PanPath("gs://b/a/proj/.pipen/Pipeline")
+        await daemon.command_workdir()
+        assert sanitize.call_count == 1
+
+        # rebuilt for the new mounts
+        daemon._add_mount("gs://b/c", "/mnt/other")
+        table = await daemon.mount_table()
+        assert sanitize.call_count == 2
+        assert table.to_cloud("/mnt/other/x") == PanPath("gs://b/c/x")
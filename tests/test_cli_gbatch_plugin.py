@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+import time
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, call, patch
 
 from panpath import PanPath
 from argx import Namespace
-from pipen_args.parser_ import _pre_parse
 from pipen_cli_gbatch import CliGbatchPlugin
+from pipen_cli_gbatch.logs import LogTailer
 from pipen_cli_gbatch.plugins import XquteCliGbatchPlugin
 
 
@@ -29,8 +32,8 @@ def test_clear_residues(caplog):
     # residues are bytes, they must be decoded
     assert "/STDOUT line" in caplog.text
     assert "/STDERR err" in caplog.text
-    assert plugin.stdout_populator.residue == ""
-    assert plugin.stderr_populator.residue == ""
+    assert plugin.stdout_populator.residue == b""
+    assert plugin.stderr_populator.residue == b""
 
 
 async def test_on_job_started_no_stdout_file(tmp_path):
@@ -109,14 +112,41 @@ async def test_on_job_started_stdout_file_created_later(tmp_path, caplog):
     assert "Found the running logs" in caplog.text
 
 
-async def test_on_job_polling_skips_non_multiple_counter(tmp_path, caplog):
+async def test_on_job_polling_skips_before_interval(tmp_path, caplog):
     plugin = make_plugin_with_logfiles(tmp_path, stdout_text="x\n")
     scheduler = MagicMock()
     job = MagicMock()
+    plugin._next_pull = time.monotonic() + 60
     await plugin.on_job_polling(scheduler, job, 1)
     assert "/STDOUT" not in caplog.text
     assert plugin.stdout_populator.counter == 0
 
+    # forced at the end of the job
+    await plugin.on_job_polling(scheduler, job, 0)
+    assert "/STDOUT x" in caplog.text
+
+
+async def test_on_job_polling_adaptive_interval(tmp_path):
+    plugin = make_plugin_with_logfiles(tmp_path, stdout_text="x\n")
+    scheduler = MagicMock()
+    job = MagicMock()
+    await plugin.on_job_polling(scheduler, job, 1)
+    assert plugin.interval.current == plugin.interval.minimum
+
+    # idle, backed off
+    for counter in range(2, 6):
+        plugin._next_pull = 0.0
+        await plugin.on_job_polling(scheduler, job, counter)
+    assert plugin.interval.current == plugin.interval.minimum * 16
+    assert plugin._next_pull > time.monotonic() + plugin.interval.minimum * 8
+
+    # reset on new lines
+    with open(tmp_path / "job.stdout", "a") as fh:
+        fh.write("y\n")
+    plugin._next_pull = 0.0
+    await plugin.on_job_polling(scheduler, job, 6)
+    assert plugin.interval.current == plugin.interval.minimum
+
 
 async def test_on_job_polling_populates_both(tmp_path, caplog):
     plugin = make_plugin_with_logfiles(
@@ -131,6 +161,30 @@ async def test_on_job_polling_populates_both(tmp_path, caplog):
     assert plugin.stderr_populator.counter == 1
 
 
+async def test_on_job_polling_fetches_streams_concurrently(caplog):
+    plugin = XquteCliGbatchPlugin()
+    started = []
+    both_started = asyncio.Event()
+
+    def make_populate(stream, lines):
+        async def populate():
+            started.append(stream)
+            if len(started) == 2:
+                both_started.set()
+            # would time out if the streams were fetched one after another
+            await asyncio.wait_for(both_started.wait(), 1)
+            return lines
+
+        return populate
+
+    plugin.stdout_populator.populate = make_populate("STDOUT", ["x"])
+    plugin.stderr_populator.populate = make_populate("STDERR", ["y"])
+    await plugin.on_job_polling(MagicMock(), MagicMock(), 0)
+    assert "/STDOUT x" in caplog.text
+    assert "/STDERR y" in caplog.text
+    assert caplog.text.index("/STDOUT x") < caplog.text.index("/STDERR y")
+
+
 async def test_on_job_polling_stdout_block_guarded_by_stdout_populator(
     tmp_path, caplog
 ):
@@ -158,7 +212,7 @@ async def test_on_job_killed_final_logs_and_residues(tmp_path, caplog):
     assert "/STDERR y" in caplog.text
     # from _clear_residues, decoded
     assert "/STDOUT x" in caplog.text
-    assert plugin.stdout_populator.residue == ""
+    assert plugin.stdout_populator.residue == b""
 
 
 async def test_on_job_failed_suppresses_missing_logfile(caplog):
@@ -169,7 +223,7 @@ async def test_on_job_failed_suppresses_missing_logfile(caplog):
     await plugin.on_job_failed(scheduler, job)
     # logfile is None -> AttributeError suppressed, residues still cleared
     assert "/STDERR tail" in caplog.text
-    assert plugin.stderr_populator.residue == ""
+    assert plugin.stderr_populator.residue == b""
 
 
 async def test_on_job_succeeded_suppresses_missing_logfile(caplog):
@@ -179,7 +233,7 @@ async def test_on_job_succeeded_suppresses_missing_logfile(caplog):
     job = MagicMock()
     await plugin.on_job_succeeded(scheduler, job)
     assert "/STDERR tail" in caplog.text
-    assert plugin.stderr_populator.residue == ""
+    assert plugin.stderr_populator.residue == b""
 
 
 def test_on_shutdown_cleans_up():
@@ -197,6 +251,122 @@ def test_on_shutdown_cleans_up():
     assert plugin.stderr_populator is None
 
 
+async def test_raw_logs(tmp_path, caplog, capsys):
+    plugin = make_plugin_with_logfiles(
+        tmp_path, stdout_text="x1\nx2\nresidue", stderr_text="y\n"
+    )
+    plugin.raw = True
+    await plugin.on_job_polling(MagicMock(), MagicMock(), 0)
+    plugin._clear_residues()
+    captured = capsys.readouterr()
+    assert captured.out == "x1\nx2\nresidue\n"
+    assert captured.err == "y\n"
+    assert "/STDOUT" not in caplog.text
+
+
+def test_raw_logs_broken_pipe(caplog):
+    plugin = XquteCliGbatchPlugin(raw=True)
+    stdout = MagicMock()
+    stdout.fileno.return_value = 99
+    with patch("sys.stdout", stdout), patch(
+        "pipen_cli_gbatch.plugins.write_lines", side_effect=BrokenPipeError
+    ), patch("os.dup2") as dup2:
+        plugin._show_lines("STDOUT", ["x"])
+    assert dup2.call_args.args[1] == 99
+    assert "STDOUT is closed" in caplog.text
+
+
+async def test_background_tailer(tmp_path, caplog):
+    plugin = XquteCliGbatchPlugin()
+    scheduler = MagicMock()
+    scheduler.workdir = PanPath(tmp_path)
+    job = MagicMock()
+    (tmp_path / "0").mkdir()
+    (tmp_path / "0" / "job.stdout").write_text("out1\n")
+    (tmp_path / "0" / "job.stderr").write_text("")
+
+    await plugin.on_job_started(scheduler, job)
+    assert plugin._tailer is not None
+    await asyncio.sleep(0.1)
+    # pulled in the background, but only shown when polling
+    assert "/STDOUT out1" not in caplog.text
+    await plugin.on_job_polling(scheduler, job, 1)
+    assert "/STDOUT out1" in caplog.text
+
+    (tmp_path / "0" / "job.stdout").write_text("out1\nout2\nresidue")
+    await plugin.on_job_succeeded(scheduler, job)
+    assert plugin._tailer is None
+    assert "/STDOUT out2" in caplog.text
+    assert "/STDOUT residue" in caplog.text
+    assert caplog.text.count("/STDOUT out1") == 1
+    # the offsets are kept in memory, nothing is written to the metadir
+    assert sorted(path.name for path in (tmp_path / "0").iterdir()) == [
+        "job.stderr",
+        "job.stdout",
+    ]
+
+
+async def test_pull_reads_changed_logs_only(tmp_path, caplog):
+    plugin = XquteCliGbatchPlugin()
+    scheduler = MagicMock()
+    scheduler.workdir = PanPath(tmp_path / "Daemon")
+    (tmp_path / "Daemon" / "0").mkdir(parents=True)
+    (tmp_path / "Daemon" / "0" / "job.stdout").write_text("out1\n")
+    (tmp_path / "Daemon" / "0" / "job.stderr").write_text("")
+    with patch.object(plugin, "_start_tailer"):
+        await plugin.on_job_started(scheduler, MagicMock())
+    assert plugin._poller is not None
+    assert sorted(plugin._poll_keys.values()) == [
+        "Daemon/job.stderr",
+        "Daemon/job.stdout",
+    ]
+
+    with patch.object(
+        LogTailer, "populate_stat", autospec=True, side_effect=LogTailer.populate_stat
+    ) as populate_stat:
+        assert await plugin._pull() == [("STDOUT", ["out1"])]
+        assert populate_stat.call_count == 2
+        # nothing changed
+        assert await plugin._pull() == []
+        assert populate_stat.call_count == 2
+        (tmp_path / "Daemon" / "0" / "job.stderr").write_text("err1\n")
+        assert await plugin._pull() == [("STDERR", ["err1"])]
+        assert populate_stat.call_count == 3
+
+
+async def test_background_tailer_does_not_block_polling(caplog):
+    plugin = XquteCliGbatchPlugin()
+    released = asyncio.Event()
+
+    async def slow_populate():
+        await released.wait()
+        return ["slow"]
+
+    plugin.stdout_populator.populate = slow_populate
+    plugin.stderr_populator = None
+    plugin._start_tailer()
+    await asyncio.sleep(0)
+    # the polling hook returns while the pull is ongoing
+    await asyncio.wait_for(plugin.on_job_polling(MagicMock(), MagicMock(), 1), 0.5)
+    assert "/STDOUT slow" not in caplog.text
+
+    released.set()
+    await plugin._stop_tailer()
+    assert "/STDOUT slow" in caplog.text
+
+
+async def test_on_shutdown_cancels_tailer():
+    plugin = XquteCliGbatchPlugin()
+    plugin.stdout_populator.populate = AsyncMock(return_value=[])
+    plugin.stderr_populator.populate = AsyncMock(return_value=[])
+    plugin._start_tailer()
+    tailer = plugin._tailer
+    plugin.on_shutdown(None, None)
+    assert plugin._tailer is None
+    with pytest.raises(asyncio.CancelledError):
+        await tailer
+
+
 async def test_get_defaults_from_config_no_profile(tmp_path):
     conf_file = tmp_path / "conf.toml"
     conf_file.write_text("[default]\nfoo = 'bar'\n")
@@ -230,6 +400,46 @@ async def test_get_defaults_from_config_profile(tmp_path):
     }
 
 
+async def test_get_defaults_from_config_cached(tmp_path, profile_cache_dir):
+    conf_file = tmp_path / "conf.toml"
+    conf_file.write_text("[myprofile.scheduler_opts]\nlocation = 'us-central1'\n")
+    defaults = await CliGbatchPlugin._get_defaults_from_config(
+        [str(conf_file), str(tmp_path / "nonexist.toml")], "myprofile"
+    )
+    assert defaults.scheduler_opts == {"location": "us-central1"}
+    assert len(list(profile_cache_dir.glob("*.json"))) == 1
+
+    with patch("simpleconf.ProfileConfig.a_load") as a_load:
+        defaults = await CliGbatchPlugin._get_defaults_from_config(
+            [str(conf_file), str(tmp_path / "nonexist.toml")], "myprofile"
+        )
+    a_load.assert_not_called()
+    assert defaults.scheduler_opts.location == "us-central1"
+
+    # reloaded when a config file is changed or created
+    conf_file.write_text("[myprofile.scheduler_opts]\nlocation = 'us-east1'\n")
+    defaults = await CliGbatchPlugin._get_defaults_from_config(
+        [str(conf_file), str(tmp_path / "nonexist.toml")], "myprofile"
+    )
+    assert defaults["scheduler_opts"] == {"location": "us-east1"}
+    (tmp_path / "nonexist.toml").write_text("[myprofile]\nfoo = 1\n")
+    defaults = await CliGbatchPlugin._get_defaults_from_config(
+        [str(conf_file), str(tmp_path / "nonexist.toml")], "myprofile"
+    )
+    assert defaults["foo"] == 1
+
+
+async def test_get_defaults_from_config_not_cached(tmp_path, profile_cache_dir):
+    # TOML dates are not JSON serializable
+    conf_file = tmp_path / "conf.toml"
+    conf_file.write_text("[myprofile]\nsince = 2024-01-01\n")
+    defaults = await CliGbatchPlugin._get_defaults_from_config(
+        [str(conf_file)], "myprofile"
+    )
+    assert str(defaults["since"]) == "2024-01-01"
+    assert not list(profile_cache_dir.glob("*"))
+
+
 def test_init_sets_up_subparser():
     parser = MagicMock()
     subparser = MagicMock()
@@ -237,13 +447,24 @@ def test_init_sets_up_subparser():
     assert plugin.parser is parser
     assert plugin.subparser is subparser
     assert subparser.usage == "pipen gbatch [options] -- <command>"
-    assert subparser.pre_parse is _pre_parse
+    assert subparser.pre_parse == plugin._pre_parse
     assert "--mount-as-cwd" in subparser.epilog
+    # the arguments are added on the first parse of the subcommand
+    subparser._add_decedents.assert_not_called()
+    ns = Namespace()
+    with patch("pipen_args.parser_._pre_parse") as pre_parse:
+        subparser.pre_parse(subparser, ["--help"], ns)
+        subparser.pre_parse(subparser, [], ns)
+    assert pre_parse.call_args_list == [
+        call(subparser, ["--help"], ns),
+        call(subparser, [], ns),
+    ]
     subparser._add_decedents.assert_called_once()
     args = subparser._add_decedents.call_args.args
     assert len(args) == 5
     assert args[2] == []
     assert args[4] == []
+    assert any(arg["flags"] == ["--name"] for arg in args[3])
 
 
 async def test_parse_args_strips_dashdash_command():
@@ -285,7 +506,7 @@ async def test_parse_args_profile_defaults_merge(tmp_path):
         mount=["a:b"],
         location="europe-west1",
     )
-    with patch("pipen_cli_gbatch.plugins.CONFIG_FILES", [str(conf_file)]):
+    with patch("pipen_cli_gbatch.cli.CONFIG_FILES", [str(conf_file)]):
         parsed = await plugin.parse_args(ns, [])
     # a single (non-list) mount from config is wrapped and extended
     # with the command line one
@@ -331,7 +552,7 @@ async def test_parse_args_no_profile_no_defaults(tmp_path):
     conf_file = tmp_path / "nonexist.toml"
     plugin = CliGbatchPlugin(MagicMock(), MagicMock())
     ns = Namespace(profile=None, command=["--", "cmd"])
-    with patch("pipen_cli_gbatch.plugins.CONFIG_FILES", [str(conf_file)]):
+    with patch("pipen_cli_gbatch.cli.CONFIG_FILES", [str(conf_file)]):
         parsed = await plugin.parse_args(ns, [])
     assert parsed.command == ["cmd"]
     assert parsed._other_opts == {}
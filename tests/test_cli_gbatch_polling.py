@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from pipen_cli_gbatch.polling import AdaptiveInterval
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(minimum=0.5, maximum=3, factor=2)
+    assert interval.current == 0.5
+    assert [interval.update(False) for _ in range(4)] == [1, 2, 3, 3]
+    assert interval.update(True) == 0.5
+    assert interval.backoff() == 1
+    assert interval.reset() == 0.5
+
+
+def test_adaptive_interval_maximum_below_minimum():
+    interval = AdaptiveInterval(minimum=5, maximum=1)
+    assert interval.backoff() == 5
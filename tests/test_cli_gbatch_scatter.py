@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from pipen_cli_gbatch import CliGbatchDaemonPlain
+from pipen_cli_gbatch.scatter import (
+    SCATTER_LIST,
+    glob_regex,
+    list_inputs,
+    shard_inputs,
+    split_pattern,
+)
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("gs://bucket/inputs/*.bam", ("gs://bucket/inputs", "*.bam")),
+        ("gs://bucket/*.bam", ("gs://bucket", "*.bam")),
+        ("/data/*/x.bam", ("/data", "*/x.bam")),
+        ("gs://bucket/inputs/a.bam", ("gs://bucket/inputs", "a.bam")),
+    ],
+)
+def test_split_pattern(pattern, expected):
+    assert split_pattern(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,path,matched",
+    [
+        ("*.bam", "a.bam", True),
+        ("*.bam", "d/a.bam", False),
+        ("**/*.bam", "a.bam", True),
+        ("**/*.bam", "d/e/a.bam", True),
+        ("d/**", "d/e/a.bam", True),
+        ("?.bam", "a.bam", True),
+        ("?.bam", "ab.bam", False),
+        ("[!b].bam", "a.bam", True),
+        ("[!b].bam", "b.bam", False),
+        ("[]a].bam", "].bam", True),
+        ("*.{bam,bai}", "a.bai", True),
+        ("*.{bam,bai}", "a.sam", False),
+        ("a{b.bam", "a{b.bam", True),
+        # not closed, literal `[`
+        ("x[!]", "x[!]", True),
+        ("x[^]", "x[^]", True),
+        ("x[]", "x[]", True),
+        ("x[", "x[", True),
+        ("[ab", "a", False),
+    ],
+)
+def test_glob_regex(pattern, path, matched):
+    assert bool(glob_regex(pattern).fullmatch(path)) is matched
+
+
+def test_shard_inputs():
+    inputs = [("a", 10), ("b", 7), ("c", 5), ("d", 4), ("e", 3), ("f", 1)]
+    shards = shard_inputs(inputs, 2)
+    assert shards == [["a", "d", "f"], ["b", "c", "e"]]
+    sizes = dict(inputs)
+    assert [sum(sizes[p] for p in shard) for shard in shards] == [15, 15]
+
+    # fewer inputs than shards
+    assert shard_inputs([("a", 1), ("b", 2)], 4) == [["b"], ["a"]]
+
+
+async def test_list_inputs_local(tmp_path):
+    (tmp_path / "a.bam").write_text("aaa")
+    (tmp_path / "b.bam").write_text("b")
+    (tmp_path / "c.txt").write_text("c")
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "e.bam").write_text("ee")
+    inputs = await list_inputs(f"{tmp_path}/*.bam")
+    assert inputs == [(f"{tmp_path}/a.bam", 3), (f"{tmp_path}/b.bam", 1)]
+
+    # the same rules as the objects on the cloud
+    inputs = await list_inputs(f"{tmp_path}/**/*.bam")
+    assert inputs == [
+        (f"{tmp_path}/a.bam", 3),
+        (f"{tmp_path}/b.bam", 1),
+        (f"{tmp_path}/d/e.bam", 2),
+    ]
+    inputs = await list_inputs(f"{tmp_path}/*/*.bam")
+    assert inputs == [(f"{tmp_path}/d/e.bam", 2)]
+
+
+async def test_list_inputs_gs():
+    storage = MagicMock()
+    storage.list_objects = AsyncMock(
+        side_effect=[
+            {
+                "items": [
+                    {"name": "inputs/a.bam", "size": "30"},
+                    {"name": "inputs/a.bai", "size": "1"},
+                ],
+                "nextPageToken": "token",
+            },
+            {"items": [{"name": "inputs/b.bam", "size": "20"}]},
+        ]
+    )
+    with patch(
+        "pipen_cli_gbatch.scatter.gs_storage", AsyncMock(return_value=storage)
+    ):
+        inputs = await list_inputs("gs://bucket/inputs/*.bam")
+
+    assert inputs == [
+        ("gs://bucket/inputs/a.bam", 30),
+        ("gs://bucket/inputs/b.bam", 20),
+    ]
+    assert storage.list_objects.await_count == 2
+    assert storage.list_objects.await_args_list[1].kwargs["params"] == {
+        "prefix": "inputs/",
+        "delimiter": "/",
+        "pageToken": "token",
+    }
+
+
+async def test_daemon_scatter(tmp_path):
+    indir = tmp_path / "inputs"
+    indir.mkdir()
+    for name, size in [("a.bam", 8), ("b.bam", 5), ("c.bam", 4), ("d.bam", 1)]:
+        (indir / name).write_text("x" * size)
+
+    daemon = CliGbatchDaemonPlain(
+        {"scatter": f"{indir}/*.bam", "shards": 2, "mount": []},
+        ["bash", "process.sh"],
+    )
+    await daemon._load_tasks()
+    mounted = "/mnt/disks/NAMED_MOUNTS/GBATCH_SCATTER"
+    assert daemon.config["mount"] == [f"GBATCH_SCATTER={indir}"]
+    assert (await daemon.mount_table()).named_mounts["GBATCH_SCATTER"] == mounted
+    assert daemon.task_inputs == [
+        [f"{mounted}/a.bam", f"{mounted}/d.bam"],
+        [f"{mounted}/b.bam", f"{mounted}/c.bam"],
+    ]
+    assert daemon.task_params == [
+        {"files": "2", "bytes": "9"},
+        {"files": "2", "bytes": "9"},
+    ]
+    assert daemon.tasks[0] == (
+        f"export GBATCH_SCATTER={mounted}; "
+        f'export GBATCH_SCATTER_LIST="$GBATCH_TASK_DIR/{SCATTER_LIST}"; '
+        "bash process.sh"
+    )
+
+    (tmp_path / "workdir").mkdir()
+    scheduler = MagicMock(workdir=PanPath(tmp_path / "workdir"))
+    await daemon._write_task_files(scheduler)
+    assert (tmp_path / "workdir" / "1" / SCATTER_LIST).read_text() == (
+        f"{mounted}/b.bam\n{mounted}/c.bam\n"
+    )
+    assert (tmp_path / "workdir" / "tasks.tsv").read_text().splitlines()[0] == (
+        "index\tfiles\tbytes\tcommand"
+    )
+
+
+async def test_daemon_scatter_errors(tmp_path):
+    daemon = CliGbatchDaemonPlain({"scatter": f"{tmp_path}/*.bam", "shards": 2}, [])
+    with pytest.raises(ValueError, match="command should be provided"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain({"scatter": f"{tmp_path}/*.bam"}, ["cmd"])
+    with pytest.raises(ValueError, match="--shards"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain(
+        {"scatter": f"{tmp_path}/*.bam", "shards": 2}, ["cmd"]
+    )
+    with pytest.raises(ValueError, match="No input files"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain(
+        {"scatter": f"{tmp_path}/*.bam", "shards": 2, "sweep": "x.tsv"}, ["cmd"]
+    )
+    with pytest.raises(ValueError, match="cannot be used together"):
+        await daemon._load_tasks()
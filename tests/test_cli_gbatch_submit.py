@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from xqute import plugin
+from pipen_cli_gbatch import CliGbatchDaemonPlain, submit_many
+from pipen_cli_gbatch.tasks import TASK_RUNNER
+
+DEFAULTS = {
+    "workdir": "gs://bucket/path/workdir",
+    "project": "my-gcp-project",
+    "location": "us-central1",
+}
+
+
+class FakeScheduler:
+    """Record the submissions and the maximum number of concurrent ones"""
+
+    running = 0
+    max_running = 0
+    created: list = []
+
+    def __init__(self, workdir, **kwargs):
+        self.workdir = PanPath(workdir)
+        self.kwargs = kwargs
+        FakeScheduler.created.append(self)
+
+    async def create_job(self, index, cmd, envs=None):
+        self.cmd = cmd
+        # the wrapped job script is rendered when submitting
+        self.init_codes = plugin.hooks.on_jobcmd_init(self, MagicMock(trial_count=0))
+        job = MagicMock()
+        # the jid file of the running job is already there
+        job.get_jid = AsyncMock(
+            return_value="jid-existing" if await self.job_is_running(job) else None
+        )
+        self.job = job
+        return job
+
+    async def job_is_running(self, job):
+        return self.kwargs["jobname_prefix"].endswith("running")
+
+    async def submit_job_and_update_status(self, job):
+        FakeScheduler.running += 1
+        FakeScheduler.max_running = max(FakeScheduler.max_running, self.running)
+        await asyncio.sleep(0.05)
+        FakeScheduler.running -= 1
+        job.get_jid = AsyncMock(return_value=f"jid-{self.kwargs['jobname_prefix']}")
+
+
+@pytest.fixture
+def fake_scheduler():
+    FakeScheduler.running = 0
+    FakeScheduler.max_running = 0
+    FakeScheduler.created = []
+    with patch(
+        "pipen_cli_gbatch.mixin.get_scheduler", MagicMock(return_value=FakeScheduler)
+    ):
+        yield FakeScheduler
+
+
+async def test_submit_many(fake_scheduler):
+    items = ((dict(name=f"job{i}"), ["echo", str(i)]) for i in range(10))
+    results = [
+        result
+        async for result in submit_many(items, max_concurrency=3, defaults=DEFAULTS)
+    ]
+    assert sorted(results) == [(i, (f"jid-job{i}", True)) for i in range(10)]
+    assert fake_scheduler.max_running == 3
+    assert len(fake_scheduler.created) == 10
+    scheduler = fake_scheduler.created[0]
+    assert scheduler.kwargs["project"] == "my-gcp-project"
+    assert scheduler.cmd == ["echo", "0"]
+    assert not any(scheduler.init_codes)
+    # plugins are restored
+    assert "gbatch_tasks" not in plugin.get_enabled_plugin_names()
+
+
+async def test_submit_many_tasks(fake_scheduler, tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo a\necho b\n")
+    items = [
+        ({"name": "tasks", "batch_file": str(batch_file)}, []),
+        ({"name": "single"}, ["echo", "c"]),
+    ]
+    with patch.object(CliGbatchDaemonPlain, "_write_task_files", AsyncMock()):
+        results = dict(
+            [result async for result in submit_many(items, defaults=DEFAULTS)]
+        )
+    assert results == {0: ("jid-tasks", True), 1: ("jid-single", True)}
+    tasks_scheduler, single_scheduler = sorted(
+        fake_scheduler.created, key=lambda sch: sch.kwargs["jobname_prefix"]
+    )[::-1]
+    assert tasks_scheduler.cmd == [TASK_RUNNER]
+    assert tasks_scheduler.kwargs["taskGroups"][0]["taskCount"] == 2
+    assert any("0) bash -c 'echo a' ;;" in code for code in tasks_scheduler.init_codes)
+    assert not any(single_scheduler.init_codes)
+
+
+async def test_submit_many_running_and_errors(fake_scheduler):
+    items = [
+        ({"name": "running"}, ["echo", "1"]),
+        ({"name": "nocmd"}, []),
+    ]
+    results = dict(
+        [
+            result
+            async for result in submit_many(
+                items, defaults=DEFAULTS, return_exceptions=True
+            )
+        ]
+    )
+    # already running, not submitted again
+    assert results[0] == ("jid-existing", False)
+    assert results[0].jid == "jid-existing"
+    assert not results[0].submitted
+    assert isinstance(results[1], ValueError)
+
+    with pytest.raises(ValueError):
+        async for _ in submit_many(items, defaults=DEFAULTS):
+            pass
+
+    with pytest.raises(ValueError, match="max_concurrency"):
+        async for _ in submit_many(items, max_concurrency=0):
+            pass
+
+
+async def test_submit_running_keeps_task_files(fake_scheduler, tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo a\necho b\n")
+    items = [
+        ({"name": "running", "batch_file": str(batch_file)}, []),
+        ({"name": "new", "batch_file": str(batch_file)}, []),
+    ]
+    with patch.object(
+        CliGbatchDaemonPlain, "_write_task_files", AsyncMock()
+    ) as write_task_files:
+        async for _ in submit_many(items, defaults=DEFAULTS):
+            pass
+    # the files being read by the tasks of the running job are not rewritten
+    write_task_files.assert_awaited_once()
+    scheduler = write_task_files.await_args.args[0]
+    assert scheduler.kwargs["jobname_prefix"].endswith("new")
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import subprocess
+import textwrap
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from panpath import PanPath
+from xqute import plugin
+from pipen_cli_gbatch import CliGbatchDaemonPipeline, CliGbatchDaemonPlain
+from pipen_cli_gbatch.plugins import XquteCliGbatchTasksPlugin
+from pipen_cli_gbatch.tasks import (
+    POOL_RUNNER,
+    TASK_RUNNER,
+    TASKS_MANIFEST,
+    TASKS_WRAPPER_GUARD,
+    GbatchTasksScheduler,
+    expand_sweep,
+    format_manifest,
+    load_batch_file,
+    load_sweep_file,
+    render_tasks_init,
+)
+
+
+def run_task(tmp_path, init_code, index, runner=TASK_RUNNER, count=None):
+    """Run the task runner as it is run in the wrapped job script"""
+    metadir = tmp_path / "workdir"
+    (metadir / "0").mkdir(parents=True, exist_ok=True)
+    script = textwrap.dedent(
+        f"""
+        update_metafile() {{ echo "$1" > "$2"; }}
+        remove_metafile() {{ mv -f "$1" "$1.used"; }}
+        export BATCH_TASK_INDEX={index}
+        export BATCH_TASK_COUNT={count or 1}
+        export GBATCH_RC_WAIT=0
+        """
+    )
+    script += TASKS_WRAPPER_GUARD
+    script += textwrap.dedent(
+        f"""
+        update_metafile "RUNNING" "{metadir}/0/job.status"
+        update_metafile "" "{metadir}/0/job.stdout"
+        export XQUTE_METADIR={metadir}
+        export XQUTE_JOB_METADIR={metadir}/0
+        """
+    )
+    script += init_code
+    script += textwrap.dedent(
+        f"""
+        {runner}
+        rc=$?
+        update_metafile "$rc" "$XQUTE_JOB_METADIR/job.rc"
+        echo "jid" > "$XQUTE_JOB_METADIR/job.jid"
+        remove_metafile "$XQUTE_JOB_METADIR/job.jid"
+        exit $rc
+        """
+    )
+    return subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+    )
+
+
+async def test_load_batch_file(tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo 1\n\n# comment\n  echo 2  \n")
+    assert await load_batch_file(str(batch_file)) == ["echo 1", "echo 2"]
+
+    with pytest.raises(FileNotFoundError):
+        await load_batch_file(str(tmp_path / "nonexist.txt"))
+
+
+async def test_load_sweep_file(tmp_path):
+    tsv = tmp_path / "params.tsv"
+    tsv.write_text("alpha\tbeta\n0.1\ta b\n\t\n0.2\tc\n")
+    assert await load_sweep_file(str(tsv)) == [
+        {"alpha": "0.1", "beta": "a b"},
+        {"alpha": "0.2", "beta": "c"},
+    ]
+
+    csv = tmp_path / "params.csv"
+    csv.write_text("alpha,beta\n0.1,x\n")
+    assert await load_sweep_file(str(csv)) == [{"alpha": "0.1", "beta": "x"}]
+
+    with pytest.raises(FileNotFoundError):
+        await load_sweep_file(str(tmp_path / "nonexist.tsv"))
+
+    # a row with missing or extra columns
+    csv.write_text("alpha,beta\n0.1,x\n0.2\n")
+    with pytest.raises(ValueError, match=r"params.csv, line 3: expected 2"):
+        await load_sweep_file(str(csv))
+    csv.write_text("alpha,beta\n0.1,x,y\n")
+    with pytest.raises(ValueError, match=r"params.csv, line 2: expected 2"):
+        await load_sweep_file(str(csv))
+
+
+def test_expand_sweep():
+    rows = [{"alpha": "0.1", "beta": "a b"}, {"alpha": "0.2", "beta": "c"}]
+    tasks = expand_sweep(
+        ["python", "sweep.py", "--alpha={alpha}", "--beta", "{beta}", "{other}"],
+        rows,
+    )
+    assert tasks == [
+        "python sweep.py --alpha=0.1 --beta 'a b' '{other}'",
+        "python sweep.py --alpha=0.2 --beta c '{other}'",
+    ]
+
+    with pytest.raises(ValueError, match="No placeholders"):
+        expand_sweep(["python", "sweep.py"], rows)
+
+
+def test_format_manifest():
+    manifest = format_manifest(["echo 1", "echo 2"], [{"a": "1"}, {"a": "2"}])
+    assert manifest == "index\ta\tcommand\n0\t1\techo 1\n1\t2\techo 2\n"
+    assert format_manifest(["echo 1"]) == "index\tcommand\n0\techo 1\n"
+
+
+def test_render_tasks_init():
+    code = render_tasks_init(["echo 'a b'", "exit 3"], "run1")
+    assert "export GBATCH_TASK_COUNT=2" in code
+    assert "export GBATCH_RUN_ID=run1" in code
+    assert "0) bash -c 'echo '\"'\"'a b'\"'\"'' ;;" in code
+    assert "1) bash -c 'exit 3' ;;" in code
+
+
+def test_tasks_runner(tmp_path):
+    init_code = render_tasks_init(["echo out0", "echo err1 >&2; exit 3"], "run1")
+    metadir = tmp_path / "workdir"
+
+    # the first finished task is not the last one, job meta files are left
+    # untouched, and only task 0 starts the job
+    proc = run_task(tmp_path, init_code, 1, count=2)
+    assert proc.returncode == 3
+    assert (metadir / "1" / "task.stderr").read_text() == "err1\n"
+    assert (metadir / "1" / "task.rc").read_text() == "3\n"
+    assert not (metadir / "0" / "job.status").exists()
+    assert not (metadir / "0" / "job.stdout").exists()
+    assert not (metadir / "0" / "job.rc").exists()
+    assert (metadir / "0" / "job.jid").exists()
+
+    # the last task reports the status of the whole job
+    proc = run_task(tmp_path, init_code, 0, count=2)
+    assert proc.returncode == 1
+    assert (metadir / "0" / "task.stdout").read_text() == "out0\n"
+    assert (metadir / "0" / "job.status").read_text() == "RUNNING\n"
+    assert (metadir / "0" / "job.rc").read_text() == "1\n"
+    assert not (metadir / "0" / "job.jid").exists()
+    assert "Tasks finished: 2, failed: 1" in proc.stdout
+    assert "Failed tasks: 1" in proc.stdout
+
+
+def test_tasks_runner_stale_outputs(tmp_path):
+    metadir = tmp_path / "workdir"
+    # outputs from a previous run
+    run_task(tmp_path, render_tasks_init(["true", "true"], "old"), 1, count=2)
+
+    init_code = render_tasks_init(["true", "true"], "new")
+    run_task(tmp_path, init_code, 0, count=2)
+    assert not (metadir / "0" / "job.rc").exists()
+    run_task(tmp_path, init_code, 1, count=2)
+    assert (metadir / "0" / "job.rc").read_text() == "0\n"
+
+
+def test_tasks_runner_retried_task(tmp_path):
+    metadir = tmp_path / "workdir"
+    init_code = render_tasks_init(["true", "true"], "run1")
+    run_task(tmp_path, init_code, 0, count=2)
+    # a task retried by Cloud Batch doesn't take another ticket
+    run_task(tmp_path, init_code, 0, count=2)
+    assert not (metadir / "0" / "job.rc").exists()
+    run_task(tmp_path, init_code, 1, count=2)
+    assert (metadir / "0" / "job.rc").read_text() == "0\n"
+    tickets = metadir / ".runs" / "run1" / "tickets"
+    assert sorted(path.name for path in tickets.iterdir()) == ["1", "2"]
+    assert (metadir / ".runs" / "run1" / "last").read_text() == "1\n"
+
+
+def test_pool_runner(tmp_path):
+    tasks = [
+        "sleep 0.3; echo $GBATCH_TASK_INDEX",
+        "sleep 0.3; echo $GBATCH_TASK_DIR",
+        "sleep 0.3; exit 2",
+    ]
+    init_code = render_tasks_init(tasks, "run1", parallel=3)
+    assert "export GBATCH_PARALLEL=3" in init_code
+    metadir = tmp_path / "workdir"
+
+    proc = run_task(tmp_path, init_code, 0, runner=POOL_RUNNER)
+    assert proc.returncode == 1
+    assert "with a pool of 3 process(es)" in proc.stdout
+    assert "Tasks finished: 3, failed: 1" in proc.stdout
+    assert (metadir / "0" / "task.stdout").read_text() == "0\n"
+    assert (metadir / "1" / "task.stdout").read_text() == f"{metadir}/1\n"
+    assert (metadir / "2" / "task.rc").read_text() == "2\n"
+    # the single task reports the status of the whole job
+    assert (metadir / "0" / "job.rc").read_text() == "1\n"
+    assert not (metadir / "0" / "job.jid").exists()
+
+
+def test_pool_runner_limits_size(tmp_path):
+    tasks = [f"date +%s%N > {tmp_path}/start{i}; sleep 0.3" for i in range(4)]
+    init_code = render_tasks_init(tasks, "run1", parallel=2)
+    proc = run_task(tmp_path, init_code, 0, runner=POOL_RUNNER)
+    assert proc.returncode == 0
+    starts = sorted(int((tmp_path / f"start{i}").read_text()) for i in range(4))
+    # the 3rd command waits for one of the first two to finish
+    assert starts[2] - starts[0] >= 0.25e9
+
+
+def test_tasks_plugin():
+    tasks_plugin = XquteCliGbatchTasksPlugin(["echo 1"])
+    job = MagicMock(trial_count=2)
+    code = tasks_plugin.on_jobcmd_init(None, job)
+    assert f"export GBATCH_RUN_ID={tasks_plugin.run_id}-2" in code
+    assert "0) bash -c 'echo 1' ;;" in code
+
+
+async def test_daemon_batch_file(tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo 1\necho 2\necho 3\n")
+    daemon = CliGbatchDaemonPlain(
+        {
+            "batch_file": str(batch_file),
+            "workdir": "gs://bucket/path/workdir",
+            "project": "my-gcp-project",
+            "location": "us-central1",
+            "taskGroups": [{"parallelism": 2}],
+        },
+        [],
+    )
+    await daemon.setup()
+    assert daemon.tasks == ["echo 1", "echo 2", "echo 3"]
+    assert daemon.daemon_name == ".gbatch-cmds"
+    assert daemon.job_command == [TASK_RUNNER]
+
+    xqute = await daemon._get_xqute()
+    assert isinstance(xqute.scheduler, GbatchTasksScheduler)
+    await xqute.scheduler.post_init()
+    assert xqute.scheduler.jobcmd_wrapper_init.endswith(TASKS_WRAPPER_GUARD)
+    task_groups = xqute.scheduler.config["taskGroups"]
+    assert task_groups[0]["taskCount"] == 3
+    assert task_groups[0]["parallelism"] == 2
+    assert "batch_file" not in xqute.scheduler.config
+    assert "gbatch_tasks" in plugin.get_enabled_plugin_names()
+    xqute.plugin_context.__exit__()
+
+
+async def test_daemon_batch_file_errors(tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo 1\n")
+    daemon = CliGbatchDaemonPlain({"batch_file": str(batch_file)}, ["cmd"])
+    with pytest.raises(ValueError):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain({"batch_file": str(tmp_path / "nonexist")}, [])
+    with pytest.raises(ValueError):
+        await daemon._load_tasks()
+
+    batch_file.write_text("# nothing\n")
+    daemon = CliGbatchDaemonPlain({"batch_file": str(batch_file)}, [])
+    with pytest.raises(ValueError):
+        await daemon._load_tasks()
+
+
+async def test_daemon_parallel(tmp_path):
+    batch_file = tmp_path / "cmds.txt"
+    batch_file.write_text("echo 1\necho 2\necho 3\n")
+    daemon = CliGbatchDaemonPlain(
+        {
+            "batch_file": str(batch_file),
+            "parallel": 0,
+            "workdir": "gs://bucket/path/workdir",
+            "project": "my-gcp-project",
+            "location": "us-central1",
+        },
+        [],
+    )
+    await daemon.setup()
+    assert daemon.job_command == [POOL_RUNNER]
+
+    xqute = await daemon._get_xqute()
+    assert xqute.scheduler.config["taskGroups"][0]["taskCount"] == 1
+    assert "parallel" not in xqute.scheduler.config
+    xqute.plugin_context.__exit__()
+
+    daemon = CliGbatchDaemonPlain({"parallel": 2}, ["echo", "1"])
+    with pytest.raises(ValueError, match="can only be used with"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain(
+        {"batch_file": str(batch_file), "parallel": -1}, []
+    )
+    with pytest.raises(ValueError, match="non-negative"):
+        await daemon._load_tasks()
+
+
+async def test_daemon_sweep(tmp_path):
+    sweep = tmp_path / "params.tsv"
+    sweep.write_text("alpha\tbeta\n1\tx\n2\ty\n")
+    daemon = CliGbatchDaemonPlain(
+        {
+            "sweep": str(sweep),
+            "workdir": "gs://bucket/path/workdir",
+            "project": "my-gcp-project",
+            "location": "us-central1",
+        },
+        ["python", "sweep.py", "--alpha", "{alpha}", "--beta", "{beta}"],
+    )
+    await daemon.setup()
+    assert daemon.tasks == [
+        "python sweep.py --alpha 1 --beta x",
+        "python sweep.py --alpha 2 --beta y",
+    ]
+    assert daemon.task_params == [
+        {"alpha": "1", "beta": "x"},
+        {"alpha": "2", "beta": "y"},
+    ]
+    assert daemon.daemon_name == ".gbatch-python-sweep-py"
+
+    xqute = await daemon._get_xqute()
+    assert xqute.scheduler.config["taskGroups"][0]["taskCount"] == 2
+    assert "sweep" not in xqute.scheduler.config
+    xqute.plugin_context.__exit__()
+
+
+async def test_daemon_sweep_errors(tmp_path):
+    sweep = tmp_path / "params.tsv"
+    sweep.write_text("alpha\n1\n")
+    daemon = CliGbatchDaemonPlain({"sweep": str(sweep)}, [])
+    with pytest.raises(ValueError, match="command template"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain({"sweep": str(sweep)}, ["echo", "{beta}"])
+    with pytest.raises(ValueError, match="No placeholders"):
+        await daemon._load_tasks()
+
+    daemon = CliGbatchDaemonPlain(
+        {"sweep": str(sweep), "batch_file": str(sweep)}, ["echo", "{alpha}"]
+    )
+    with pytest.raises(ValueError, match="cannot be used together"):
+        await daemon._load_tasks()
+
+    sweep.write_text("alpha\n")
+    daemon = CliGbatchDaemonPlain({"sweep": str(sweep)}, ["echo", "{alpha}"])
+    with pytest.raises(ValueError, match="No rows"):
+        await daemon._load_tasks()
+
+
+async def test_run_wait_tasks(tmp_path):
+    daemon = CliGbatchDaemonPlain({}, [])
+    daemon.tasks = ["echo 1", "echo 2"]
+    xqute = MagicMock()
+    xqute.scheduler.workdir = PanPath(tmp_path)
+    xqute.scheduler.create_job = AsyncMock(return_value=MagicMock())
+    xqute.scheduler.job_is_running = AsyncMock(return_value=False)
+    xqute.feed = AsyncMock()
+    xqute.run_until_complete = AsyncMock()
+    with patch.object(daemon, "_get_xqute", AsyncMock(return_value=xqute)):
+        await daemon._run_wait()
+    xqute.scheduler.create_job.assert_awaited_once_with(0, [TASK_RUNNER], envs={})
+    xqute.feed.assert_awaited_once_with([TASK_RUNNER], envs={})
+    assert (tmp_path / TASKS_MANIFEST).read_text() == (
+        "index\tcommand\n0\techo 1\n1\techo 2\n"
+    )
+
+
+async def test_daemon_pipeline_sweep_outdir(tmp_path):
+    sweep = tmp_path / "params.tsv"
+    sweep.write_text("sample\na\nb\n")
+    daemon = CliGbatchDaemonPipeline(
+        {
+            "sweep": str(sweep),
+            "mount_as_cwd": "gs://bucket/path",
+            "project": "my-gcp-project",
+            "location": "us-central1",
+        },
+        ["pipeline.py", "--name", "MyJob", "--outdir", "out/{sample}"],
+    )
+    await daemon.prepare()
+    # expanded after --outdir is replaced with the mounted path
+    assert daemon.tasks == [
+        "pipeline.py --name MyJob --outdir /mnt/disks/.cwd/out/a "
+        "--workdir /mnt/disks/.cwd/.pipen",
+        "pipeline.py --name MyJob --outdir /mnt/disks/.cwd/out/b "
+        "--workdir /mnt/disks/.cwd/.pipen",
+    ]
+
+
+async def test_run_wait_tasks_pipeline(tmp_path):
+    daemon = CliGbatchDaemonPipeline(
+        {"workdir": str(tmp_path / "wd")}, ["pipeline.py", "--name", "MyJob"]
+    )
+    daemon.config["workdir"] = PanPath(tmp_path / "wd")
+    daemon.tasks = ["echo 1", "echo 2"]
+    xqute = MagicMock()
+    xqute.scheduler.workdir = PanPath(tmp_path)
+    xqute.scheduler.create_job = AsyncMock(return_value=MagicMock())
+    xqute.scheduler.job_is_running = AsyncMock(return_value=False)
+    xqute.feed = AsyncMock()
+    xqute.run_until_complete = AsyncMock()
+    with patch.object(daemon, "_get_xqute", AsyncMock(return_value=xqute)):
+        await daemon._run_wait()
+    xqute.scheduler.create_job.assert_awaited_once_with(0, [TASK_RUNNER], envs={})
+    xqute.feed.assert_awaited_once_with([TASK_RUNNER], envs={})
+    assert (tmp_path / TASKS_MANIFEST).read_text() == (
+        "index\tcommand\n0\techo 1\n1\techo 2\n"
+    )